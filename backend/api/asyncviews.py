@@ -0,0 +1,111 @@
+"""
+Async request handling for DRF views.
+
+Under ASGI (backend/asgi.py served by uvicorn, see serve.sh) Django runs
+``async def`` views on the event loop, so a connection waiting on a slow
+client or streaming a large download holds a coroutine rather than a
+thread. DRF's APIView.dispatch is synchronous, so AsyncAPIViewMixin
+replaces it with a coroutine: authentication, permission and throttle
+checks (which may query the database) run through sync_to_async, then the
+view's async handler is awaited. The handlers use the async ORM.
+
+Blocking work (pandas, hashing, parsing the request body, file lookups) is
+passed to ``offload``, a thread pool of ``settings.ASYNC_OFFLOAD_THREADS``,
+so it neither blocks the loop nor runs unbounded; pandas' parser releases
+the GIL while it reads. An offloaded function that queries the database does
+so on the pool thread's own connection, outside the request's transaction;
+it is closed when the function returns.
+
+The same views keep working under WSGI, where Django gives each request its
+own event loop.
+"""
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import connections
+from django.http import FileResponse, StreamingHttpResponse
+
+# Bytes read from disk per chunk of a streamed file
+STREAM_BLOCK_SIZE = 256 * 1024
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        workers = settings.ASYNC_OFFLOAD_THREADS or min(4, os.cpu_count() or 1)
+        _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='offload')
+    return _executor
+
+
+def _call(fn, *args, **kwargs):
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        # Pool threads outlive requests, so nothing closes their connections otherwise
+        connections.close_all()
+
+
+async def offload(fn, *args, **kwargs):
+    """Run the blocking ``fn(*args, **kwargs)`` in the bounded pool."""
+    return await asyncio.get_running_loop().run_in_executor(_get_executor(), partial(_call, fn, *args, **kwargs))
+
+
+async def _read_blocks(f):
+    try:
+        while block := await asyncio.to_thread(f.read, STREAM_BLOCK_SIZE):
+            yield block
+    finally:
+        f.close()
+
+
+def file_response(request, f, content_type):
+    """
+    A response sending the open binary file ``f``. Under ASGI it is read in
+    blocks off the loop; Django would otherwise load a synchronous file into
+    memory before sending it. Under WSGI the server iterates a FileResponse.
+    """
+    if isinstance(getattr(request, '_request', request), ASGIRequest):
+        response = StreamingHttpResponse(_read_blocks(f), content_type=content_type)
+        response['Content-Length'] = os.fstat(f.fileno()).st_size
+        return response
+    response = FileResponse(f, content_type=content_type)
+    del response['Content-Disposition']
+    return response
+
+
+class AsyncAPIViewMixin:
+    """
+    Lets an APIView's handlers be ``async def``; all of a view's handlers
+    must then be, which is how Django decides to call it as a coroutine.
+    """
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+            response = handler(request, *args, **kwargs)
+            # OPTIONS is answered by DRF's synchronous metadata handler
+            if asyncio.iscoroutine(response):
+                response = await response
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        # Finalizing may render the body and store it in the response cache
+        self.response = await sync_to_async(self.finalize_response)(request, response, *args, **kwargs)
+        return self.response
@@ -0,0 +1,88 @@
+"""
+JWT authentication without a user query per request.
+
+simplejwt's JWTAuthentication loads the User row for every authenticated
+call, and the clients poll /api/last5-csv/ often. CachedUserJWTAuthentication
+takes the user id from the token's claims and looks it up in UserCache, a
+small process-local LRU whose entries are trusted for
+``settings.AUTH_USER_CACHE_TTL`` seconds. Views still get a full User
+(``request.user`` is a copy of the cached one), so FK filters, ownership
+checks and ``is_staff`` work unchanged.
+
+Revocation is bounded by the TTL. A deactivated or deleted user, or a token
+issued before a password change, is refused once the entry is reloaded.
+Tokens carry a hash of the password hash (simplejwt's CHECK_REVOKE_TOKEN),
+and a User saved or deleted in this process drops its entry at once (see
+api/signals.py).
+"""
+import copy
+import time
+from collections import OrderedDict
+from threading import Lock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+
+class UserCache:
+    """User objects by id (None for ids without a user), least recently used dropped first."""
+
+    def __init__(self):
+        self._users = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, user_id):
+        # Tokens hold the id as a string, signals as the pk
+        user_id = str(user_id)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is not None and now - entry[0] < settings.AUTH_USER_CACHE_TTL:
+                self._users.move_to_end(user_id)
+                return entry[1]
+
+        user = get_user_model().objects.filter(**{api_settings.USER_ID_FIELD: user_id}).first()
+        with self._lock:
+            self._users[user_id] = (now, user)
+            self._users.move_to_end(user_id)
+            while len(self._users) > settings.AUTH_USER_CACHE_SIZE:
+                self._users.popitem(last=False)
+        return user
+
+    def discard(self, user_id):
+        with self._lock:
+            self._users.pop(str(user_id), None)
+
+    def clear(self):
+        with self._lock:
+            self._users.clear()
+
+
+user_cache = UserCache()
+
+
+class CachedUserJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication with the user read from ``user_cache``; the checks are simplejwt's."""
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from e
+
+        user = user_cache.get(user_id)
+        if user is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        if (api_settings.CHECK_REVOKE_TOKEN and
+                validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password)):
+            raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+
+        # Each request gets its own instance; the cached one is shared between threads
+        return copy.copy(user)
@@ -0,0 +1,303 @@
+"""
+Bulk uploads: many equipment CSVs in one request.
+
+The files of a batch (a multipart list or the members of a zip) are stored
+and checked one by one, then parsed in parallel, one file per process. The
+ProcessPoolExecutor is started by the first batch a process handles and
+reused by every later one, so children pay the interpreter, Django and pandas
+start-up once. A child only reads its CSV and writes the columnar copy and
+the summary fields; it never touches the database. The parent then
+creates every dataset and its rows in a single transaction and applies the
+retention rule once for the whole batch.
+
+Every file gets its own result: a failure in one file (bad schema, duplicate
+title, parse error) leaves the others untouched.
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from threading import Lock
+
+import django
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files import File
+from django.db import IntegrityError, transaction
+
+from .asyncviews import offload
+from .columnar import ColumnarDataset, ColumnarWriter, sidecar_path
+from .ingest import (CSV_ERRORS, EquipmentRowWriter, content_hash, dataset_fields, get_chunk_size,
+                     ingest_csv, validate_csv)
+from .models import DataCSV, EquipmentRow, IngestJob
+from .responses import precompress_later
+from .worker import apply_retention, find_duplicate, lock_rows
+
+logger = logging.getLogger(__name__)
+
+_pool = None
+_pool_lock = Lock()
+
+
+def get_pool():
+    """The process's parse pool of ``settings.BULK_UPLOAD_PROCESSES`` children, started on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: children start clean instead of inheriting the request's database connections
+            _pool = ProcessPoolExecutor(max_workers=settings.BULK_UPLOAD_PROCESSES or os.cpu_count(),
+                                        mp_context=multiprocessing.get_context('spawn'),
+                                        initializer=django.setup)
+        return _pool
+
+
+def _discard_pool(pool):
+    # A child that died (e.g. killed for memory) breaks the pool; the next batch starts a new one
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False)
+
+
+def archive_members(archive):
+    """``(name, File)`` for each file in the open ZipFile ``archive``, skipping folders and metadata."""
+    for info in archive.infolist():
+        name = os.path.basename(info.filename)
+        if info.is_dir() or not name or name.startswith('.') or info.filename.startswith('__MACOSX/'):
+            continue
+        yield name, File(archive.open(info), name=name)
+
+
+def parse_file(path, chunk_size, engine):
+    """
+    Runs in a pool process: parse the CSV at ``path`` into its columnar copy
+    and return the dataset's summary fields.
+    """
+    writer = ColumnarWriter(sidecar_path(path))
+    try:
+        summary = ingest_csv(path, on_rows=writer, chunk_size=chunk_size, engine=engine)
+    except BaseException:
+        writer.abort()
+        raise
+    writer.close()
+    return dataset_fields(summary, ColumnarDataset(writer.path))
+
+
+class BatchItem:
+    def __init__(self, name):
+        self.name = name
+        self.title = name
+        self.dataset = None
+        self.source = None  # dataset or earlier item with the same content
+        self.fields = None
+        self.error = None
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def result(self, retained_ids):
+        # A dataset that retention removed right away has no id to report
+        retained = self.ok and self.dataset.pk in retained_ids
+        return {
+            'file': self.name,
+            'title': self.title,
+            'status': IngestJob.STATUS_DONE if self.ok else IngestJob.STATUS_FAILED,
+            'dataset': self.dataset.pk if retained else None,
+            'retained': retained,
+            'error': self.error,
+        }
+
+
+class BatchIngest:
+    """
+    Store, parse and save one batch of ``(name, File)`` uploads for ``user``.
+    With ``processes`` (default ``settings.BULK_UPLOAD_PROCESSES``, else the
+    CPU count) of 1, or a single file to parse, files are parsed in this
+    process; otherwise in the shared pool.
+    """
+
+    def __init__(self, user, files, processes=None):
+        self.user = user
+        self.files = files
+        self.processes = processes or getattr(settings, 'BULK_UPLOAD_PROCESSES', None) or os.cpu_count()
+        self.items = []
+
+    def run(self):
+        self.prepare()
+        self.parse()
+        self.save()
+        return self.results()
+
+    def prepare(self):
+        """Check titles and schemas and store the files, serially and without parsing them."""
+        taken = set(DataCSV.objects.filter(user=self.user).values_list('title', flat=True))
+        taken.update(IngestJob.objects.filter(
+            user=self.user, status__in=[IngestJob.STATUS_PENDING, IngestJob.STATUS_RUNNING],
+        ).values_list('title', flat=True))
+        by_hash = {}
+
+        for name, upload in self.files:
+            item = BatchItem(name)
+            self.items.append(item)
+            if not name.endswith('.csv'):
+                item.error = "Only CSV files are allowed."
+                continue
+            if len(name) > DataCSV._meta.get_field('title').max_length:
+                item.error = "File name is too long."
+                continue
+            if name in taken:
+                item.error = "You already have a file with this title."
+                continue
+            try:
+                validate_csv(upload)
+            except CSV_ERRORS as e:
+                item.error = f"Invalid CSV file: {e}"
+                continue
+            taken.add(name)
+
+            digest = content_hash(upload)
+            item.dataset = DataCSV(user=self.user, title=item.title, content_hash=digest)
+            item.source = by_hash.get(digest) or find_duplicate(self.user, digest)
+            if item.source is None:
+                by_hash[digest] = item
+                item.dataset.csv_file.save(name, upload, save=False)
+            else:
+                # Same content as an existing dataset or an earlier file of the batch: share its file
+                source = item.source.dataset if isinstance(item.source, BatchItem) else item.source
+                item.dataset.csv_file = source.csv_file.name
+
+    def pending(self):
+        return [item for item in self.items if item.ok and item.source is None]
+
+    def parse_args(self):
+        return get_chunk_size(), getattr(settings, 'CSV_PARSE_ENGINE', None)
+
+    def in_pool(self):
+        return len(self.pending()) > 1 and self.processes > 1
+
+    def parse_here(self):
+        for item in self.pending():
+            self.collect(item, lambda: parse_file(item.dataset.csv_file.path, *self.parse_args()))
+
+    def submit(self):
+        """Queue every pending file on the shared pool; ``(item, future)`` pairs."""
+        pool = get_pool()
+        try:
+            return pool, [(item, pool.submit(parse_file, item.dataset.csv_file.path, *self.parse_args()))
+                          for item in self.pending()]
+        except BrokenProcessPool:
+            _discard_pool(pool)
+            return self.submit()
+
+    def parse(self):
+        if not self.in_pool():
+            self.parse_here()
+            return
+        pool, futures = self.submit()
+        for item, future in futures:
+            self.collect(item, future.result, pool)
+
+    async def aparse(self):
+        """parse() for async views: the event loop waits on the pool, not a thread."""
+        if not self.in_pool():
+            await offload(self.parse_here)
+            return
+        pool, futures = self.submit()
+        await asyncio.gather(*[asyncio.wrap_future(future) for _, future in futures], return_exceptions=True)
+        for item, future in futures:
+            self.collect(item, future.result, pool)
+
+    def collect(self, item, result, pool=None):
+        try:
+            item.fields = result()
+        except CSV_ERRORS as e:
+            item.error = f"Invalid CSV file: {e}"
+        except BrokenProcessPool as e:
+            logger.exception("The parse pool broke while parsing %s of a bulk upload", item.name)
+            _discard_pool(pool)
+            item.error = str(e)
+        except Exception as e:
+            logger.exception("Parsing %s of a bulk upload failed", item.name)
+            item.error = str(e)
+
+    def save(self):
+        """Create every parsed dataset in one transaction, then apply retention once."""
+        with transaction.atomic():
+            lock_rows(User.objects.filter(pk=self.user.pk))
+            for item in self.items:
+                if item.ok:
+                    self.save_item(item)
+            apply_retention(self.user)
+
+        for item in self.items:
+            if not item.ok:
+                self.discard(item)
+        # Compressing the full responses is left to the worker, off the request
+        precompress_later()
+
+    def save_item(self, item):
+        dataset = item.dataset
+        source = item.source
+        if isinstance(source, BatchItem):
+            # Saved earlier in this loop, unless it failed
+            if not source.ok:
+                item.error = source.error
+                return
+            source = source.dataset
+        try:
+            # A savepoint per file, so one lost race on a title spares the rest
+            with transaction.atomic():
+                if source is None:
+                    for name, value in item.fields.items():
+                        setattr(dataset, name, value)
+                    dataset.save()
+                    columns = ColumnarDataset(sidecar_path(dataset.csv_file.path))
+                    rows = EquipmentRowWriter(dataset)
+                    for chunk in columns.iter_chunks(get_chunk_size()):
+                        rows(chunk)
+                else:
+                    for name in DataCSV.STATS_FIELDS:
+                        setattr(dataset, name, getattr(source, name))
+                    dataset.save()
+                    EquipmentRow.copy_rows(source, dataset)
+        except IntegrityError:
+            dataset.pk = None
+            item.error = "You already have a file with this title."
+
+    def discard(self, item):
+        dataset = item.dataset
+        if dataset is None or not dataset.csv_file or item.source is not None:
+            return
+        if not DataCSV.file_in_use(dataset.csv_file.name):
+            path = dataset.csv_file.path
+            if os.path.isfile(path):
+                os.remove(path)
+            shutil.rmtree(sidecar_path(path), ignore_errors=True)
+
+    def retained(self):
+        ids = [item.dataset.pk for item in self.items if item.ok and item.dataset.pk]
+        return list(DataCSV.objects.filter(pk__in=ids))
+
+    def results(self):
+        retained_ids = {dataset.pk for dataset in self.retained()}
+        return [item.result(retained_ids) for item in self.items]
+
+
+def ingest_batch(user, files, processes=None):
+    """Ingest ``(name, File)`` pairs for ``user``; returns one result dict per file."""
+    return BatchIngest(user, files, processes).run()
+
+
+async def aingest_batch(user, files, processes=None):
+    """ingest_batch() for async views; the database work runs through sync_to_async."""
+    batch = BatchIngest(user, files, processes)
+    await sync_to_async(batch.prepare)()
+    await batch.aparse()
+    await sync_to_async(batch.save)()
+    return await sync_to_async(batch.results)()
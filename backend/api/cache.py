@@ -0,0 +1,254 @@
+"""
+Cache for dataset read responses.
+
+Rendered dataset and last-5 responses, and chart payloads, are kept in the
+cache named by ``settings.RESPONSE_CACHE_ALIAS``. Two backends bound that
+cache by size in bytes and evict the least recently used entries first:
+ByteBoundedLocMemCache (per process) and ByteBoundedFileBasedCache (shared
+by every process that can see the directory).
+
+Entries live under a scope: one per dataset and one per user's list. Each
+scope has a generation token in its keys; ``invalidate`` drops the token, so
+everything cached under it becomes unreachable and ages out of the LRU.
+DataCSV saves and deletes (upload, delete, retention) invalidate through
+the signal handlers in api/signals.py.
+
+Hit and miss counts are kept per process, outside the cache: counting a read
+costs no cache write, and eviction cannot reset the counters.
+"""
+import os
+import time
+import uuid
+from collections import Counter
+from threading import Lock
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+# A file cache that is over its bounds is culled down to this share of them,
+# so the writes that follow do not each have to cull again
+CULL_TARGET = 0.9
+# Seconds between full scans of a file cache's directory; a process only sees
+# the other processes' writes when it scans
+SCAN_INTERVAL = 60
+
+# Byte usage of each named ByteBoundedLocMemCache, shared like LocMemCache's storage
+_usage = {}
+_usage_lock = Lock()
+
+
+class _Usage:
+    def __init__(self):
+        self.sizes = {}
+        self.total = 0
+
+    def put(self, key, size):
+        self.total += size - self.sizes.get(key, 0)
+        self.sizes[key] = size
+
+    def drop(self, key):
+        self.total -= self.sizes.pop(key, 0)
+
+
+class ByteBoundedLocMemCache(LocMemCache):
+    """
+    LocMemCache that also evicts least recently used entries once the pickled
+    values exceed ``OPTIONS['MAX_BYTES']``. LocMemCache already keeps its
+    entries in recency order, so eviction pops from the old end.
+    """
+
+    def __init__(self, name, params):
+        super().__init__(name, params)
+        self.max_bytes = int(params.get('OPTIONS', {}).get('MAX_BYTES', DEFAULT_MAX_BYTES))
+        with _usage_lock:
+            self._usage = _usage.setdefault(name, _Usage())
+
+    def _set(self, key, value, timeout=DEFAULT_TIMEOUT):
+        super()._set(key, value, timeout)
+        self._usage.put(key, len(value))
+        # The entry just written sits at the recent end and is never evicted
+        while self._usage.total > self.max_bytes and len(self._cache) > 1:
+            old_key, _ = self._cache.popitem()
+            del self._expire_info[old_key]
+            self._usage.drop(old_key)
+
+    def _delete(self, key):
+        self._usage.drop(key)
+        return super()._delete(key)
+
+    def _cull(self):
+        super()._cull()
+        for key in set(self._usage.sizes) - set(self._cache):
+            self._usage.drop(key)
+
+    def incr(self, key, delta=1, version=None):
+        value = super().incr(key, delta, version)
+        with self._lock:
+            key = self.make_and_validate_key(key, version=version)
+            if key in self._cache:
+                self._usage.put(key, len(self._cache[key]))
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+            self._expire_info.clear()
+            self._usage.sizes.clear()
+            self._usage.total = 0
+
+    def usage(self):
+        return {'bytes': self._usage.total, 'entries': len(self._cache), 'max_bytes': self.max_bytes}
+
+
+class ByteBoundedFileBasedCache(FileBasedCache):
+    """
+    FileBasedCache that evicts least recently used files once the directory
+    holds more than ``OPTIONS['MAX_BYTES']``. Reads bump a file's mtime, so
+    mtime order is recency order.
+
+    Listing and stat-ing the directory is the expensive part, so writes do
+    not do it. Each process keeps a running total of the bytes and entries,
+    adjusted by what it writes. The directory is only scanned, and culled
+    to CULL_TARGET of the bounds, when that total goes over them or when
+    the last scan is SCAN_INTERVAL seconds old.
+    """
+
+    def __init__(self, dir, params):
+        super().__init__(dir, params)
+        self.max_bytes = int(params.get('OPTIONS', {}).get('MAX_BYTES', DEFAULT_MAX_BYTES))
+        self._totals = None
+        self._scanned_at = 0.0
+        self._totals_lock = Lock()
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, default, version)
+        if value is not default:
+            try:
+                os.utime(self._key_to_file(key, version))
+            except FileNotFoundError:
+                pass
+        return value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        fname = self._key_to_file(key, version)
+        old_size = self._file_size(fname)
+        super().set(key, value, timeout, version)
+        size = self._file_size(fname) or 0
+
+        with self._totals_lock:
+            scan = self._totals is None or time.monotonic() - self._scanned_at > SCAN_INTERVAL
+            if not scan:
+                total, count = self._totals
+                self._totals = (total + size - (old_size or 0), count + (old_size is None))
+                scan = self._totals[0] > self.max_bytes or self._totals[1] >= self._max_entries
+        if scan:
+            self._evict(keep=fname)
+
+    @staticmethod
+    def _file_size(fname):
+        try:
+            return os.stat(fname).st_size
+        except FileNotFoundError:
+            return None
+
+    def _cull(self):
+        # FileBasedCache.set calls this before every write; set() culls by size instead
+        pass
+
+    def _stat_files(self):
+        entries = []
+        for fname in self._list_cache_files():
+            try:
+                stat = os.stat(fname)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, fname))
+        return entries
+
+    def _evict(self, keep=None):
+        """Scan the directory and, if it is over the bounds, delete the oldest files down to CULL_TARGET."""
+        entries = sorted(self._stat_files())
+        total = sum(size for _, size, _ in entries)
+        count = len(entries)
+        if total > self.max_bytes or count >= self._max_entries:
+            for _, size, fname in entries:
+                if total <= self.max_bytes * CULL_TARGET and count < self._max_entries * CULL_TARGET:
+                    break
+                if fname != keep and self._delete(fname):
+                    total -= size
+                    count -= 1
+        with self._totals_lock:
+            self._totals = (total, count)
+            self._scanned_at = time.monotonic()
+
+    def usage(self):
+        entries = self._stat_files()
+        return {'bytes': sum(size for _, size, _ in entries), 'entries': len(entries),
+                'max_bytes': self.max_bytes}
+
+
+def dataset_scope(dataset_id):
+    return f"dataset:{dataset_id}"
+
+
+def user_scope(user_id):
+    return f"user:{user_id}"
+
+
+class ResponseCache:
+    def __init__(self):
+        self._counts = Counter()
+        self._counts_lock = Lock()
+
+    @property
+    def cache(self):
+        return caches[settings.RESPONSE_CACHE_ALIAS]
+
+    def generation(self, scope):
+        key = f"gen:{scope}"
+        token = self.cache.get(key)
+        if token is None:
+            token = uuid.uuid4().hex
+            if not self.cache.add(key, token, None):
+                # Another request started the generation first
+                token = self.cache.get(key) or token
+        return token
+
+    def key(self, scope, *parts):
+        return ':'.join([scope, self.generation(scope), *map(str, parts)])
+
+    def get(self, key):
+        value = self.cache.get(key)
+        with self._counts_lock:
+            self._counts['misses' if value is None else 'hits'] += 1
+        return value
+
+    def set(self, key, value):
+        self.cache.set(key, value, settings.RESPONSE_CACHE_TIMEOUT)
+
+    def invalidate(self, *scopes):
+        self.cache.delete_many([f"gen:{scope}" for scope in scopes])
+
+    def stats(self):
+        """This process's hits and misses, and the cache's size where the backend reports it."""
+        with self._counts_lock:
+            hits, misses = self._counts['hits'], self._counts['misses']
+        stats = {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / (hits + misses) if hits + misses else None,
+        }
+        if hasattr(self.cache, 'usage'):
+            stats.update(self.cache.usage())
+        return stats
+
+    def reset_stats(self):
+        with self._counts_lock:
+            self._counts.clear()
+
+
+response_cache = ResponseCache()
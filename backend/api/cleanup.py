@@ -0,0 +1,109 @@
+"""
+Deferred removal of deleted datasets' files.
+
+Retention evicts datasets inside the transaction that completes an upload.
+Removing their CSV, columnar copy and stored responses there would put
+filesystem work on the upload path (a columnar folder of a large dataset
+takes a while to delete). Instead the paths are queued as FileCleanup rows in
+the same transaction, so a rollback queues nothing, and the ingest worker
+removes them in batches whenever it has no job to run. Without a worker
+(``CSV_INGEST_EAGER``), the process that evicted starts a background purge
+once its transaction commits; ``manage.py purge_files`` empties the queue
+from anywhere else, e.g. a cron job.
+
+A CSV shared by deduplicated datasets is only removed once no dataset uses
+it; that is checked when the batch is purged, not when it is queued.
+"""
+import logging
+import os
+import shutil
+import threading
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from .columnar import sidecar_path
+from .models import DataCSV, FileCleanup
+from .responses import precompressed_paths
+
+logger = logging.getLogger(__name__)
+
+# Held by the background purge of this process, so at most one runs
+_purging = threading.Lock()
+
+
+def queue_files(paths, csv_file=''):
+    """Queue ``paths`` (absolute, under MEDIA_ROOT) for removal."""
+    FileCleanup.objects.bulk_create([
+        FileCleanup(path=os.path.relpath(path, settings.MEDIA_ROOT), csv_file=csv_file) for path in paths
+    ])
+
+
+def evict(dataset):
+    """Delete ``dataset`` now and queue its files for the worker."""
+    if dataset.csv_file:
+        queue_files([dataset.csv_file.path, sidecar_path(dataset.csv_file.path)], csv_file=dataset.csv_file.name)
+    queue_files(precompressed_paths(dataset.pk, dataset.uploaded_at))
+    dataset.delete(keep_files=True)
+    if settings.CSV_INGEST_EAGER:
+        # No worker will come by to purge
+        transaction.on_commit(purge_in_background)
+
+
+def _remove(path):
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+        return
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def purge_files(batch_size=None):
+    """
+    Remove up to ``batch_size`` queued files, oldest first. Returns how many
+    queue entries were handled, so 0 means the queue is empty.
+    """
+    batch_size = batch_size or settings.FILE_CLEANUP_BATCH_SIZE
+    entries = list(FileCleanup.objects.order_by('pk')[:batch_size])
+    if not entries:
+        return 0
+
+    shared = {entry.csv_file for entry in entries if entry.csv_file}
+    in_use = set(DataCSV.objects.filter(csv_file__in=shared).values_list('csv_file', flat=True))
+    for entry in entries:
+        if entry.csv_file in in_use:
+            continue
+        try:
+            _remove(os.path.join(settings.MEDIA_ROOT, entry.path))
+        except OSError:
+            logger.exception("Removing %s failed", entry.path)
+    # Two workers may purge the same batch; removing a file twice is harmless
+    FileCleanup.objects.filter(pk__in=[entry.pk for entry in entries]).delete()
+    return len(entries)
+
+
+def purge_all():
+    """Purge batches until the queue is empty; returns the number of entries handled."""
+    total = 0
+    while handled := purge_files():
+        total += handled
+    return total
+
+
+def _purge_thread():
+    try:
+        purge_all()
+    except Exception:
+        logger.exception("Purging queued files failed")
+    finally:
+        connection.close()
+        _purging.release()
+
+
+def purge_in_background():
+    """Empty the queue in a thread of this process, unless one is already doing so."""
+    if not _purging.acquire(blocking=False):
+        return
+    threading.Thread(target=_purge_thread, name='purge-files', daemon=True).start()
@@ -0,0 +1,255 @@
+"""
+Columnar binary copy of an uploaded equipment CSV.
+
+Each dataset gets a ``<csv file>.columns/`` directory next to its CSV:
+
+    manifest.json           row count and the Type categories
+    Flowrate.npy            float64, NaN for empty cells
+    Pressure.npy            float64
+    Temperature.npy         float64
+    Type.npy                int32 codes into manifest["types"], -1 for empty
+    Equipment Name.npy      int64 offsets (rows + 1) into names.bin
+    names.bin               UTF-8 names, back to back
+
+The .npy files are plain NumPy arrays so they can be memory-mapped with
+``np.load(..., mmap_mode='r')``; nothing is parsed when reading them back.
+Chunks are appended while the CSV streams in and the array headers are
+written last, once the row count is known. A writer can be pickled between
+appends (resumable uploads parse a file over many requests); unpickling
+reopens its files and drops anything appended after the pickle was taken.
+
+The copy was made .npy rather than Arrow/Parquet when pyarrow was not a
+dependency. It has been one since the pyarrow CSV engine (api/ingest.py),
+but the format stays: readers want NumPy arrays, which a memory-mapped .npy
+gives without conversion, and the copy keeps working where pyarrow is left
+out and the ingest falls back to the C engine.
+"""
+import json
+import os
+import shutil
+import struct
+
+import numpy as np
+import pandas as pd
+
+METRIC_COLUMNS = ['Flowrate', 'Pressure', 'Temperature']
+NAME_COLUMN = 'Equipment Name'
+TYPE_COLUMN = 'Type'
+
+MANIFEST = 'manifest.json'
+NAMES_BLOB = 'names.bin'
+FORMAT_VERSION = 1
+
+# Fixed .npy header size, so the header can be rewritten in place at the end
+HEADER_SIZE = 128
+
+
+def sidecar_path(csv_path):
+    return f"{csv_path}.columns"
+
+
+def _npy_header(dtype, rows):
+    header = repr({
+        'descr': np.lib.format.dtype_to_descr(np.dtype(dtype)),
+        'fortran_order': False,
+        'shape': (rows,),
+    }).encode('latin1')
+    padding = HEADER_SIZE - 10 - len(header) - 1
+    return b'\x93NUMPY\x01\x00' + struct.pack('<H', HEADER_SIZE - 10) + header + b' ' * padding + b'\n'
+
+
+class _ArrayFile:
+    """A 1-D .npy file that is appended to and finalised with its real length."""
+
+    def __init__(self, path, dtype):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.rows = 0
+        self.file = open(path, 'wb')
+        self.file.write(_npy_header(self.dtype, 0))
+
+    def __getstate__(self):
+        self.file.flush()
+        return {'path': self.path, 'dtype': self.dtype, 'rows': self.rows}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.file = open(self.path, 'r+b')
+        self.file.truncate(HEADER_SIZE + self.rows * self.dtype.itemsize)
+        self.file.seek(0, os.SEEK_END)
+
+    def append(self, values):
+        values = np.ascontiguousarray(values, dtype=self.dtype)
+        self.file.write(values.tobytes())
+        self.rows += len(values)
+
+    def close(self):
+        self.file.seek(0)
+        self.file.write(_npy_header(self.dtype, self.rows))
+        self.file.close()
+
+
+class ColumnarWriter:
+    """
+    ``on_rows`` sink for ingest_csv that appends each chunk to the columnar
+    copy at ``path``. Files are written to a temporary directory (``tmp_path``,
+    by default one per process) and moved into place by ``close``, so readers
+    never see a half-written copy.
+    """
+
+    def __init__(self, path, tmp_path=None):
+        self.path = path
+        self.tmp_path = tmp_path or f"{path}.tmp{os.getpid()}"
+        shutil.rmtree(self.tmp_path, ignore_errors=True)
+        os.makedirs(self.tmp_path)
+
+        self.metrics = {
+            col: _ArrayFile(os.path.join(self.tmp_path, f"{col}.npy"), np.float64)
+            for col in METRIC_COLUMNS
+        }
+        self.type_codes = _ArrayFile(os.path.join(self.tmp_path, f"{TYPE_COLUMN}.npy"), np.int32)
+        self.name_offsets = _ArrayFile(os.path.join(self.tmp_path, f"{NAME_COLUMN}.npy"), np.int64)
+        self.name_offsets.append([0])
+        self.names = open(os.path.join(self.tmp_path, NAMES_BLOB), 'wb')
+        self.names_size = 0
+        self.types = {}
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        self.names.flush()
+        state['names'] = self.names.name
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.names = open(self.names, 'r+b')
+        self.names.truncate(self.names_size)
+        self.names.seek(0, os.SEEK_END)
+
+    @property
+    def rows(self):
+        return self.type_codes.rows
+
+    def suspend(self):
+        """Close the open files, leaving the copy to be resumed from a pickle of the writer."""
+        for array in [*self.metrics.values(), self.type_codes, self.name_offsets]:
+            array.file.close()
+        self.names.close()
+
+    def __call__(self, chunk):
+        for col, array in self.metrics.items():
+            array.append(pd.to_numeric(chunk[col], errors='coerce').to_numpy(np.float64, na_value=np.nan))
+
+        types = chunk[TYPE_COLUMN]
+        if not isinstance(types.dtype, pd.CategoricalDtype):
+            types = types.astype('category')
+        # Chunk category codes -> dataset type codes; the trailing -1 maps empty cells (code -1)
+        mapping = np.array([self.types.setdefault(str(value), len(self.types))
+                            for value in types.cat.categories] + [-1], dtype=np.int32)
+        self.type_codes.append(mapping[types.cat.codes.to_numpy()])
+
+        encoded = [name.encode('utf-8') for name in chunk[NAME_COLUMN].fillna('').astype(str)]
+        lengths = np.fromiter((len(name) for name in encoded), dtype=np.int64, count=len(encoded))
+        self.name_offsets.append(self.names_size + np.cumsum(lengths))
+        self.names.write(b''.join(encoded))
+        self.names_size += int(lengths.sum())
+
+    def close(self):
+        for array in self.metrics.values():
+            array.close()
+        self.type_codes.close()
+        self.name_offsets.close()
+        self.names.close()
+
+        manifest = {
+            'version': FORMAT_VERSION,
+            'rows': self.rows,
+            'types': sorted(self.types, key=self.types.get),
+        }
+        with open(os.path.join(self.tmp_path, MANIFEST), 'w') as f:
+            json.dump(manifest, f)
+
+        shutil.rmtree(self.path, ignore_errors=True)
+        os.replace(self.tmp_path, self.path)
+
+    def abort(self):
+        self.suspend()
+        shutil.rmtree(self.tmp_path, ignore_errors=True)
+
+
+class ColumnarDataset:
+    """Read-only, memory-mapped view of a columnar copy."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, MANIFEST)) as f:
+            manifest = json.load(f)
+        if manifest.get('version') != FORMAT_VERSION:
+            raise ValueError(f"Unsupported columnar format version: {manifest.get('version')}")
+        self.rows = manifest['rows']
+        self.type_categories = manifest['types']
+        self._arrays = {}
+
+    @classmethod
+    def exists(cls, path):
+        return os.path.isfile(os.path.join(path, MANIFEST))
+
+    def _load(self, name):
+        if name not in self._arrays:
+            self._arrays[name] = np.load(os.path.join(self.path, f"{name}.npy"), mmap_mode='r')
+        return self._arrays[name]
+
+    def metric(self, column):
+        """Memory-mapped float64 values of a metric column (NaN for empty cells)."""
+        if column not in METRIC_COLUMNS:
+            raise KeyError(column)
+        return self._load(column)
+
+    @property
+    def type_codes(self):
+        return self._load(TYPE_COLUMN)
+
+    def types(self, start=0, stop=None):
+        codes = np.asarray(self.type_codes[start:stop])
+        return pd.Categorical.from_codes(codes, categories=self.type_categories)
+
+    def names(self, start=0, stop=None):
+        """Decode the names of rows ``start:stop`` into an object array."""
+        offsets = np.asarray(self._load(NAME_COLUMN)[start:(self.rows if stop is None else stop) + 1])
+        if len(offsets) < 2:
+            return np.array([], dtype=object)
+        with open(os.path.join(self.path, NAMES_BLOB), 'rb') as f:
+            f.seek(int(offsets[0]))
+            blob = f.read(int(offsets[-1] - offsets[0]))
+        bounds = offsets - offsets[0]
+        return np.array([blob[a:b].decode('utf-8') for a, b in zip(bounds[:-1], bounds[1:])], dtype=object)
+
+    def names_at(self, index):
+        """Decode the names of the rows at positions ``index``."""
+        index = np.asarray(index, dtype=np.int64)
+        if not len(index):
+            return np.array([], dtype=object)
+        offsets = self._load(NAME_COLUMN)
+        starts, stops = np.asarray(offsets[index]), np.asarray(offsets[index + 1])
+        if offsets[-1]:
+            blob = np.memmap(os.path.join(self.path, NAMES_BLOB), dtype=np.uint8, mode='r')
+        else:
+            blob = np.zeros(0, dtype=np.uint8)  # np.memmap refuses empty files
+        return np.array([bytes(blob[a:b]).decode('utf-8') for a, b in zip(starts, stops)], dtype=object)
+
+    def to_frame(self, start=0, stop=None, columns=None):
+        """Rows ``start:stop`` as a DataFrame with the CSV column names."""
+        columns = columns or [NAME_COLUMN, TYPE_COLUMN] + METRIC_COLUMNS
+        data = {}
+        for col in columns:
+            if col == NAME_COLUMN:
+                data[col] = self.names(start, stop)
+            elif col == TYPE_COLUMN:
+                data[col] = self.types(start, stop)
+            else:
+                data[col] = np.asarray(self.metric(col)[start:stop])
+        return pd.DataFrame(data, columns=columns)
+
+    def iter_chunks(self, chunk_size, columns=None):
+        for start in range(0, self.rows, chunk_size):
+            yield self.to_frame(start, min(start + chunk_size, self.rows), columns)
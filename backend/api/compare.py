@@ -0,0 +1,156 @@
+"""
+Comparison of two datasets, e.g. this week's equipment snapshot and last week's.
+
+Rows are matched on Equipment Name in one vectorized pass over the two
+columnar copies: the names of both are factorized together, and each row's
+(name code, occurrence) key is looked up in a hash index of the other
+dataset's keys. A name that occurs more than once in a dataset is matched by
+occurrence: the second "Pump-1" of one dataset pairs with the second
+"Pump-1" of the other. Deltas, type changes, added and removed rows are then
+picked out with array masks; Python objects are only built for the rows
+that are returned.
+
+Summary and type distribution changes come from the stored stats, so they
+cover the whole datasets whatever ``limit`` cuts from the row lists.
+"""
+import numpy as np
+import pandas as pd
+
+from .columnar import METRIC_COLUMNS, NAME_COLUMN, TYPE_COLUMN
+
+SUMMARY_STATS = ['total_count', 'average_flowrate', 'average_pressure', 'average_temperature']
+
+
+def _keys(codes):
+    # (name code, occurrence of that name so far) packed into one int64
+    occurrence = pd.Series(codes).groupby(codes, sort=False).cumcount().to_numpy()
+    return (codes.astype(np.int64) << 32) | occurrence
+
+
+def match_rows(names_a, names_b):
+    """For each row of ``a``, the position of its match in ``b``, or -1."""
+    codes, _ = pd.factorize(np.concatenate([names_a, names_b]))
+    keys_a, keys_b = _keys(codes[:len(names_a)]), _keys(codes[len(names_a):])
+    return pd.Index(keys_b).get_indexer(keys_a)
+
+
+def _type_codes_in(columns_a, columns_b):
+    """``a``'s type codes translated to ``b``'s categories; types ``b`` lacks become -2."""
+    index = {kind: code for code, kind in enumerate(columns_b.type_categories)}
+    # The trailing -1 keeps empty cells (code -1) empty
+    mapping = np.array([index.get(kind, -2) for kind in columns_a.type_categories] + [-1], dtype=np.int32)
+    return mapping[np.asarray(columns_a.type_codes)]
+
+
+def _value(values, i):
+    value = values[i]
+    return None if np.isnan(value) else value.item()
+
+
+def _type(columns, i):
+    kind = int(columns.type_codes[i])
+    return columns.type_categories[kind] if kind >= 0 else None
+
+
+def _row(columns, names, i):
+    row = {NAME_COLUMN: names[i], TYPE_COLUMN: _type(columns, i)}
+    for col in METRIC_COLUMNS:
+        row[col] = _value(columns.metric(col), i)
+    return row
+
+
+def _change(a, b):
+    return {'a': a, 'b': b, 'delta': None if a is None or b is None else b - a}
+
+
+def type_distribution_changes(a, b):
+    """Count and share of each type in both datasets, most common in ``b`` first."""
+    counts_a = a.equipment_type_distribution or {}
+    counts_b = b.equipment_type_distribution or {}
+    total_a, total_b = sum(counts_a.values()), sum(counts_b.values())
+    types = sorted(set(counts_a) | set(counts_b),
+                   key=lambda kind: (-counts_b.get(kind, 0), -counts_a.get(kind, 0), kind))
+    result = {}
+    for kind in types:
+        count_a, count_b = counts_a.get(kind, 0), counts_b.get(kind, 0)
+        share_a = count_a / total_a if total_a else None
+        share_b = count_b / total_b if total_b else None
+        result[kind] = {
+            'a': count_a,
+            'b': count_b,
+            'delta': count_b - count_a,
+            'share_a': share_a,
+            'share_b': share_b,
+            'share_delta': None if share_a is None or share_b is None else share_b - share_a,
+        }
+    return result
+
+
+def compare_datasets(a, columns_a, b, columns_b, limit):
+    """
+    Changes from dataset ``a`` to dataset ``b`` (DataCSV objects with their
+    ColumnarDatasets). Each row list holds at most ``limit`` rows, in the
+    order of the dataset they come from; the counts are always complete.
+    """
+    names_a, names_b = columns_a.names(), columns_b.names()
+    match = match_rows(names_a, names_b)
+
+    # Matched pairs in b's row order
+    rows_a = np.flatnonzero(match >= 0)
+    rows_b = match[rows_a]
+    order = np.argsort(rows_b, kind='stable')
+    rows_a, rows_b = rows_a[order], rows_b[order]
+    removed = np.flatnonzero(match < 0)
+    in_a = np.zeros(columns_b.rows, dtype=bool)
+    in_a[rows_b] = True
+    added = np.flatnonzero(~in_a)
+
+    types_a = _type_codes_in(columns_a, columns_b)[rows_a]
+    types_b = np.asarray(columns_b.type_codes)[rows_b]
+    changed = types_a != types_b
+    type_changes = int(changed.sum())
+
+    values, metrics = {}, {}
+    for col in METRIC_COLUMNS:
+        va = np.asarray(columns_a.metric(col))[rows_a]
+        vb = np.asarray(columns_b.metric(col))[rows_b]
+        # Two empty cells are equal; an empty and a filled one are not
+        differs = (va != vb) & ~(np.isnan(va) & np.isnan(vb))
+        changed |= differs
+        delta = vb - va
+        values[col] = va, vb, delta
+        has_delta = bool(len(delta)) and not np.isnan(delta).all()
+        metrics[col] = {
+            'changed': int(differs.sum()),
+            'mean_delta': float(np.nanmean(delta)) if has_delta else None,
+            'min_delta': float(np.nanmin(delta)) if has_delta else None,
+            'max_delta': float(np.nanmax(delta)) if has_delta else None,
+        }
+
+    changed_rows = []
+    for i in np.flatnonzero(changed)[:limit]:
+        row_a, row_b = rows_a[i], rows_b[i]
+        row = {NAME_COLUMN: names_b[row_b],
+               TYPE_COLUMN: {'a': _type(columns_a, row_a), 'b': _type(columns_b, row_b)}}
+        for col, (va, vb, delta) in values.items():
+            row[col] = {'a': _value(va, i), 'b': _value(vb, i), 'delta': _value(delta, i)}
+        changed_rows.append(row)
+
+    return {
+        'a': {'id': a.pk, 'title': a.title, 'uploaded_at': a.uploaded_at},
+        'b': {'id': b.pk, 'title': b.title, 'uploaded_at': b.uploaded_at},
+        'summary': {name: _change(getattr(a, name), getattr(b, name)) for name in SUMMARY_STATS},
+        'type_distribution': type_distribution_changes(a, b),
+        'equipment': {
+            'matched': len(rows_a),
+            'changed': int(changed.sum()),
+            'type_changed': type_changes,
+            'added': len(added),
+            'removed': len(removed),
+            'metrics': metrics,
+        },
+        'limit': limit,
+        'changed': changed_rows,
+        'added': [_row(columns_b, names_b, i) for i in added[:limit]],
+        'removed': [_row(columns_a, names_a, i) for i in removed[:limit]],
+    }
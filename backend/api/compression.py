@@ -0,0 +1,105 @@
+"""
+Content-Encoding negotiation and the zstd, br and gzip codecs.
+
+CompressionMiddleware uses these to compress API responses on the fly, and
+api/responses.py to compress full dataset responses once at ingest.
+"""
+import zlib
+
+import brotli
+import zstandard
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+# Server preference, best first
+ENCODINGS = ('zstd', 'br', 'gzip')
+EXTENSIONS = {'zstd': 'zst', 'br': 'br', 'gzip': 'gz'}
+
+
+class _BrotliCompressor:
+    def __init__(self, level):
+        self._compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.finish()
+
+
+def compressor(encoding, level):
+    """An object with ``compress(chunk)`` and ``flush()``, for streaming ``encoding``."""
+    if encoding == 'gzip':
+        return zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    if encoding == 'br':
+        return _BrotliCompressor(level)
+    if encoding == 'zstd':
+        return zstandard.ZstdCompressor(level=level).compressobj()
+    raise ValueError(f"Unsupported encoding: {encoding}")
+
+
+def compress(data, encoding, level):
+    codec = compressor(encoding, level)
+    return codec.compress(data) + codec.flush()
+
+
+def negotiate(accept_encoding, available=ENCODINGS):
+    """
+    The encoding in ``available`` (ordered by preference) that the
+    ``Accept-Encoding`` header rates highest, or None for identity.
+    """
+    weights = {}
+    for item in (accept_encoding or '').split(','):
+        coding, _, params = item.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        weight = 1.0
+        name, _, value = params.strip().partition('=')
+        if name.strip().lower() == 'q':
+            try:
+                weight = float(value)
+            except ValueError:
+                weight = 0.0
+        weights[coding] = weight
+
+    best, best_weight = None, 0.0
+    for encoding in available:
+        weight = weights.get(encoding, weights.get('*', 0.0))
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+    return best
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """
+    Django's GZipMiddleware with zstd and br: the response is compressed with
+    the encoding the client rates highest (ties go to ``ENCODINGS`` order).
+    Streaming responses, and responses that already carry a Content-Encoding
+    such as precompressed dataset responses, are passed through untouched.
+    """
+
+    def process_response(self, request, response):
+        if response.streaming or response.has_header('Content-Encoding'):
+            return response
+        if len(response.content) < settings.RESPONSE_COMPRESSION_MIN_BYTES:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = negotiate(request.headers.get('Accept-Encoding'))
+        if encoding is None:
+            return response
+
+        compressed = compress(response.content, encoding, settings.RESPONSE_COMPRESSION_LEVELS[encoding])
+        if len(compressed) >= len(response.content):
+            return response
+
+        response.content = compressed
+        response.headers['Content-Length'] = str(len(compressed))
+        # The encoded body is another representation of the resource: weaken a strong ETag
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = encoding
+        return response
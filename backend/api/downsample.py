@@ -0,0 +1,102 @@
+"""
+Chart-sized views of a dataset's metric columns.
+
+``lttb`` and ``minmax`` reduce one metric (plotted against row position) to a
+few thousand points that still look like the full series; ``density`` bins a
+pair of metrics into a 2D count grid for scatter plots. All of them work on
+the memory-mapped columnar copy, never on EquipmentRow.
+"""
+import numpy as np
+
+
+def _finite(values):
+    """Row positions and values of the non-empty cells."""
+    values = np.asarray(values, dtype=np.float64)
+    index = np.flatnonzero(np.isfinite(values))
+    return index, values[index]
+
+
+def lttb(values, points):
+    """
+    Largest-Triangle-Three-Buckets downsampling.
+
+    Returns the positions of the chosen rows. The first and last rows are
+    always kept; every bucket in between contributes the row forming the
+    largest triangle with the previously chosen row and the next bucket's mean.
+    """
+    x, y = _finite(values)
+    n = len(x)
+    if points >= n or points < 3:
+        return x
+
+    # Bucket boundaries over the rows between the first and the last
+    edges = np.linspace(1, n - 1, points - 1).astype(np.int64)
+    starts, stops = edges[:-1], edges[1:]
+
+    # Mean point of every bucket, plus the last row as the final "next bucket"
+    sizes = np.maximum(stops - starts, 1)
+    mean_x = np.append(np.add.reduceat(x[:-1].astype(np.float64), starts) / sizes, x[-1])
+    mean_y = np.append(np.add.reduceat(y[:-1], starts) / sizes, y[-1])
+
+    chosen = np.empty(points, dtype=np.int64)
+    chosen[0], chosen[-1] = 0, n - 1
+    a = 0
+    for i, (start, stop) in enumerate(zip(starts, stops)):
+        bx, by = x[start:stop], y[start:stop]
+        cx, cy = mean_x[i + 1], mean_y[i + 1]
+        area = np.abs((x[a] - cx) * (by - y[a]) - (x[a] - bx) * (cy - y[a]))
+        a = start + int(np.argmax(area))
+        chosen[i + 1] = a
+    return x[chosen]
+
+
+def minmax(values, points):
+    """
+    Min-max decimation: split the rows into ``points // 2`` equal buckets and
+    keep the lowest and highest row of each, in row order.
+    """
+    x, y = _finite(values)
+    n = len(x)
+    buckets = max(points // 2, 1)
+    if points >= n:
+        return x
+
+    # Pad to a (buckets, width) grid so every bucket reduces in one call
+    width = -(-n // buckets)
+    padded = np.full(buckets * width, np.nan)
+    padded[:n] = y
+    grid = padded.reshape(buckets, width)
+    offsets = np.arange(buckets) * width
+    low = offsets + np.argmin(np.where(np.isnan(grid), np.inf, grid), axis=1)
+    high = offsets + np.argmax(np.where(np.isnan(grid), -np.inf, grid), axis=1)
+
+    picked = np.unique(np.concatenate([low, high]))
+    return x[picked[picked < n]]
+
+
+METHODS = {'lttb': lttb, 'minmax': minmax}
+
+
+def density(x_values, y_values, bins):
+    """
+    Count rows per cell of a ``bins`` x ``bins`` grid spanning both metrics.
+    Rows with an empty cell in either metric are left out.
+    """
+    x_values = np.asarray(x_values, dtype=np.float64)
+    y_values = np.asarray(y_values, dtype=np.float64)
+    mask = np.isfinite(x_values) & np.isfinite(y_values)
+    x, y = x_values[mask], y_values[mask]
+    if not len(x):
+        return {'x_edges': [], 'y_edges': [], 'counts': []}
+
+    x_edges = np.linspace(x.min(), x.max(), bins + 1)
+    y_edges = np.linspace(y.min(), y.max(), bins + 1)
+    # Bin with a single bincount instead of np.histogram2d; the maximum lands in the last bin
+    xi = np.clip(np.searchsorted(x_edges, x, side='right') - 1, 0, bins - 1)
+    yi = np.clip(np.searchsorted(y_edges, y, side='right') - 1, 0, bins - 1)
+    counts = np.bincount(xi * bins + yi, minlength=bins * bins).reshape(bins, bins)
+    return {
+        'x_edges': x_edges.tolist(),
+        'y_edges': y_edges.tolist(),
+        'counts': counts.tolist(),
+    }
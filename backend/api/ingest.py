@@ -0,0 +1,372 @@
+"""
+Streaming ingestion of equipment CSV files.
+
+The upload is read in bounded chunks (``settings.CSV_INGEST_CHUNK_SIZE`` rows
+at a time) and every chunk is folded into running accumulators, so peak memory
+depends on the chunk size rather than on the size of the file.
+"""
+import hashlib
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+try:
+    import pyarrow as pa
+    from pyarrow import csv as pa_csv
+except ImportError:
+    pa = None
+
+from .columnar import ColumnarDataset, ColumnarWriter, sidecar_path
+from .models import EquipmentRow
+from .sketches import CovarianceSketch, MetricSketch, nullable_matrix, combine_moments
+
+METRIC_COLUMNS = ['Flowrate', 'Pressure', 'Temperature']
+EQUIPMENT_COLUMNS = ['Equipment Name', 'Type'] + METRIC_COLUMNS
+
+DEFAULT_CHUNK_SIZE = 50_000
+DEFAULT_ROW_BATCH_SIZE = 5_000
+DEFAULT_VALIDATE_ROWS = 1_000
+
+
+class CSVFormatError(ValueError):
+    """An upload that does not match the equipment CSV schema."""
+
+
+# Errors that mean the upload itself is not a readable CSV
+CSV_ERRORS = (CSVFormatError, pd.errors.ParserError, pd.errors.EmptyDataError, UnicodeDecodeError)
+
+
+def equipment_schema():
+    """
+    Column -> pandas dtype of the equipment CSV. Every column is required;
+    metrics are ``settings.CSV_METRIC_DTYPE`` and empty cells become NaN.
+    """
+    metric_dtype = getattr(settings, 'CSV_METRIC_DTYPE', 'float64')
+    return {
+        'Equipment Name': 'string',
+        'Type': 'category',
+        **dict.fromkeys(METRIC_COLUMNS, metric_dtype),
+    }
+
+
+def _arrow_type(dtype):
+    if dtype == 'string':
+        return pa.string()
+    if dtype == 'category':
+        return pa.dictionary(pa.int32(), pa.string())
+    return pa.from_numpy_dtype(np.dtype(dtype))
+
+
+def get_engine(engine=None):
+    """The configured CSV engine, with "auto" resolved to pyarrow when it is installed."""
+    if engine is None:
+        engine = getattr(settings, 'CSV_PARSE_ENGINE', 'auto')
+    if engine == 'auto':
+        return 'c' if pa is None else 'pyarrow'
+    if engine == 'pyarrow' and pa is None:
+        raise ImproperlyConfigured("CSV_PARSE_ENGINE is 'pyarrow' but pyarrow is not installed.")
+    if engine not in ('c', 'pyarrow'):
+        raise ImproperlyConfigured(f"Unknown CSV_PARSE_ENGINE: {engine!r}")
+    return engine
+
+
+def get_chunk_size(chunk_size=None):
+    if chunk_size is None:
+        chunk_size = getattr(settings, 'CSV_INGEST_CHUNK_SIZE', DEFAULT_CHUNK_SIZE)
+    chunk_size = int(chunk_size)
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be a positive integer")
+    return chunk_size
+
+
+def content_hash(file):
+    """SHA-256 hex digest of a Django File (e.g. an UploadedFile), read in chunks."""
+    digest = hashlib.sha256()
+    for block in file.chunks():
+        digest.update(block)
+    return digest.hexdigest()
+
+
+def _pandas_chunks(source, chunk_size, schema):
+    with pd.read_csv(source, chunksize=chunk_size, dtype=schema) as reader:
+        yield from reader
+
+
+def _arrow_chunks(source, chunk_size, schema):
+    # pyarrow reads blocks of bytes; batches are regrouped into chunk_size rows
+    reader = pa_csv.open_csv(
+        source,
+        convert_options=pa_csv.ConvertOptions(
+            column_types={col: _arrow_type(dtype) for col, dtype in schema.items()},
+            strings_can_be_null=True,
+        ),
+    )
+    # Arrow-backed strings instead of one Python object per name
+    to_pandas = {'types_mapper': {pa.string(): pd.StringDtype('pyarrow')}.get}
+    pending, rows, emitted = [], 0, False
+    for batch in reader:
+        pending.append(batch)
+        rows += batch.num_rows
+        while rows >= chunk_size:
+            table = pa.Table.from_batches(pending)
+            yield table.slice(0, chunk_size).to_pandas(**to_pandas)
+            emitted = True
+            rest = table.slice(chunk_size)
+            pending, rows = rest.to_batches(), rest.num_rows
+    if rows or not emitted:
+        # A header-only file still yields one empty chunk, as pandas does
+        yield pa.Table.from_batches(pending, schema=reader.schema).to_pandas(**to_pandas)
+
+
+def iter_csv_chunks(source, chunk_size=None, engine=None):
+    """
+    Yield DataFrames of at most ``chunk_size`` rows read from ``source``
+    (a path or a file-like object such as an UploadedFile), typed by
+    ``equipment_schema``. Values that do not fit their column's type raise
+    CSVFormatError.
+    """
+    chunk_size = get_chunk_size(chunk_size)
+    read = _arrow_chunks if get_engine(engine) == 'pyarrow' else _pandas_chunks
+    try:
+        yield from read(source, chunk_size, equipment_schema())
+    except CSV_ERRORS:
+        raise
+    except ValueError as e:
+        raise CSVFormatError(str(e)) from e
+
+
+def validate_csv(source, rows=None):
+    """
+    Check the header and the first ``rows`` rows of ``source`` against the
+    schema, so a malformed upload is refused before it is queued and parsed
+    in full. Raises one of CSV_ERRORS. File-like sources are rewound.
+    """
+    rows = rows or getattr(settings, 'CSV_VALIDATE_ROWS', DEFAULT_VALIDATE_ROWS)
+    # pandas stops after exactly ``rows`` rows; pyarrow would convert a whole block
+    try:
+        first = pd.read_csv(source, nrows=rows, dtype=equipment_schema())
+    except CSV_ERRORS:
+        raise
+    except ValueError as e:
+        raise CSVFormatError(str(e)) from e
+    finally:
+        if hasattr(source, 'seek'):
+            source.seek(0)
+    missing = [col for col in EQUIPMENT_COLUMNS if col not in first.columns]
+    if missing:
+        raise CSVFormatError(f"Missing required column(s): {', '.join(missing)}.")
+
+
+class SummaryAccumulator:
+    """
+    Running counts, sums, type counts, per-type metric stats, per-metric
+    sketches and metric co-moments for the DataCSV summary fields. Non-numeric metric cells are
+    ignored, the same way ``Series.mean`` skips NaN; the sketches count them
+    as nulls.
+    """
+
+    def __init__(self):
+        self.columns = None
+        self.total_count = 0
+        self.sums = dict.fromkeys(METRIC_COLUMNS, 0.0)
+        self.counts = dict.fromkeys(METRIC_COLUMNS, 0)
+        self.type_counts = Counter()
+        self.sketches = {}
+        # type -> metric -> [count, mean, m2, min, max]
+        self.type_stats = {}
+        self.covariance = None
+
+    def update(self, chunk):
+        if self.columns is None:
+            self.columns = list(chunk.columns)
+        self.total_count += len(chunk)
+
+        numeric = {}
+        for col in METRIC_COLUMNS:
+            if col in chunk.columns:
+                # float32 columns are summed and sketched in float64
+                values = numeric[col] = pd.to_numeric(chunk[col], errors='coerce').astype(np.float64, copy=False)
+                self.sums[col] += float(values.sum())
+                self.counts[col] += int(values.count())
+                if col not in self.sketches:
+                    self.sketches[col] = MetricSketch.for_metric(col)
+                self.sketches[col].update(values.to_numpy(np.float64, na_value=np.nan))
+
+        if numeric:
+            if self.covariance is None:
+                self.covariance = CovarianceSketch(list(numeric))
+            self.covariance.update(np.column_stack([values.to_numpy(np.float64, na_value=np.nan)
+                                                    for values in numeric.values()]))
+
+        if 'Type' in chunk.columns:
+            for key, count in chunk['Type'].value_counts().items():
+                if count:
+                    self.type_counts[str(key)] += int(count)
+            if numeric:
+                self.update_type_stats(chunk['Type'], numeric)
+
+    def update_type_stats(self, types, numeric):
+        # One groupby per chunk; rows without a type are left out, as in type_counts
+        if not isinstance(types.dtype, pd.CategoricalDtype):
+            types = types.astype('string')
+        grouped = pd.DataFrame(numeric).groupby(types, sort=False, observed=True)
+        stats = grouped.agg(['count', 'mean', 'var', 'min', 'max'])
+        for kind, row in stats.iterrows():
+            per_metric = self.type_stats.setdefault(str(kind), {})
+            for col in numeric:
+                count = int(row[(col, 'count')])
+                if not count:
+                    continue
+                m2 = float(row[(col, 'var')]) * (count - 1) if count > 1 else 0.0
+                state = per_metric.setdefault(col, [0, 0.0, 0.0, np.inf, -np.inf])
+                state[:3] = combine_moments(*state[:3], count, float(row[(col, 'mean')]), m2)
+                state[3] = min(state[3], float(row[(col, 'min')]))
+                state[4] = max(state[4], float(row[(col, 'max')]))
+
+    def has_columns(self, columns):
+        return self.columns is not None and all(col in self.columns for col in columns)
+
+    def average(self, col):
+        # A missing column averages to 0, an all-empty one to None
+        if not self.has_columns([col]):
+            return 0
+        if not self.counts[col]:
+            return None
+        return self.sums[col] / self.counts[col]
+
+    def type_metric_stats(self):
+        """Per type, the count, mean, min, max and sample std of each metric."""
+        result = {}
+        for kind, _ in self.type_counts.most_common():
+            per_metric = self.type_stats.get(kind, {})
+            result[kind] = {}
+            for col in METRIC_COLUMNS:
+                if not self.has_columns([col]):
+                    continue
+                count, mean, m2, low, high = per_metric.get(col, [0, None, 0.0, None, None])
+                result[kind][col] = {
+                    'count': count,
+                    'mean': mean,
+                    'min': low,
+                    'max': high,
+                    'std': (m2 / (count - 1)) ** 0.5 if count > 1 else None,
+                }
+        return result
+
+    def fields(self):
+        return {
+            'total_count': self.total_count,
+            'average_flowrate': self.average('Flowrate'),
+            'average_pressure': self.average('Pressure'),
+            'average_temperature': self.average('Temperature'),
+            'equipment_type_distribution': dict(self.type_counts.most_common()),
+            'type_stats': self.type_metric_stats(),
+            'metric_relationships': self.covariance.relationships() if self.covariance else None,
+            'metric_sketches': {col: sketch.to_dict() for col, sketch in self.sketches.items()},
+        }
+
+
+def _nullable(values):
+    return values.astype(object).where(values.notna(), None).tolist()
+
+
+class EquipmentRowWriter:
+    """
+    ``on_rows`` sink for ingest_csv that bulk-inserts each chunk as
+    EquipmentRow objects belonging to ``dataset``.
+    """
+
+    def __init__(self, dataset, batch_size=None):
+        self.dataset = dataset
+        self.batch_size = batch_size or getattr(settings, 'EQUIPMENT_ROW_BATCH_SIZE', DEFAULT_ROW_BATCH_SIZE)
+        self.count = 0
+
+    def build(self, chunk):
+        names = chunk['Equipment Name'].astype('string').fillna('').str.slice(0, 255)
+        types = chunk['Type'].astype('string').fillna('').str.slice(0, 100)
+        metrics = [_nullable(pd.to_numeric(chunk[col], errors='coerce')) for col in METRIC_COLUMNS]
+        return [
+            EquipmentRow(dataset=self.dataset, name=name, type=kind,
+                         flowrate=flowrate, pressure=pressure, temperature=temperature)
+            for name, kind, flowrate, pressure, temperature in zip(names, types, *metrics)
+        ]
+
+    def __call__(self, chunk):
+        rows = EquipmentRow.objects.bulk_create(self.build(chunk), batch_size=self.batch_size)
+        self.count += len(rows)
+
+
+def ingest_chunks(chunks, on_rows=None, on_progress=None, summary=None):
+    """
+    Fold DataFrame ``chunks`` into a SummaryAccumulator, a new one unless
+    ``summary`` continues an earlier pass.
+
+    ``on_rows`` (a callable or a list of them) is called with each chunk once
+    the data is known to carry all of EQUIPMENT_COLUMNS, so callers can write
+    rows out as they are parsed instead of holding the whole file.
+    ``on_progress`` is called with the accumulator after every chunk.
+    """
+    if on_rows is None:
+        on_rows = []
+    elif callable(on_rows):
+        on_rows = [on_rows]
+
+    if summary is None:
+        summary = SummaryAccumulator()
+    for chunk in chunks:
+        summary.update(chunk)
+        if summary.has_columns(EQUIPMENT_COLUMNS):
+            for sink in on_rows:
+                sink(chunk)
+        if on_progress is not None:
+            on_progress(summary)
+    return summary
+
+
+def ingest_csv(source, on_rows=None, on_progress=None, chunk_size=None, engine=None):
+    """Stream the CSV at ``source`` through ingest_chunks."""
+    return ingest_chunks(iter_csv_chunks(source, chunk_size, engine), on_rows, on_progress)
+
+
+def rank_correlation(columns, names):
+    """
+    Spearman matrix of the metric columns ``names``, ranked from the columnar
+    copy. Ranks need every row at once, so this runs after the streaming pass.
+    """
+    frame = pd.DataFrame({name: np.asarray(columns.metric(name)) for name in names})
+    return nullable_matrix(frame.corr(method='spearman', min_periods=2).to_numpy())
+
+
+def dataset_fields(summary, columns):
+    """DataCSV fields for a finished ingest: the summary plus rank correlations."""
+    fields = summary.fields()
+    relationships = fields['metric_relationships']
+    if relationships is not None:
+        relationships['spearman'] = rank_correlation(columns, relationships['columns'])
+    return fields
+
+
+def load_columns(dataset):
+    """
+    Memory-mapped columnar copy of ``dataset``. Datasets ingested before the
+    copy existed get it built from their stored CSV on first use.
+    """
+    path = sidecar_path(dataset.csv_file.path)
+    if not ColumnarDataset.exists(path):
+        writer = ColumnarWriter(path)
+        try:
+            ingest_csv(dataset.csv_file.path, on_rows=writer)
+        except Exception:
+            writer.abort()
+            raise
+        writer.close()
+    return ColumnarDataset(path)
+
+
+def recompute_summary(dataset, chunk_size=None):
+    """Recompute the summary fields of ``dataset`` from its columnar copy."""
+    columns = load_columns(dataset)
+    return dataset_fields(ingest_chunks(columns.iter_chunks(get_chunk_size(chunk_size))), columns)
@@ -0,0 +1,112 @@
+import os
+import time
+
+from django.contrib.auth.models import User
+from django.core.files import File
+from django.core.management.base import BaseCommand, CommandError
+
+from api.ingest import content_hash
+from api.models import DataCSV, IngestJob
+from api.synthetic import DEFAULT_BLOCK_SIZE, EquipmentGenerator, parse_distribution
+from api.worker import find_duplicate, run_job
+
+
+def _pairs(values, parse):
+    pairs = {}
+    for value in values or []:
+        name, sep, spec = value.partition('=')
+        if not sep:
+            raise CommandError(f"Expected NAME=VALUE, not {value!r}.")
+        try:
+            pairs[name] = parse(spec)
+        except ValueError as e:
+            raise CommandError(str(e))
+    return pairs
+
+
+class Command(BaseCommand):
+    help = ("Write a synthetic equipment CSV of any size and optionally ingest it "
+            "for a user, as an upload would be.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help="Path of the CSV to write.")
+        parser.add_argument('--rows', type=int, default=10_000, help="Number of equipment rows.")
+        parser.add_argument('--seed', type=int, default=0, help="Random seed; the same seed gives the same file.")
+        parser.add_argument('--block-size', type=int, default=DEFAULT_BLOCK_SIZE,
+                            help="Rows generated and written at a time.")
+        parser.add_argument('--mix', nargs='+', metavar='TYPE=SHARE',
+                            help="Equipment types and their relative shares, e.g. Pump=3 Valve=1.")
+        parser.add_argument('--metric', action='append', metavar='METRIC=FAMILY:A:B',
+                            help="Distribution of a metric for every type: normal:MEAN:STD, "
+                                 "lognormal:MEDIAN:SIGMA or uniform:LOW:HIGH. Repeatable.")
+        parser.add_argument('--nan-rate', type=float, default=0.0, help="Share of metric cells left empty.")
+        parser.add_argument('--outlier-rate', type=float, default=0.0,
+                            help="Share of metric cells that are 5-20 times their value.")
+        parser.add_argument('--malformed-rate', type=float, default=0.0,
+                            help="Share of rows with a metric that is not a number; the ingest refuses such files.")
+        parser.add_argument('--load', metavar='USERNAME',
+                            help="Ingest the file as a dataset of this user.")
+        parser.add_argument('--title', help="Title of the loaded dataset (default: the file name).")
+        parser.add_argument('--queue', action='store_true',
+                            help="With --load, leave the job to the ingest workers instead of running it here.")
+
+    def handle(self, *args, **options):
+        if options['rows'] < 0 or options['block_size'] < 1:
+            raise CommandError("--rows cannot be negative and --block-size must be positive.")
+        user = None
+        if options['load']:
+            user = User.objects.filter(username=options['load']).first()
+            if user is None:
+                raise CommandError(f"No user named {options['load']!r}.")
+
+        try:
+            generator = EquipmentGenerator(
+                mix=_pairs(options['mix'], float),
+                metrics=_pairs(options['metric'], parse_distribution),
+                nan_rate=options['nan_rate'],
+                outlier_rate=options['outlier_rate'],
+                malformed_rate=options['malformed_rate'],
+                seed=options['seed'],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        path = options['output']
+        started = time.perf_counter()
+        with open(path, 'wb') as f:
+            generator.write(f, options['rows'], options['block_size'])
+        size = os.path.getsize(path)
+        self.stdout.write(f"Wrote {options['rows']:,} rows ({size / 2**20:.1f} MiB) to {path} "
+                          f"in {time.perf_counter() - started:.2f}s")
+
+        if user is not None:
+            self.load(user, path, options['title'] or os.path.basename(path), options['queue'])
+
+    def load(self, user, path, title, queue):
+        """Queue the file as an IngestJob, the way CSVUploadView stores an upload."""
+        pending = IngestJob.objects.filter(user=user, title=title,
+                                           status__in=[IngestJob.STATUS_PENDING, IngestJob.STATUS_RUNNING])
+        if DataCSV.objects.filter(user=user, title=title).exists() or pending.exists():
+            raise CommandError(f"{user.username} already has a file titled {title!r}.")
+
+        with open(path, 'rb') as f:
+            csv_file = File(f, name=os.path.basename(path))
+            digest = content_hash(csv_file)
+            duplicate = find_duplicate(user, digest)
+            job = IngestJob.objects.create(
+                user=user,
+                title=title,
+                csv_file=duplicate.csv_file.name if duplicate else csv_file,
+                content_hash=digest,
+                bytes_total=csv_file.size,
+            )
+        if queue and duplicate is None:
+            self.stdout.write(f"Queued ingest job {job.pk} for {title!r}")
+            return
+
+        started = time.perf_counter()
+        job = run_job(job)
+        if job.status != IngestJob.STATUS_DONE:
+            raise CommandError(f"Ingest job {job.pk} failed: {job.error}")
+        self.stdout.write(f"Ingested {title!r} as dataset {job.dataset_id} ({job.rows_processed:,} rows) "
+                          f"in {time.perf_counter() - started:.2f}s")
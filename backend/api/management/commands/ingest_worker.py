@@ -0,0 +1,43 @@
+import multiprocessing
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from api.worker import run_worker
+
+
+class Command(BaseCommand):
+    help = "Process queued CSV uploads (IngestJob rows) in one or more worker processes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=1,
+                            help="Number of worker processes to run.")
+        parser.add_argument('--poll-interval', type=float, default=None,
+                            help="Seconds to wait between polls when the queue is empty.")
+        parser.add_argument('--drain', action='store_true',
+                            help="Exit once the queue is empty instead of polling.")
+
+    def handle(self, *args, **options):
+        kwargs = {'poll_interval': options['poll_interval'], 'drain': options['drain']}
+        processes = max(options['processes'], 1)
+
+        if processes == 1:
+            self.stdout.write("Ingest worker started")
+            run_worker(**kwargs)
+            return
+
+        # Children must open their own database connections
+        connections.close_all()
+        workers = [
+            multiprocessing.Process(target=run_worker, kwargs=kwargs, name=f"ingest-worker-{i}")
+            for i in range(processes)
+        ]
+        for worker in workers:
+            worker.start()
+        self.stdout.write(f"Started {processes} ingest workers")
+        try:
+            for worker in workers:
+                worker.join()
+        except KeyboardInterrupt:
+            for worker in workers:
+                worker.terminate()
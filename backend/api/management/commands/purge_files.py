@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from api.cleanup import purge_all
+
+
+class Command(BaseCommand):
+    help = ("Remove the files of deleted datasets queued for cleanup. The ingest worker "
+            "does this when idle; run it where there is no worker (CSV_INGEST_EAGER).")
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Handled {purge_all()} queued file(s)")
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from api.ingest import recompute_summary
+from api.models import DataCSV
+from api.responses import remove_precompressed, write_precompressed
+
+
+class Command(BaseCommand):
+    help = ("Recompute dataset summary fields from their columnar copies, "
+            "building the copies from the stored CSVs where they are missing, "
+            "and rewrite the precompressed responses.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('datasets', nargs='*', type=int,
+                            help="DataCSV ids to recompute (default: all).")
+
+    def handle(self, *args, **options):
+        datasets = DataCSV.objects.ready().order_by('id')
+        if options['datasets']:
+            datasets = datasets.filter(pk__in=options['datasets'])
+
+        for dataset in datasets.iterator():
+            fields = recompute_summary(dataset)
+            for name, value in fields.items():
+                setattr(dataset, name, value)
+            # Until they are rewritten, requests render the new stats rather than serve the old files
+            remove_precompressed(dataset.pk, dataset.uploaded_at)
+            dataset.save(update_fields=[*fields, 'updated_at'])
+            write_precompressed(dataset)
+            self.stdout.write(f"Recomputed {dataset.title} ({dataset.total_count} rows)")
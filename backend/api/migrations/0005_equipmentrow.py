@@ -0,0 +1,85 @@
+# Generated by Django 5.2.8 on 2026-10-18 05:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+BATCH_SIZE = 5000
+
+# EquipmentRow field -> equipment_list key
+COLUMNS = {
+    'name': 'Equipment Name',
+    'type': 'Type',
+    'flowrate': 'Flowrate',
+    'pressure': 'Pressure',
+    'temperature': 'Temperature',
+}
+
+
+def _number(value):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if value != value else value  # NaN
+
+
+def backfill_rows(apps, schema_editor):
+    DataCSV = apps.get_model('api', 'DataCSV')
+    EquipmentRow = apps.get_model('api', 'EquipmentRow')
+
+    datasets = DataCSV.objects.exclude(equipment_list=None).only('id', 'equipment_list')
+    for dataset in datasets.iterator(chunk_size=1):
+        batch = []
+        for record in dataset.equipment_list or []:
+            batch.append(EquipmentRow(
+                dataset_id=dataset.id,
+                name=str(record.get('Equipment Name') or '')[:255],
+                type=str(record.get('Type') or '')[:100],
+                flowrate=_number(record.get('Flowrate')),
+                pressure=_number(record.get('Pressure')),
+                temperature=_number(record.get('Temperature')),
+            ))
+            if len(batch) >= BATCH_SIZE:
+                EquipmentRow.objects.bulk_create(batch)
+                batch = []
+        EquipmentRow.objects.bulk_create(batch)
+
+
+def restore_equipment_list(apps, schema_editor):
+    DataCSV = apps.get_model('api', 'DataCSV')
+    EquipmentRow = apps.get_model('api', 'EquipmentRow')
+
+    for dataset in DataCSV.objects.only('id').iterator():
+        rows = EquipmentRow.objects.filter(dataset_id=dataset.id).order_by('id').values_list(*COLUMNS)
+        dataset.equipment_list = [dict(zip(COLUMNS.values(), row)) for row in rows]
+        dataset.save(update_fields=['equipment_list'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_ingestjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EquipmentRow',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(blank=True, max_length=255)),
+                ('type', models.CharField(blank=True, max_length=100)),
+                ('flowrate', models.FloatField(blank=True, null=True)),
+                ('pressure', models.FloatField(blank=True, null=True)),
+                ('temperature', models.FloatField(blank=True, null=True)),
+                ('dataset', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rows', to='api.datacsv')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['dataset', 'type'], name='api_equipme_dataset_a2805c_idx'), models.Index(fields=['dataset', 'flowrate'], name='api_equipme_dataset_4801dc_idx'), models.Index(fields=['dataset', 'pressure'], name='api_equipme_dataset_e9f86c_idx'), models.Index(fields=['dataset', 'temperature'], name='api_equipme_dataset_78cbb1_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_rows, restore_equipment_list),
+        migrations.RemoveField(
+            model_name='datacsv',
+            name='equipment_list',
+        ),
+    ]
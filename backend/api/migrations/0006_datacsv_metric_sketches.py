@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 05:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_equipmentrow'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='datacsv',
+            name='metric_sketches',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 05:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_datacsv_metric_sketches'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='datacsv',
+            name='type_stats',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 05:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_datacsv_type_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='datacsv',
+            name='metric_relationships',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.8 on 2026-10-18 05:58
+
+import hashlib
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_hashes(apps, schema_editor):
+    DataCSV = apps.get_model('api', 'DataCSV')
+    for dataset in DataCSV.objects.exclude(csv_file='').only('id', 'csv_file').iterator():
+        digest = hashlib.sha256()
+        try:
+            with dataset.csv_file.open('rb') as f:
+                for block in f.chunks():
+                    digest.update(block)
+        except FileNotFoundError:
+            continue
+        DataCSV.objects.filter(pk=dataset.pk).update(content_hash=digest.hexdigest())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_datacsv_metric_relationships'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='datacsv',
+            name='content_hash',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='ingestjob',
+            name='content_hash',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddIndex(
+            model_name='datacsv',
+            index=models.Index(fields=['user', 'content_hash'], name='api_datacsv_user_id_7c6731_idx'),
+        ),
+        migrations.RunPython(backfill_hashes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.8 on 2026-10-18 06:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_upload_session'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='equipmentrow',
+            index=models.Index(fields=['dataset', 'name'], name='api_equipme_dataset_57c184_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.8 on 2026-10-18 09:02
+
+from django.db import migrations, models
+
+
+def mark_existing(apps, schema_editor):
+    # Datasets ingested so far had their responses written at ingest
+    DataCSV = apps.get_model('api', 'DataCSV')
+    DataCSV.objects.filter(total_count__isnull=False).update(precompressed=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_datacsv_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='datacsv',
+            name='precompressed',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(mark_existing, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,10 @@
-from django.db import models
+from django.db import connection, models
 from django.contrib.auth.models import User
 from django.utils.timezone import now
 import os
+import shutil
 import logging
+from .columnar import sidecar_path
 logger = logging.getLogger(__name__)
 
 def user_csv_file_path(instance, filename):
@@ -17,11 +19,23 @@ def user_csv_file_path(instance, filename):
         f"{timestamp}_{filename}"
     )
 
+class DataCSVQuerySet(models.QuerySet):
+    def ready(self):
+        # Stats are written once ingest finishes; until then the rows are incomplete
+        return self.filter(total_count__isnull=False)
+
+
 class DataCSV(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
     title = models.CharField(max_length=100)
     csv_file = models.FileField(upload_to=user_csv_file_path)
     uploaded_at = models.DateTimeField(auto_now_add=True)
+    # Changes with every save; stats can be rewritten in place (manage.py recompute_stats)
+    updated_at = models.DateTimeField(auto_now=True)
+    # SHA-256 of the file; identical re-uploads share the file, stats and rows
+    content_hash = models.CharField(max_length=64, blank=True)
+    # Set once a process has taken on writing the stored responses (api/responses.py)
+    precompressed = models.BooleanField(default=False)
 
     total_count = models.IntegerField(null=True, blank=True)
     average_flowrate = models.FloatField(null=True, blank=True)
@@ -29,17 +43,220 @@ class DataCSV(models.Model):
     average_temperature = models.FloatField(null=True, blank=True)
 
     equipment_type_distribution = models.JSONField(null=True, blank=True)
-    equipment_list = models.JSONField(null=True, blank=True)
+    # type -> metric -> {count, mean, min, max, std}
+    type_stats = models.JSONField(null=True, blank=True)
+    # Covariance, Pearson and Spearman matrices and pairwise linear fits of the metrics
+    metric_relationships = models.JSONField(null=True, blank=True)
+    # Per-metric api.sketches.MetricSketch dicts: exact moments, fixed-bin
+    # histogram and t-digest, mergeable across datasets
+    metric_sketches = models.JSONField(null=True, blank=True)
+
+    # Fields computed at ingest; copied as-is when an upload is a duplicate
+    STATS_FIELDS = ['total_count', 'average_flowrate', 'average_pressure', 'average_temperature',
+                    'equipment_type_distribution', 'type_stats', 'metric_relationships',
+                    'metric_sketches']
+
+    objects = DataCSVQuerySet.as_manager()
 
     class Meta:
         unique_together = ('user', 'title')  # Prevent same user from uploading same title
+        indexes = [models.Index(fields=['user', 'content_hash'])]
 
     def __str__(self):
         return self.title
+
+    @classmethod
+    def file_in_use(cls, name, exclude=None):
+        """Whether a dataset (other than ``exclude``) stores its data in file ``name``."""
+        datasets = cls.objects.filter(csv_file=name)
+        if exclude is not None:
+            datasets = datasets.exclude(pk=exclude.pk)
+        return datasets.exists()
     
-    def delete(self, *args, **kwargs):
-        # Delete the file from storage before deleting the model
-        if self.csv_file:
+    def delete(self, *args, keep_files=False, **kwargs):
+        # Delete the file and its columnar copy from storage before deleting the
+        # model, unless a deduplicated upload still shares them. With keep_files
+        # the caller has queued them for the worker instead (api/cleanup.py).
+        self.keep_files = keep_files
+        if not keep_files and self.csv_file and not self.file_in_use(self.csv_file.name, exclude=self):
             if os.path.isfile(self.csv_file.path):
                 os.remove(self.csv_file.path)
+            shutil.rmtree(sidecar_path(self.csv_file.path), ignore_errors=True)
         super().delete(*args, **kwargs)
+
+
+class EquipmentRow(models.Model):
+    """One row of an uploaded equipment CSV."""
+    # Model field -> CSV column
+    CSV_COLUMNS = {
+        'name': 'Equipment Name',
+        'type': 'Type',
+        'flowrate': 'Flowrate',
+        'pressure': 'Pressure',
+        'temperature': 'Temperature',
+    }
+
+    dataset = models.ForeignKey(DataCSV, on_delete=models.CASCADE, related_name='rows')
+    name = models.CharField(max_length=255, blank=True)
+    type = models.CharField(max_length=100, blank=True)
+    flowrate = models.FloatField(null=True, blank=True)
+    pressure = models.FloatField(null=True, blank=True)
+    temperature = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        # Rows are always read per dataset, so every index leads with it
+        indexes = [
+            models.Index(fields=['dataset', 'type']),
+            models.Index(fields=['dataset', 'flowrate']),
+            models.Index(fields=['dataset', 'pressure']),
+            models.Index(fields=['dataset', 'temperature']),
+            models.Index(fields=['dataset', 'name']),
+        ]
+
+    def __str__(self):
+        return self.name
+
+    @classmethod
+    def values(cls, queryset):
+        """``queryset`` as dicts of the CSV fields (plus id), in upload order."""
+        return queryset.order_by('id').values('id', *cls.CSV_COLUMNS)
+
+    @classmethod
+    def to_record(cls, values):
+        """A ``values`` dict keyed by CSV column, as the API returns rows."""
+        return {column: values[field] for field, column in cls.CSV_COLUMNS.items()}
+
+    @classmethod
+    def copy_rows(cls, source, target):
+        """
+        Copy the rows of dataset ``source`` to ``target`` with a single
+        INSERT ... SELECT, so they never pass through Python.
+        """
+        quote = connection.ops.quote_name
+        table = quote(cls._meta.db_table)
+        dataset_column = quote(cls._meta.get_field('dataset').column)
+        columns = ', '.join(quote(cls._meta.get_field(name).column) for name in cls.CSV_COLUMNS)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {table} ({dataset_column}, {columns}) "
+                f"SELECT %s, {columns} FROM {table} WHERE {dataset_column} = %s ORDER BY {quote('id')}",
+                [target.pk, source.pk],
+            )
+            return cursor.rowcount
+
+
+class IngestJob(models.Model):
+    """
+    An uploaded CSV waiting to be parsed by an ingest worker.
+    The jobs table doubles as the work queue; see api/worker.py.
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    title = models.CharField(max_length=100)
+    csv_file = models.FileField(upload_to=user_csv_file_path)
+    content_hash = models.CharField(max_length=64, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+
+    bytes_total = models.BigIntegerField(default=0)
+    bytes_processed = models.BigIntegerField(default=0)
+    rows_processed = models.BigIntegerField(default=0)
+    error = models.TextField(blank=True)
+    dataset = models.ForeignKey(DataCSV, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'created_at'])]
+
+    def __str__(self):
+        return f"{self.title} ({self.status})"
+
+    @property
+    def progress(self):
+        if self.status == self.STATUS_DONE:
+            return 1.0
+        if not self.bytes_total:
+            return 0.0
+        return min(self.bytes_processed / self.bytes_total, 1.0)
+
+
+class UploadSession(models.Model):
+    """
+    A CSV uploaded in numbered chunks over many requests; see api/uploads.py.
+    The dataset is created (not yet ``ready``) when the session starts, so
+    rows can be saved as the chunks arrive.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    dataset = models.OneToOneField(DataCSV, on_delete=models.CASCADE, related_name='upload_session')
+    size = models.BigIntegerField()
+    chunk_size = models.IntegerField()
+    # Bytes from the start of the file already parsed into the dataset
+    parsed_bytes = models.BigIntegerField(default=0)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.dataset.title} ({self.parsed_bytes}/{self.size})"
+
+    @property
+    def chunk_count(self):
+        return -(-self.size // self.chunk_size)
+
+    def chunk_bounds(self, index):
+        start = index * self.chunk_size
+        return start, min(start + self.chunk_size, self.size)
+
+    def received_ranges(self):
+        """The received parts of the file as ``[start, stop)`` byte ranges, in order."""
+        ranges = []
+        for index in self.chunks.order_by('index').values_list('index', flat=True):
+            start, stop = self.chunk_bounds(index)
+            if ranges and ranges[-1][1] == start:
+                ranges[-1][1] = stop
+            else:
+                ranges.append([start, stop])
+        return ranges
+
+
+class UploadChunk(models.Model):
+    """A chunk of an UploadSession, written to the dataset's file once its checksum matched."""
+    session = models.ForeignKey(UploadSession, on_delete=models.CASCADE, related_name='chunks')
+    index = models.IntegerField()
+    sha256 = models.CharField(max_length=64)
+
+    class Meta:
+        unique_together = ('session', 'index')
+
+    def __str__(self):
+        return f"{self.session_id}#{self.index}"
+
+
+class FileCleanup(models.Model):
+    """
+    A file or folder of a deleted dataset, queued for the ingest worker to
+    remove; see api/cleanup.py.
+    """
+    # Relative to MEDIA_ROOT
+    path = models.CharField(max_length=255)
+    # Storage name of the CSV whose data the path holds; the path is kept
+    # while a (deduplicated) dataset still uses that CSV
+    csv_file = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.path
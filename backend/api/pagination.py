@@ -0,0 +1,27 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination, LimitOffsetPagination
+
+
+class EquipmentRowCursorPagination(CursorPagination):
+    """?cursor=&limit= over a dataset's rows in upload order."""
+    ordering = 'id'
+    page_size = settings.EQUIPMENT_ROWS_PAGE_SIZE
+    page_size_query_param = 'limit'
+    max_page_size = settings.EQUIPMENT_ROWS_MAX_PAGE_SIZE
+
+
+class EquipmentRowWindowPagination(LimitOffsetPagination):
+    """
+    ?offset=&limit= window over a dataset's rows in upload order. The row
+    count is known from the dataset, so it is passed in instead of counted.
+    """
+    default_limit = settings.EQUIPMENT_ROWS_PAGE_SIZE
+    max_limit = settings.EQUIPMENT_ROWS_MAX_PAGE_SIZE
+
+    def __init__(self, count=None):
+        self.known_count = count
+
+    def get_count(self, queryset):
+        if self.known_count is not None:
+            return self.known_count
+        return super().get_count(queryset)
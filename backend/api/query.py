@@ -0,0 +1,180 @@
+"""
+Equipment rows queried across a user's datasets.
+
+    /api/equipment/?type=Pump&pressure__gt=7&sort=-pressure&limit=20
+
+Each dataset gets its own keyset query, so the database can walk an index
+that leads with the dataset: (dataset, type), (dataset, <metric>) or
+(dataset, name). A sorted query reads its index in order and stops after
+``limit`` matches; the per-dataset results are then merged on the sort key.
+Pages continue from a cursor holding the last (sort value, id), so every
+page is the same index seek rather than an OFFSET that grows.
+
+Every request runs against a time budget: database work past it is
+cancelled (``statement_timeout`` on PostgreSQL, a progress handler on
+SQLite) and QueryBudgetExceeded is raised.
+"""
+import base64
+import binascii
+import heapq
+import json
+import time
+from contextlib import contextmanager
+from itertools import islice
+
+from django.db import OperationalError, connection, transaction
+from django.db.models import Q
+
+from .models import EquipmentRow
+
+METRIC_FIELDS = ['flowrate', 'pressure', 'temperature']
+SORT_FIELDS = ['id', *METRIC_FIELDS]
+RANGE_LOOKUPS = ['gt', 'gte', 'lt', 'lte']
+# Sorts after any character a name can hold, so [prefix, prefix + MAX_CHAR) is a prefix range
+MAX_CHAR = '\U0010ffff'
+# SQLite virtual machine instructions between budget checks
+SQLITE_PROGRESS_STEPS = 10_000
+# PostgreSQL's SQLSTATE for a statement cancelled by statement_timeout
+QUERY_CANCELED = '57014'
+
+
+class QueryBudgetExceeded(Exception):
+    """The database work of a request ran past its time budget."""
+
+
+class QueryBudget:
+    """Cancels database work that runs longer than ``ms`` milliseconds from now."""
+
+    def __init__(self, ms):
+        self.started = time.monotonic()
+        self.deadline = self.started + ms / 1000
+        self.cancelled = False
+
+    @property
+    def elapsed_ms(self):
+        return (time.monotonic() - self.started) * 1000
+
+    def remaining_ms(self):
+        return (self.deadline - time.monotonic()) * 1000
+
+    def exceeded(self):
+        return QueryBudgetExceeded(f"The query took longer than its {self.deadline - self.started:.3f}s budget.")
+
+    @contextmanager
+    def _limit(self):
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                # SET LOCAL ends with the transaction run() opened
+                cursor.execute("SET LOCAL statement_timeout = %s", [max(int(self.remaining_ms()), 1)])
+            yield
+        elif connection.vendor == 'sqlite':
+            connection.ensure_connection()
+
+            def check():
+                self.cancelled = time.monotonic() > self.deadline
+                return self.cancelled
+
+            connection.connection.set_progress_handler(check, SQLITE_PROGRESS_STEPS)
+            try:
+                yield
+            finally:
+                connection.connection.set_progress_handler(None, 0)
+        else:
+            yield
+
+    def run(self, fetch):
+        """Call ``fetch`` (which runs queries) within what is left of the budget."""
+        if self.remaining_ms() <= 0:
+            raise self.exceeded()
+        try:
+            with transaction.atomic(), self._limit():
+                return fetch()
+        except OperationalError as e:
+            if self.cancelled or getattr(e.__cause__, 'pgcode', None) == QUERY_CANCELED:
+                raise self.exceeded() from e
+            raise
+
+
+def encode_cursor(position):
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+
+def decode_cursor(cursor):
+    """The (sort value, id) a cursor continues after; ValueError if it is not one."""
+    try:
+        value, pk = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (binascii.Error, UnicodeError, TypeError, ValueError):
+        raise ValueError("Invalid cursor.")
+    if not isinstance(pk, int) or not isinstance(value, (int, float)):
+        raise ValueError("Invalid cursor.")
+    return value, pk
+
+
+class EquipmentQuery:
+    """
+    Rows of ``dataset_ids`` matching ``types`` (any of), ``name_prefix`` and
+    ``ranges`` ({(field, lookup): value}), sorted by ``sort`` (a SORT_FIELDS
+    name, ``-`` for descending) with the id breaking ties. Sorting by a
+    metric leaves out rows without a value for it.
+    """
+
+    def __init__(self, dataset_ids, types=None, name_prefix=None, ranges=None, sort='id', limit=100,
+                 cursor=None):
+        self.dataset_ids = list(dataset_ids)
+        self.types = types
+        self.name_prefix = name_prefix
+        self.ranges = ranges or {}
+        self.descending = sort.startswith('-')
+        self.sort = sort.lstrip('-')
+        self.limit = limit
+        self.cursor = cursor
+
+    def filters(self):
+        condition = Q()
+        if self.types:
+            condition &= Q(type__in=self.types)
+        if self.name_prefix:
+            # The range can use the (dataset, name) index; startswith keeps it exact
+            condition &= Q(name__gte=self.name_prefix, name__lt=self.name_prefix + MAX_CHAR,
+                           name__startswith=self.name_prefix)
+        for (field, lookup), value in self.ranges.items():
+            condition &= Q(**{f"{field}__{lookup}": value})
+        if self.sort != 'id':
+            condition &= Q(**{f"{self.sort}__isnull": False})
+        return condition
+
+    def seek(self):
+        """Rows after the cursor, as a range on the sort column the index can start from."""
+        if self.cursor is None:
+            return Q()
+        value, pk = self.cursor
+        after = 'lt' if self.descending else 'gt'
+        if self.sort == 'id':
+            return Q(**{f"id__{after}": pk})
+        passed = 'gte' if self.descending else 'lte'
+        return Q(**{f"{self.sort}__{after}e": value}) & ~Q(**{self.sort: value, f"id__{passed}": pk})
+
+    def ordering(self):
+        fields = [self.sort] if self.sort == 'id' else [self.sort, 'id']
+        return [f"-{field}" if self.descending else field for field in fields]
+
+    def queryset(self, dataset_id):
+        """One page (plus a row, to tell whether there is a next one) of ``dataset_id``."""
+        return (EquipmentRow.objects
+                .filter(dataset_id=dataset_id)
+                .filter(self.filters() & self.seek())
+                .order_by(*self.ordering())
+                .values('id', 'dataset_id', *EquipmentRow.CSV_COLUMNS)[:self.limit + 1])
+
+    def position(self, row):
+        return row[self.sort], row['id']
+
+    def run(self, budget):
+        """``(rows, next cursor or None)`` for this page."""
+        pages = [budget.run(lambda qs=self.queryset(pk): list(qs)) for pk in self.dataset_ids]
+        merged = heapq.merge(*pages, key=self.position, reverse=self.descending)
+        rows = list(islice(merged, self.limit + 1))
+        if len(rows) <= self.limit:
+            return rows, None
+        rows = rows[:self.limit]
+        return rows, encode_cursor(self.position(rows[-1]))
@@ -0,0 +1,44 @@
+"""
+orjson-backed JSON rendering.
+
+ORJSONRenderer replaces DRF's JSONRenderer for every API response. It
+differs from the stdlib path in three ways:
+
+* NumPy arrays and scalars are serialized natively.
+* NaN and +/-inf (pandas' empty cells) are written as ``null`` instead of
+  failing the request; DRF's strict mode would raise on them.
+* ``orjson.Fragment`` values are copied into the output as-is, so payloads
+  that were encoded once and cached (see views.DatasetChartView) are not
+  decoded and re-encoded on every request.
+
+Types orjson does not know (Decimal, lazy strings, querysets, ...) fall back
+to DRF's own encoder, and datetimes are formatted by it too, so the output
+matches what JSONRenderer produced.
+"""
+import orjson
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+OPTIONS = (orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME)
+
+_encoder = JSONEncoder()
+
+
+def dumps(data, indent=False):
+    option = OPTIONS | orjson.OPT_INDENT_2 if indent else OPTIONS
+    return orjson.dumps(data, default=_encoder.default, option=option)
+
+
+class ORJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        # orjson only indents by two spaces
+        ret = dumps(data, indent=bool(indent))
+
+        # Like JSONRenderer, escape U+2028/U+2029 so the output is a strict JavaScript subset
+        if b'\xe2\x80' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
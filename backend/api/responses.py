@@ -0,0 +1,206 @@
+"""
+Full dataset responses, compressed once at ingest.
+
+``GET /api/csv/<id>/`` without parameters returns the summary and every row,
+which for a large dataset is tens of megabytes of JSON that compresses about
+10x. Rather than compressing it on each request, the ingest worker encodes
+it once per encoding in ``settings.PRECOMPRESS_ENCODINGS`` and stores the
+results under MEDIA_ROOT:
+
+    precompressed/<dataset id>-<upload time>.json.zst / .json.br / .json.gz
+
+CSVFetchView serves the file matching the client's Accept-Encoding as-is.
+The body is identical to what the view renders itself, so the ETag holds.
+
+The body holds the dataset's id, title and upload time, so a deduplicated
+copy cannot reuse its source's files, and compressing a large dataset takes
+seconds. Datasets created on a request (deduplicated, bulk and chunked
+uploads) are therefore left with ``precompressed`` unset. The worker writes their files whenever it has no
+job to run; without a worker (``CSV_INGEST_EAGER``) a thread of the web
+process does once the request's transaction commits. Until then the view
+compresses the response itself.
+"""
+import glob
+import logging
+import os
+import threading
+from itertools import islice
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from .compression import ENCODINGS, EXTENSIONS, compressor, negotiate
+from .models import DataCSV, EquipmentRow
+from .renderers import ORJSONRenderer
+
+logger = logging.getLogger(__name__)
+
+# Held by the background precompression of this process, so at most one runs
+_precompressing = threading.Lock()
+
+SUMMARY_FIELDS = ['id', 'title', 'total_count', 'average_flowrate', 'average_pressure',
+                  'average_temperature', 'equipment_type_distribution', 'type_stats',
+                  'metric_relationships', 'uploaded_at']
+
+
+def _root():
+    return os.path.join(settings.MEDIA_ROOT, 'precompressed')
+
+
+def _stem(dataset_id, uploaded_at):
+    return os.path.join(_root(), f"{dataset_id}-{uploaded_at:%Y%m%d%H%M%S%f}.json")
+
+
+def precompressed_path(dataset_id, uploaded_at, encoding):
+    return f"{_stem(dataset_id, uploaded_at)}.{EXTENSIONS[encoding]}"
+
+
+def payload_chunks(dataset, batch_size=None):
+    """
+    The full dataset response in pieces: the summary, then the rows
+    ``batch_size`` at a time, rendered exactly as CSVFetchView renders them.
+    """
+    renderer = ORJSONRenderer()
+    batch_size = batch_size or settings.EQUIPMENT_ROW_BATCH_SIZE
+    summary = renderer.render({name: getattr(dataset, name) for name in SUMMARY_FIELDS})
+    yield summary[:-1] + b',"equipment_list":['
+
+    rows = (EquipmentRow.to_record(row) for row in
+            EquipmentRow.values(dataset.rows.all()).iterator(chunk_size=batch_size))
+    separator = b''
+    while batch := list(islice(rows, batch_size)):
+        yield separator + renderer.render(batch)[1:-1]
+        separator = b','
+    yield b']}'
+
+
+def write_precompressed(dataset):
+    """
+    Compress ``dataset``'s full response with every configured encoding.
+    Returns ``{encoding: compressed size}``; small datasets are skipped.
+    """
+    if dataset.total_count < settings.PRECOMPRESS_MIN_ROWS:
+        return {}
+    # Render what the view would load: JSON fields read back from the
+    # database may differ from the in-memory values (key order, NaN)
+    dataset = DataCSV.objects.get(pk=dataset.pk)
+    os.makedirs(_root(), exist_ok=True)
+
+    codecs = {}
+    files = {}
+    try:
+        for encoding, level in settings.PRECOMPRESS_ENCODINGS.items():
+            codecs[encoding] = compressor(encoding, level)
+            files[encoding] = open(precompressed_path(dataset.pk, dataset.uploaded_at, encoding) + '.tmp', 'wb')
+        for chunk in payload_chunks(dataset):
+            for encoding, codec in codecs.items():
+                files[encoding].write(codec.compress(chunk))
+        for encoding, codec in codecs.items():
+            files[encoding].write(codec.flush())
+    except BaseException:
+        for f in files.values():
+            f.close()
+            os.remove(f.name)
+        raise
+
+    sizes = {}
+    for encoding, f in files.items():
+        sizes[encoding] = f.tell()
+        f.close()
+        # Readers only ever see complete files
+        os.replace(f.name, precompressed_path(dataset.pk, dataset.uploaded_at, encoding))
+    return sizes
+
+
+def precompress(dataset):
+    """
+    Write ``dataset``'s stored responses unless another process has taken
+    them on. Returns whether this call took them on; a failure is logged,
+    as the view then compresses the response per request.
+    """
+    # Conditional, like claiming a job, so two processes never write the same files
+    if not DataCSV.objects.filter(pk=dataset.pk, precompressed=False).update(precompressed=True):
+        return False
+    try:
+        write_precompressed(dataset)
+    except Exception:
+        logger.exception("Precompressing dataset %s failed", dataset.pk)
+    return True
+
+
+def precompress_next():
+    """
+    Write the stored responses of the oldest ready dataset still without
+    them. Returns its id, or None if no dataset is waiting.
+    """
+    pending = (DataCSV.objects.ready()
+               .filter(precompressed=False, total_count__gte=settings.PRECOMPRESS_MIN_ROWS)
+               .order_by('pk')
+               .only('pk', 'total_count'))
+    for dataset in pending[:10]:
+        if precompress(dataset):
+            return dataset.pk
+    return None
+
+
+def _precompress_thread():
+    try:
+        while precompress_next() is not None:
+            pass
+    except Exception:
+        logger.exception("Precompressing datasets failed")
+    finally:
+        connection.close()
+        _precompressing.release()
+
+
+def precompress_in_background():
+    """Write every waiting dataset's responses in a thread of this process, unless one already is."""
+    if not _precompressing.acquire(blocking=False):
+        return
+    threading.Thread(target=_precompress_thread, name='precompress', daemon=True).start()
+
+
+def precompress_later():
+    """
+    Leave the stored responses of datasets saved in the current transaction
+    to the worker, or without one to a background thread after the commit.
+    """
+    if settings.CSV_INGEST_EAGER:
+        # No worker will come by to write them
+        transaction.on_commit(precompress_in_background)
+
+
+def find_precompressed(dataset_id, uploaded_at, accept_encoding):
+    """``(path, encoding)`` of the stored response the client accepts best, or None."""
+    stored = [encoding for encoding in ENCODINGS
+              if os.path.isfile(precompressed_path(dataset_id, uploaded_at, encoding))]
+    encoding = negotiate(accept_encoding, stored)
+    if encoding is None:
+        return None
+    return precompressed_path(dataset_id, uploaded_at, encoding), encoding
+
+
+def open_precompressed(dataset_id, uploaded_at, accept_encoding):
+    """``(open binary file, encoding)`` of the stored response the client accepts best, or None."""
+    stored = find_precompressed(dataset_id, uploaded_at, accept_encoding)
+    if stored is None:
+        return None
+    path, encoding = stored
+    try:
+        return open(path, 'rb'), encoding
+    except FileNotFoundError:  # dataset deleted meanwhile
+        return None
+
+
+def precompressed_paths(dataset_id, uploaded_at):
+    """Where each encoding of the dataset's response is (or would be) stored."""
+    return [precompressed_path(dataset_id, uploaded_at, encoding) for encoding in ENCODINGS]
+
+
+def remove_precompressed(dataset_id, uploaded_at):
+    for path in glob.glob(glob.escape(_stem(dataset_id, uploaded_at)) + '.*'):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import DataCSV
+from .models import DataCSV, IngestJob, UploadSession
 from django.contrib.auth.models import User
 
 class UserSerializer(serializers.ModelSerializer):
@@ -11,14 +11,29 @@ class UserSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         return User.objects.create_user(**validated_data)
 
-class DataCSVSerializer(serializers.ModelSerializer):
+class DynamicFieldsModelSerializer(serializers.ModelSerializer):
+    """
+    Takes an optional ``fields`` argument naming the subset of fields to output.
+    """
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class DataCSVSerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = DataCSV
         fields = ['id', 'user', 'title', 'csv_file', 'uploaded_at',
                   'total_count', 'average_flowrate', 'average_pressure',
-                  'average_temperature', 'equipment_type_distribution']
+                  'average_temperature', 'equipment_type_distribution', 'type_stats',
+                  'metric_relationships']
         read_only_fields = ['id', 'uploaded_at', 'total_count', 'average_flowrate', 
-                           'average_pressure', 'average_temperature', 'equipment_type_distribution']
+                           'average_pressure', 'average_temperature', 'equipment_type_distribution',
+                           'type_stats', 'metric_relationships']
 
     def validate_csv_file(self, value):
         if not value.name.endswith('.csv'):
@@ -29,4 +44,29 @@ class DataCSVSerializer(serializers.ModelSerializer):
         # The view handles all CSV processing and passes pre-calculated stats
         # Just create the instance with the provided data
         instance = DataCSV.objects.create(**validated_data)
-        return instance
\ No newline at end of file
+        return instance
+
+
+class IngestJobSerializer(serializers.ModelSerializer):
+    progress = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = IngestJob
+        fields = ['id', 'title', 'status', 'progress', 'rows_processed', 'bytes_processed',
+                  'bytes_total', 'error', 'dataset', 'created_at', 'started_at', 'finished_at']
+        read_only_fields = fields
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    title = serializers.CharField(source='dataset.title', max_length=100)
+    chunk_count = serializers.IntegerField(read_only=True)
+    # [start, stop) byte ranges of the chunks received so far
+    received = serializers.ListField(source='received_ranges', read_only=True)
+
+    class Meta:
+        model = UploadSession
+        fields = ['id', 'title', 'size', 'chunk_size', 'chunk_count', 'received', 'parsed_bytes',
+                  'dataset', 'created_at', 'updated_at', 'finished_at']
+        read_only_fields = ['id', 'chunk_size', 'parsed_bytes', 'dataset', 'created_at', 'updated_at',
+                            'finished_at']
+        extra_kwargs = {'size': {'min_value': 1}}
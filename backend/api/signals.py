@@ -0,0 +1,37 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .authentication import user_cache
+from .cache import dataset_scope, response_cache, user_scope
+from .models import DataCSV, UploadSession
+from .responses import remove_precompressed
+from .uploads import remove_work_dir
+
+
+@receiver(post_save, sender=DataCSV)
+@receiver(post_delete, sender=DataCSV)
+def invalidate_dataset_responses(sender, instance, **kwargs):
+    # Covers uploads finishing, recomputed stats, deletes and retention eviction
+    response_cache.invalidate(dataset_scope(instance.pk), user_scope(instance.user_id))
+
+
+@receiver(post_delete, sender=DataCSV)
+def remove_dataset_responses(sender, instance, **kwargs):
+    # Evicted datasets queue theirs with their other files (api/cleanup.py)
+    if getattr(instance, 'keep_files', False):
+        return
+    remove_precompressed(instance.pk, instance.uploaded_at)
+
+
+@receiver(post_delete, sender=UploadSession)
+def remove_upload_state(sender, instance, **kwargs):
+    # Parse state and the unfinished columnar copy of a finished or abandoned upload
+    remove_work_dir(instance.pk)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def drop_cached_user(sender, instance, **kwargs):
+    # Other processes reload theirs within AUTH_USER_CACHE_TTL
+    user_cache.discard(instance.pk)
@@ -0,0 +1,304 @@
+"""
+Compact, mergeable summaries of a metric column.
+
+A MetricSketch keeps exact count / null count / min / max / mean / variance
+(merged with Chan's parallel formula), a fixed-bin histogram and a t-digest
+quantile sketch. Sketches are built chunk by chunk during ingest, stored as
+JSON on DataCSV.metric_sketches, and merge across chunks or datasets without
+going back to the rows. CovarianceSketch does the same for the co-moments of
+every pair of metrics.
+"""
+import math
+
+import numpy as np
+from django.conf import settings
+
+DEFAULT_COMPRESSION = 200
+
+
+def combine_moments(count_a, mean_a, m2_a, count_b, mean_b, m2_b):
+    """
+    Merge two (count, mean, sum of squared deviations) triples with Chan's
+    parallel formula; the variance is ``m2 / (count - 1)``.
+    """
+    if not count_b:
+        return count_a, mean_a, m2_a
+    total = count_a + count_b
+    delta = mean_b - mean_a
+    return (total,
+            mean_a + delta * count_b / total,
+            m2_a + m2_b + delta * delta * count_a * count_b / total)
+
+
+class TDigest:
+    """
+    Merging t-digest (Dunning & Ertl) using the k1 scale function, so
+    centroids are small near the tails and quantiles there stay accurate.
+    """
+
+    def __init__(self, compression=DEFAULT_COMPRESSION, means=(), weights=()):
+        self.compression = compression
+        self.means = np.asarray(means, dtype=np.float64)
+        self.weights = np.asarray(weights, dtype=np.float64)
+
+    @property
+    def count(self):
+        return float(self.weights.sum())
+
+    def _compress(self, means, weights):
+        order = np.argsort(means, kind='mergesort')
+        means, weights = means[order], weights[order]
+        total = weights.sum()
+        if not total:
+            self.means, self.weights = means, weights
+            return
+
+        # k1(q) = d / 2pi * asin(2q - 1); items whose left edge falls in the
+        # same unit of k merge into one centroid
+        q_left = (np.cumsum(weights) - weights) / total
+        k = np.floor(self.compression / (2 * math.pi) * np.arcsin(np.clip(2 * q_left - 1, -1, 1)))
+        starts = np.flatnonzero(np.r_[True, k[1:] != k[:-1]])
+
+        self.weights = np.add.reduceat(weights, starts)
+        self.means = np.add.reduceat(means * weights, starts) / self.weights
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        if not len(values):
+            return
+        self._compress(np.concatenate([self.means, values]),
+                       np.concatenate([self.weights, np.ones(len(values))]))
+
+    def merge(self, other):
+        self._compress(np.concatenate([self.means, other.means]),
+                       np.concatenate([self.weights, other.weights]))
+
+    def quantile(self, q, minimum, maximum):
+        """Estimate quantile(s) ``q``; the exact min and max pin the ends."""
+        total = self.count
+        if not total:
+            return np.full(np.shape(q), np.nan)
+        centers = np.cumsum(self.weights) - self.weights / 2
+        return np.interp(np.asarray(q) * total,
+                         np.r_[0.0, centers, total],
+                         np.r_[minimum, self.means, maximum])
+
+    def to_dict(self):
+        return {
+            'compression': self.compression,
+            'means': self.means.tolist(),
+            'weights': self.weights.tolist(),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['compression'], data['means'], data['weights'])
+
+
+class MetricSketch:
+    def __init__(self, low, high, bins, compression=DEFAULT_COMPRESSION):
+        self.count = 0
+        self.nulls = 0
+        self.min = math.inf
+        self.max = -math.inf
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.low, self.high, self.bins = float(low), float(high), int(bins)
+        # [underflow, bin 0 .. bin n-1, overflow]
+        self.histogram = np.zeros(self.bins + 2, dtype=np.int64)
+        self.digest = TDigest(compression)
+
+    @classmethod
+    def for_metric(cls, column):
+        low, high, bins = settings.METRIC_HISTOGRAM_BINS[column]
+        return cls(low, high, bins)
+
+    def _add_moments(self, count, mean, m2):
+        self.count, self.mean, self.m2 = combine_moments(self.count, self.mean, self.m2, count, mean, m2)
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        present = values[~np.isnan(values)]
+        self.nulls += len(values) - len(present)
+        if not len(present):
+            return
+
+        self.min = min(self.min, float(present.min()))
+        self.max = max(self.max, float(present.max()))
+        mean = float(present.mean())
+        self._add_moments(len(present), mean, float(((present - mean) ** 2).sum()))
+
+        width = (self.high - self.low) / self.bins
+        slots = np.floor((present - self.low) / width) + 1
+        slots = np.clip(slots, 0, self.bins + 1).astype(np.int64)
+        self.histogram += np.bincount(slots, minlength=self.bins + 2)
+        self.digest.update(present)
+
+    def merge(self, other):
+        if (self.low, self.high, self.bins) != (other.low, other.high, other.bins):
+            raise ValueError("Cannot merge sketches with different histogram bins")
+        self.nulls += other.nulls
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._add_moments(other.count, other.mean, other.m2)
+        self.histogram += other.histogram
+        self.digest.merge(other.digest)
+        return self
+
+    @property
+    def std(self):
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else None
+
+    def quantiles(self, qs):
+        if not self.count:
+            return [None] * len(qs)
+        return [float(v) for v in self.digest.quantile(qs, self.min, self.max)]
+
+    def histogram_dict(self):
+        return {
+            'edges': np.linspace(self.low, self.high, self.bins + 1).tolist(),
+            'counts': self.histogram[1:-1].tolist(),
+            'underflow': int(self.histogram[0]),
+            'overflow': int(self.histogram[-1]),
+        }
+
+    def describe(self, qs=()):
+        """API representation: exact stats, requested quantiles and the histogram."""
+        empty = not self.count
+        return {
+            'count': self.count,
+            'nulls': self.nulls,
+            'min': None if empty else self.min,
+            'max': None if empty else self.max,
+            'mean': None if empty else self.mean,
+            'std': self.std,
+            'quantiles': dict(zip((str(q) for q in qs), self.quantiles(qs))),
+            'histogram': self.histogram_dict(),
+        }
+
+    def to_dict(self):
+        empty = not self.count
+        return {
+            'count': self.count,
+            'nulls': self.nulls,
+            'min': None if empty else self.min,
+            'max': None if empty else self.max,
+            'mean': self.mean,
+            'm2': self.m2,
+            'histogram': {'low': self.low, 'high': self.high, 'bins': self.bins,
+                          'counts': self.histogram.tolist()},
+            'digest': self.digest.to_dict(),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        histogram = data['histogram']
+        sketch = cls(histogram['low'], histogram['high'], histogram['bins'])
+        sketch.count = data['count']
+        sketch.nulls = data['nulls']
+        sketch.min = math.inf if data['min'] is None else data['min']
+        sketch.max = -math.inf if data['max'] is None else data['max']
+        sketch.mean = data['mean']
+        sketch.m2 = data['m2']
+        sketch.histogram = np.asarray(histogram['counts'], dtype=np.int64)
+        sketch.digest = TDigest.from_dict(data['digest'])
+        return sketch
+
+
+def nullable_matrix(values):
+    return [[None if not np.isfinite(v) else float(v) for v in row] for row in values]
+
+
+class CovarianceSketch:
+    """
+    Pairwise co-moments of ``columns``: for every pair (i, j), over the rows
+    where both are present, the row count, the mean and squared deviations of
+    each column and their co-moment. Each chunk is reduced with a few matrix
+    products and merged with the pairwise form of Chan's update.
+    """
+
+    def __init__(self, columns):
+        self.columns = list(columns)
+        k = len(self.columns)
+        self.count = np.zeros((k, k))
+        # means[i, j] / m2[i, j]: column i over the rows where i and j are present
+        self.means = np.zeros((k, k))
+        self.m2 = np.zeros((k, k))
+        self.comoment = np.zeros((k, k))
+
+    def update(self, values):
+        """``values`` is an (n, k) float array with NaN for empty cells."""
+        values = np.asarray(values, dtype=np.float64)
+        present = ~np.isnan(values)
+        if not present.any():
+            return
+        weights = present.astype(np.float64)
+        # Shift by the chunk means so the sums of squares below stay well conditioned
+        filled = np.where(present, values, 0.0)
+        column_counts = weights.sum(axis=0)
+        shift = np.divide(filled.sum(axis=0), column_counts, out=np.zeros_like(column_counts),
+                          where=column_counts > 0)
+        centered = np.where(present, values - shift, 0.0)
+
+        count = weights.T @ weights
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = np.where(count > 0, (centered.T @ weights) / count, 0.0)
+        m2 = (centered ** 2).T @ weights - count * means ** 2
+        comoment = centered.T @ centered - count * means * means.T
+        self._merge(count, means + shift[:, None], m2, comoment)
+
+    def _merge(self, count, means, m2, comoment):
+        total = self.count + count
+        fraction = np.divide(count, total, out=np.zeros_like(total), where=total > 0)
+        share = self.count * fraction
+        delta = means - self.means
+        self.means = self.means + delta * fraction
+        self.m2 = self.m2 + m2 + delta ** 2 * share
+        self.comoment = self.comoment + comoment + delta * delta.T * share
+        self.count = total
+
+    def merge(self, other):
+        if self.columns != other.columns:
+            raise ValueError("Cannot merge covariance sketches over different columns")
+        self._merge(other.count, other.means, other.m2, other.comoment)
+        return self
+
+    def relationships(self):
+        """
+        Covariance and Pearson matrices plus least-squares fits of each later
+        column on each earlier one; undefined entries are None.
+        """
+        with np.errstate(invalid='ignore', divide='ignore'):
+            covariance = np.where(self.count > 1, self.comoment / (self.count - 1), np.nan)
+            pearson = self.comoment / np.sqrt(self.m2 * self.m2.T)
+            slope = self.comoment / self.m2
+        intercept = self.means.T - slope * self.means
+
+        fits = []
+        for i, x in enumerate(self.columns):
+            for j in range(i + 1, len(self.columns)):
+                valid = self.count[i, j] > 1 and np.isfinite(slope[i, j])
+                fits.append({
+                    'x': x,
+                    'y': self.columns[j],
+                    'count': int(self.count[i, j]),
+                    'slope': float(slope[i, j]) if valid else None,
+                    'intercept': float(intercept[i, j]) if valid else None,
+                    'r_squared': float(pearson[i, j] ** 2) if valid and np.isfinite(pearson[i, j]) else None,
+                })
+        return {
+            'columns': self.columns,
+            'count': self.count.astype(np.int64).tolist(),
+            'covariance': nullable_matrix(covariance),
+            'pearson': nullable_matrix(np.clip(pearson, -1, 1)),
+            'fits': fits,
+        }
+
+
+def merge_sketches(sketch_dicts):
+    """Merge stored sketch dicts of the same metric into one MetricSketch (or None)."""
+    merged = None
+    for data in sketch_dicts:
+        sketch = MetricSketch.from_dict(data)
+        merged = sketch if merged is None else merged.merge(sketch)
+    return merged
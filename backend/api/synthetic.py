@@ -0,0 +1,220 @@
+"""
+Synthetic equipment CSVs for tests and benchmarks.
+
+Rows are generated a block at a time with NumPy and formatted straight to
+bytes: every field of a block becomes a fixed-width uint8 matrix plus a mask
+of the characters that belong to it, and the masked characters, read row by
+row, are the CSV text. There is no per-row Python and no pandas formatting, so
+millions of rows take seconds and memory depends on the block size only.
+
+Each type has typical metric values (those of sample_files/) that the rows
+scatter around. The mix of types, the distribution of any metric and the
+share of empty cells, outliers and malformed rows are configurable.
+"""
+import numpy as np
+
+from .ingest import EQUIPMENT_COLUMNS, METRIC_COLUMNS
+
+# Share of each type in the default mix
+DEFAULT_MIX = {
+    'Pump': 0.3,
+    'Valve': 0.25,
+    'HeatExchanger': 0.15,
+    'Compressor': 0.1,
+    'Reactor': 0.1,
+    'Condenser': 0.1,
+}
+EQUIPMENT_TYPES = list(DEFAULT_MIX)
+
+# Typical (Flowrate, Pressure, Temperature) per type; other types get GENERIC_METRICS
+TYPE_METRICS = {
+    'Pump': (127, 5.5, 115),
+    'Valve': (60, 4.1, 105),
+    'HeatExchanger': (152, 6.2, 131),
+    'Compressor': (97, 8.2, 96),
+    'Reactor': (142, 7.3, 139),
+    'Condenser': (162, 6.8, 126),
+}
+GENERIC_METRICS = (120, 6.0, 115)
+# Standard deviation of each metric relative to the type's typical value
+METRIC_SPREAD = {'Flowrate': 0.12, 'Pressure': 0.15, 'Temperature': 0.08}
+
+# family -> values from standard draws and the two parameters
+DISTRIBUTIONS = {
+    'normal': lambda rng, a, b, n: a + b * rng.standard_normal(n),           # mean, std
+    'lognormal': lambda rng, a, b, n: a * np.exp(b * rng.standard_normal(n)),  # median, sigma of the log
+    'uniform': lambda rng, a, b, n: a + (b - a) * rng.random(n),              # low, high
+}
+# Written in place of a metric in a malformed row; no CSV reader takes it for a number
+MALFORMED_VALUE = b'#VALUE!'
+DECIMALS = 2
+DEFAULT_BLOCK_SIZE = 250_000
+
+
+def _constant(text, n):
+    chars = np.frombuffer(text, dtype=np.uint8)
+    return np.broadcast_to(chars, (n, len(chars))), np.ones((n, len(chars)), dtype=bool)
+
+
+def _digits(values, width=None):
+    """Non-negative integers as right-aligned digits, masked down to their length."""
+    if width is None:
+        width = len(str(int(values.max()))) if len(values) else 1
+    powers = 10 ** np.arange(width - 1, -1, -1, dtype=np.int64)
+    chars = (values[:, None] // powers % 10).astype(np.uint8) + ord('0')
+    mask = values[:, None] >= powers
+    mask[:, -1] = True
+    return chars, mask
+
+
+def _labels(names, index):
+    """``names[index]`` as masked characters."""
+    encoded = [name.encode() for name in names]
+    width = max(len(name) for name in encoded)
+    table = np.zeros((len(encoded), width), dtype=np.uint8)
+    lengths = np.array([len(name) for name in encoded])
+    for i, name in enumerate(encoded):
+        table[i, :len(name)] = np.frombuffer(name, dtype=np.uint8)
+    return table[index], np.arange(width) < lengths[index, None]
+
+
+def _decimals(values, empty, malformed):
+    """``values`` with DECIMALS places; ``empty`` cells are left blank, ``malformed`` ones unreadable."""
+    scale = 10 ** DECIMALS
+    scaled = np.rint(np.abs(np.where(empty, 0, values)) * scale).astype(np.int64)
+    negative = (values < 0) & (scaled > 0)
+    sign = np.full((len(values), 1), ord('-'), dtype=np.uint8)
+    whole, whole_mask = _digits(scaled // scale)
+    point, point_mask = _constant(b'.', len(values))
+    fraction, fraction_mask = _digits(scaled % scale, DECIMALS)
+    chars = np.concatenate([sign, whole, point, fraction], axis=1)
+    mask = np.concatenate([negative[:, None], whole_mask, point_mask, np.ones_like(fraction_mask)], axis=1)
+    mask &= ~empty[:, None]
+
+    if malformed.any():
+        width = max(chars.shape[1], len(MALFORMED_VALUE))
+        chars = np.pad(chars, ((0, 0), (0, width - chars.shape[1])))
+        mask = np.pad(mask, ((0, 0), (0, width - mask.shape[1])))
+        chars[malformed, :len(MALFORMED_VALUE)] = np.frombuffer(MALFORMED_VALUE, dtype=np.uint8)
+        mask[malformed] = np.arange(width) < len(MALFORMED_VALUE)
+    return chars, mask
+
+
+def _join(fields, n):
+    """One CSV line per row from a list of (chars, mask) fields."""
+    pieces = []
+    for i, field in enumerate(fields):
+        if i:
+            pieces.append(_constant(b',', n))
+        pieces.append(field)
+    pieces.append(_constant(b'\n', n))
+    chars = np.concatenate([chars for chars, _ in pieces], axis=1)
+    mask = np.concatenate([mask for _, mask in pieces], axis=1)
+    return chars[mask].tobytes()
+
+
+def parse_distribution(spec):
+    """``"family:a:b"`` (e.g. ``"lognormal:100:0.3"``) as a (family, a, b) tuple."""
+    family, *params = spec.split(':')
+    if family not in DISTRIBUTIONS or len(params) != 2:
+        raise ValueError(f"Expected one of {', '.join(DISTRIBUTIONS)} with two parameters, "
+                         f"like normal:120:15, not {spec!r}.")
+    try:
+        return family, float(params[0]), float(params[1])
+    except ValueError:
+        raise ValueError(f"Distribution parameters must be numbers, not {spec!r}.")
+
+
+class EquipmentGenerator:
+    """
+    Equipment rows as CSV text.
+
+    ``mix`` maps types to their relative share (DEFAULT_MIX). ``metrics``
+    maps a metric to a (family, a, b) distribution (see DISTRIBUTIONS) used
+    for every type instead of the per-type defaults. Of the metric cells,
+    ``nan_rate`` are left empty and ``outlier_rate`` are 5-20 times their
+    value, with either sign; ``malformed_rate`` of the rows have a metric
+    the ingest refuses. The same seed and block size give the same file.
+    """
+
+    def __init__(self, mix=None, metrics=None, nan_rate=0.0, outlier_rate=0.0, malformed_rate=0.0, seed=0):
+        mix = mix or DEFAULT_MIX
+        for name in mix:
+            if not name or any(char in name for char in ',"\r\n'):
+                raise ValueError(f"Type names cannot be empty or hold commas, quotes or newlines: {name!r}.")
+        weights = np.array(list(mix.values()), dtype=float)
+        if (weights < 0).any() or weights.sum() <= 0:
+            raise ValueError("Type shares must be non-negative and not all zero.")
+        for name, rate in [('nan_rate', nan_rate), ('outlier_rate', outlier_rate),
+                           ('malformed_rate', malformed_rate)]:
+            if not 0 <= rate <= 1:
+                raise ValueError(f"{name} must be between 0 and 1.")
+        metrics = metrics or {}
+        unknown = set(metrics) - set(METRIC_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown metric(s): {', '.join(sorted(unknown))}.")
+
+        self.types = list(mix)
+        self.weights = weights / weights.sum()
+        self.distributions = {}
+        for i, metric in enumerate(METRIC_COLUMNS):
+            if metric in metrics:
+                family, a, b = metrics[metric]
+                self.distributions[metric] = (family, np.full(len(self.types), a), np.full(len(self.types), b))
+            else:
+                typical = np.array([TYPE_METRICS.get(name, GENERIC_METRICS)[i] for name in self.types], dtype=float)
+                self.distributions[metric] = ('normal', typical, typical * METRIC_SPREAD[metric])
+        self.nan_rate = nan_rate
+        self.outlier_rate = outlier_rate
+        self.malformed_rate = malformed_rate
+        self.rng = np.random.default_rng(seed)
+        # Rows of each type so far: names run Pump-1, Pump-2, ... across blocks
+        self.counts = np.zeros(len(self.types), dtype=np.int64)
+
+    def metric(self, metric, kinds):
+        family, a, b = self.distributions[metric]
+        n = len(kinds)
+        values = DISTRIBUTIONS[family](self.rng, a[kinds], b[kinds], n)
+        if self.outlier_rate:
+            outliers = self.rng.random(n) < self.outlier_rate
+            factors = self.rng.uniform(5, 20, outliers.sum()) * self.rng.choice([-1, 1], outliers.sum())
+            values[outliers] *= factors
+        return values
+
+    def block(self, n):
+        """The next ``n`` rows as CSV lines."""
+        rng = self.rng
+        kinds = rng.choice(len(self.types), size=n, p=self.weights)
+        numbers = np.empty(n, dtype=np.int64)
+        for i in range(len(self.types)):
+            of_type = kinds == i
+            numbers[of_type] = self.counts[i] + np.arange(1, of_type.sum() + 1)
+            self.counts[i] += of_type.sum()
+
+        type_field = _labels(self.types, kinds)
+        dash = _constant(b'-', n)
+        number = _digits(numbers)
+        name_field = tuple(np.concatenate(parts, axis=1) for parts in zip(type_field, dash, number))
+
+        malformed_metric = np.full(n, -1)
+        if self.malformed_rate:
+            malformed = rng.random(n) < self.malformed_rate
+            malformed_metric[malformed] = rng.integers(0, len(METRIC_COLUMNS), malformed.sum())
+        fields = [name_field, type_field]
+        for i, metric in enumerate(METRIC_COLUMNS):
+            values = self.metric(metric, kinds)
+            empty = rng.random(n) < self.nan_rate if self.nan_rate else np.zeros(n, dtype=bool)
+            fields.append(_decimals(values, empty, malformed_metric == i))
+        return _join(fields, n)
+
+    def write(self, f, rows, block=DEFAULT_BLOCK_SIZE):
+        """Write the header and ``rows`` rows to the binary file ``f``."""
+        f.write((','.join(EQUIPMENT_COLUMNS) + '\n').encode())
+        for start in range(0, rows, block):
+            f.write(self.block(min(block, rows - start)))
+
+
+def write_equipment_csv(path, rows, block=DEFAULT_BLOCK_SIZE, seed=0, **options):
+    """Write ``rows`` random equipment rows to ``path``; ``options`` are EquipmentGenerator's."""
+    with open(path, 'wb') as f:
+        EquipmentGenerator(seed=seed, **options).write(f, rows, block)
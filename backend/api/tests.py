@@ -1,3 +1,1381 @@
-from django.test import TestCase
+import datetime
+import decimal
+import gzip
+import hashlib
+import io
+import json
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+import tracemalloc
+import zipfile
+from unittest import mock
 
-# Create your tests here.
+import brotli
+import numpy as np
+import orjson
+import pandas as pd
+import zstandard
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import AsyncClient, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import bulk
+from .authentication import user_cache
+from .cache import ByteBoundedFileBasedCache, ByteBoundedLocMemCache, response_cache
+from .columnar import ColumnarDataset, ColumnarWriter, sidecar_path
+from .compression import negotiate
+from .downsample import density, lttb, minmax
+from .ingest import (CSVFormatError, ingest_csv, iter_csv_chunks, load_columns, recompute_summary,
+                     validate_csv)
+from .cleanup import purge_files
+from .models import DataCSV, EquipmentRow, FileCleanup, IngestJob, UploadSession
+from .query import EquipmentQuery, QueryBudget, QueryBudgetExceeded
+from .renderers import ORJSONRenderer, dumps
+from .responses import precompressed_path
+from .sketches import CovarianceSketch, MetricSketch, merge_sketches
+from .synthetic import EquipmentGenerator, write_equipment_csv
+from .worker import claim_next_job, process_next_job, run_job, run_worker
+
+SAMPLE_CSV = (
+    "Equipment Name,Type,Flowrate,Pressure,Temperature\n"
+    "Pump-1,Pump,120,5.2,110\n"
+    "Compressor-1,Compressor,95,8.4,95\n"
+    "Valve-1,Valve,60,4.1,105\n"
+    "Pump-2,Pump,132,,118\n"
+)
+
+
+class IngestTests(TestCase):
+    def test_matches_full_parse(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as f:
+            f.write(SAMPLE_CSV)
+        self.addCleanup(os.remove, f.name)
+
+        df = pd.read_csv(f.name)
+        rows = []
+        summary = ingest_csv(f.name, on_rows=rows.append, chunk_size=3)
+        fields = summary.fields()
+
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(fields['total_count'], len(df))
+        self.assertAlmostEqual(fields['average_flowrate'], df['Flowrate'].mean())
+        self.assertAlmostEqual(fields['average_pressure'], df['Pressure'].mean())
+        self.assertAlmostEqual(fields['average_temperature'], df['Temperature'].mean())
+        self.assertEqual(fields['equipment_type_distribution'], df['Type'].value_counts().to_dict())
+
+    def test_type_stats_match_groupby(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        path = os.path.join(tmpdir, 'plant.csv')
+        write_equipment_csv(path, 10_000)
+        with open(path, 'a') as f:
+            f.write("Orphan-1,,1,2,3\nPump-x,Pump,,,\n")
+
+        df = pd.read_csv(path)
+        expected = df.groupby('Type')[['Flowrate', 'Pressure', 'Temperature']].agg(
+            ['count', 'mean', 'min', 'max', 'std'])
+        type_stats = ingest_csv(path, chunk_size=999).fields()['type_stats']
+
+        self.assertEqual(sorted(type_stats), sorted(expected.index))
+        for kind, per_metric in type_stats.items():
+            for col, stats in per_metric.items():
+                for stat, value in stats.items():
+                    self.assertAlmostEqual(value, expected.loc[kind, (col, stat)], places=6)
+
+    def test_engines_agree(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        path = os.path.join(tmpdir, 'plant.csv')
+        write_equipment_csv(path, 5_000)
+        with open(path, 'a') as f:
+            f.write("Orphan-1,,1,2,3\nPump-x,Pump,,,\n")
+
+        chunks = {engine: list(iter_csv_chunks(path, chunk_size=1_000, engine=engine))
+                  for engine in ('c', 'pyarrow')}
+        self.assertEqual([len(chunk) for chunk in chunks['pyarrow']], [1_000] * 5 + [2])
+        for engine, engine_chunks in chunks.items():
+            first = engine_chunks[0]
+            self.assertIsInstance(first['Type'].dtype, pd.CategoricalDtype)
+            self.assertEqual(first['Flowrate'].dtype, np.float64)
+            self.assertIsInstance(first['Equipment Name'].dtype, pd.StringDtype)
+        c, arrow = (pd.concat(chunks[engine], ignore_index=True) for engine in ('c', 'pyarrow'))
+        pd.testing.assert_frame_equal(c.astype({'Type': 'string', 'Equipment Name': object}),
+                                      arrow.astype({'Type': 'string', 'Equipment Name': object}))
+
+        fields = {engine: ingest_csv(path, chunk_size=999, engine=engine).fields() for engine in ('c', 'pyarrow')}
+        self.assertEqual(fields['c']['type_stats'], fields['pyarrow']['type_stats'])
+        self.assertEqual(fields['c']['average_flowrate'], fields['pyarrow']['average_flowrate'])
+
+    @override_settings(CSV_METRIC_DTYPE='float32')
+    def test_float32_metrics(self):
+        for engine in ('c', 'pyarrow'):
+            chunk = next(iter_csv_chunks(io.BytesIO(SAMPLE_CSV.encode()), engine=engine))
+            self.assertEqual(chunk['Pressure'].dtype, np.float32)
+        fields = ingest_csv(io.BytesIO(SAMPLE_CSV.encode())).fields()
+        self.assertAlmostEqual(fields['average_pressure'], (5.2 + 8.4 + 4.1) / 3, places=5)
+
+    def test_validate_csv(self):
+        source = io.BytesIO(SAMPLE_CSV.encode())
+        validate_csv(source)
+        self.assertEqual(source.tell(), 0)
+        with self.assertRaisesMessage(CSVFormatError, "Missing required column(s): Type"):
+            validate_csv(io.BytesIO(b"Equipment Name,Flowrate,Pressure,Temperature\nP,1,2,3\n"))
+        bad_value = (SAMPLE_CSV + "P,Pump,1,high,3\n").encode()
+        with self.assertRaises(CSVFormatError):
+            validate_csv(io.BytesIO(bad_value))
+        # Only the first block is checked
+        validate_csv(io.BytesIO(bad_value), rows=2)
+
+    def test_missing_columns(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as f:
+            f.write("name,Flowrate\na,1\nb,\n")
+        self.addCleanup(os.remove, f.name)
+
+        rows = []
+        fields = ingest_csv(f.name, on_rows=rows.append).fields()
+        self.assertEqual(rows, [])
+        self.assertEqual(fields['average_flowrate'], 1.0)
+        self.assertEqual(fields['average_pressure'], 0)
+        self.assertEqual(fields['equipment_type_distribution'], {})
+
+    def test_memory_bounded_on_large_file(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+
+        def peak_memory(rows):
+            path = os.path.join(tmpdir, f'{rows}.csv')
+            write_equipment_csv(path, rows)
+            seen = []
+            tracemalloc.start()
+            try:
+                # tracemalloc sees NumPy's allocations but not pyarrow's buffers, so pin the C engine
+                summary = ingest_csv(path, on_rows=lambda chunk: seen.append(len(chunk)), chunk_size=20_000,
+                                     engine='c')
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+            self.assertEqual(summary.total_count, rows)
+            self.assertEqual(sum(seen), rows)
+            return peak
+
+        small = peak_memory(100_000)
+        large = peak_memory(2_000_000)
+        # 20x the rows must not mean 20x the memory
+        self.assertLess(large, small * 1.5)
+        self.assertLess(large, 64 * 1024 * 1024)
+
+    def test_synthetic_csv(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        path = os.path.join(tmpdir, 'plant.csv')
+        options = {'mix': {'Pump': 3, 'Valve': 1}, 'nan_rate': 0.1, 'outlier_rate': 0.01, 'seed': 3}
+        write_equipment_csv(path, 20_000, block=7_000, **options)
+
+        df = pd.read_csv(path)
+        self.assertEqual(list(df.columns), ['Equipment Name', 'Type', 'Flowrate', 'Pressure', 'Temperature'])
+        self.assertEqual(len(df), 20_000)
+        self.assertAlmostEqual((df['Type'] == 'Pump').mean(), 0.75, delta=0.02)
+        for kind, names in df.groupby('Type')['Equipment Name']:
+            self.assertEqual(list(names), [f'{kind}-{i}' for i in range(1, len(names) + 1)])
+        for metric in ['Flowrate', 'Pressure', 'Temperature']:
+            self.assertAlmostEqual(df[metric].isna().mean(), 0.1, delta=0.02)
+        self.assertAlmostEqual(df.loc[df['Type'] == 'Valve', 'Flowrate'].median(), 60, delta=1)
+        self.assertGreater(df['Flowrate'].abs().max(), 5 * 60)
+
+        again = io.BytesIO()
+        EquipmentGenerator(**options).write(again, 20_000, block=7_000)
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(), again.getvalue())
+
+        write_equipment_csv(path, 1_000, malformed_rate=0.01)
+        with self.assertRaises(CSVFormatError):
+            validate_csv(path)
+
+
+class ColumnarTests(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.csv_path = os.path.join(self.tmpdir, 'plant.csv')
+        with open(self.csv_path, 'w', encoding='utf-8') as f:
+            f.write(SAMPLE_CSV + "Kühler-1,,70,3.3,\n")
+
+    def test_round_trip(self):
+        writer = ColumnarWriter(sidecar_path(self.csv_path))
+        ingest_csv(self.csv_path, on_rows=writer, chunk_size=2)
+        writer.close()
+
+        columns = ColumnarDataset(sidecar_path(self.csv_path))
+        df = pd.read_csv(self.csv_path)
+        self.assertEqual(columns.rows, 5)
+        self.assertIsInstance(columns.metric('Flowrate'), np.memmap)
+        np.testing.assert_array_equal(columns.metric('Pressure'), df['Pressure'].to_numpy())
+        np.testing.assert_array_equal(columns.metric('Temperature'), df['Temperature'].to_numpy())
+        self.assertEqual(list(columns.names()), list(df['Equipment Name']))
+        self.assertEqual(list(columns.names(3, 5)), ['Pump-2', 'Kühler-1'])
+        self.assertEqual(list(columns.types()[:4]), ['Pump', 'Compressor', 'Valve', 'Pump'])
+        self.assertTrue(pd.isna(columns.types()[4]))
+
+        frame = columns.to_frame(1, 3)
+        self.assertEqual(list(frame.columns), list(df.columns))
+        self.assertEqual(list(frame['Equipment Name']), ['Compressor-1', 'Valve-1'])
+
+    def test_pickled_writer_resumes(self):
+        chunks = list(iter_csv_chunks(self.csv_path, chunk_size=2))
+        writer = ColumnarWriter(sidecar_path(self.csv_path))
+        writer(chunks[0])
+        saved = pickle.dumps(writer)
+        # Appended after the pickle and never recorded, as when a request fails half-way
+        writer(chunks[1])
+        writer.suspend()
+
+        writer = pickle.loads(saved)
+        for chunk in chunks[1:]:
+            writer(chunk)
+        writer.close()
+        columns = ColumnarDataset(sidecar_path(self.csv_path))
+        self.assertEqual(columns.rows, 5)
+        self.assertEqual(list(columns.names()), list(pd.read_csv(self.csv_path)['Equipment Name']))
+        np.testing.assert_array_equal(columns.metric('Flowrate'), [120, 95, 60, 132, 70])
+
+    def test_abort_leaves_nothing(self):
+        writer = ColumnarWriter(sidecar_path(self.csv_path))
+        writer.abort()
+        self.assertEqual(os.listdir(self.tmpdir), ['plant.csv'])
+
+
+class DownsampleTests(TestCase):
+    def test_lttb_keeps_ends_and_peaks(self):
+        values = np.sin(np.linspace(0, 20, 100_000))
+        values[50_000] = 10.0
+        values[10] = np.nan
+        index = lttb(values, 500)
+        self.assertEqual(len(index), 500)
+        self.assertEqual(index[0], 0)
+        self.assertEqual(index[-1], 99_999)
+        self.assertIn(50_000, index)
+        self.assertNotIn(10, index)
+        self.assertTrue(np.all(np.diff(index) > 0))
+
+    def test_minmax_keeps_extremes(self):
+        values = np.random.default_rng(1).normal(size=10_000)
+        index = minmax(values, 100)
+        self.assertLessEqual(len(index), 100)
+        self.assertIn(np.argmax(values), index)
+        self.assertIn(np.argmin(values), index)
+
+    def test_short_series_untouched(self):
+        self.assertEqual(list(lttb(np.arange(5.0), 100)), [0, 1, 2, 3, 4])
+        self.assertEqual(list(minmax(np.arange(5.0), 100)), [0, 1, 2, 3, 4])
+
+    def test_density_counts_every_complete_row(self):
+        x = np.array([0.0, 1.0, 2.0, np.nan, 4.0])
+        y = np.array([0.0, 0.0, 1.0, 1.0, 1.0])
+        grid = density(x, y, 2)
+        self.assertEqual(grid['counts'], [[2, 0], [0, 2]])
+        self.assertEqual(grid['x_edges'], [0.0, 2.0, 4.0])
+
+
+class SketchTests(TestCase):
+    def test_merged_chunks_match_exact_stats(self):
+        values = np.random.default_rng(2).lognormal(4, 0.5, 200_000)
+        values[::1000] = np.nan
+        present = values[~np.isnan(values)]
+
+        sketches = [MetricSketch(0, 500, 50) for _ in range(4)]
+        for sketch, part in zip(sketches, np.array_split(values, 4)):
+            sketch.update(part)
+        merged = merge_sketches(sketch.to_dict() for sketch in sketches)
+
+        self.assertEqual(merged.count, len(present))
+        self.assertEqual(merged.nulls, 200)
+        self.assertEqual(merged.min, present.min())
+        self.assertAlmostEqual(merged.mean, present.mean())
+        self.assertAlmostEqual(merged.std, present.std(ddof=1))
+
+        histogram = merged.histogram_dict()
+        counts, _ = np.histogram(present, bins=histogram['edges'])
+        self.assertEqual(histogram['counts'][:-1], counts.tolist()[:-1])
+        self.assertEqual(histogram['overflow'], int((present >= 500).sum()))
+        self.assertEqual(sum(histogram['counts']) + histogram['overflow'] + histogram['underflow'], len(present))
+
+        # Rank error of the t-digest stays well under 1%, tighter at the tails
+        for q, tolerance in [(0.01, 0.001), (0.5, 0.005), (0.99, 0.001)]:
+            estimate = merged.quantiles([q])[0]
+            self.assertAlmostEqual(np.mean(present <= estimate), q, delta=tolerance)
+        self.assertLess(len(merged.digest.means), 200)
+
+    def test_covariance_matches_pairwise_complete_pandas(self):
+        rng = np.random.default_rng(3)
+        x = rng.normal(1000, 5, 30_000)
+        frame = pd.DataFrame({'a': x, 'b': 2 * x + rng.normal(0, 1, len(x)), 'c': rng.normal(size=len(x))})
+        frame.iloc[::7, 0] = np.nan
+        frame.iloc[::11, 1] = np.nan
+
+        sketch = CovarianceSketch(frame.columns)
+        for chunk in np.array_split(frame.to_numpy(), 13):
+            sketch.update(chunk)
+        result = sketch.relationships()
+
+        np.testing.assert_allclose(result['covariance'], frame.cov().to_numpy(), rtol=1e-9)
+        np.testing.assert_allclose(result['pearson'], frame.corr().to_numpy(), rtol=1e-9, atol=1e-12)
+        both = frame[['a', 'b']].dropna()
+        slope, intercept = np.polyfit(both['a'], both['b'], 1)
+        fit = result['fits'][0]
+        self.assertEqual((fit['x'], fit['y'], fit['count']), ('a', 'b', len(both)))
+        self.assertAlmostEqual(fit['slope'], slope, places=8)
+        self.assertAlmostEqual(fit['intercept'], intercept, places=5)
+
+    def test_mismatched_bins_do_not_merge(self):
+        with self.assertRaises(ValueError):
+            MetricSketch(0, 10, 10).merge(MetricSketch(0, 10, 20))
+
+
+class RendererTests(TestCase):
+    def render(self, data):
+        return json.loads(ORJSONRenderer().render(data))
+
+    def test_numpy_and_non_finite_values(self):
+        data = {
+            'count': np.int64(3),
+            'mean': np.float32(1.5),
+            'values': np.array([1.0, np.nan, np.inf]),
+            'missing': float('nan'),
+            'low': float('-inf'),
+        }
+        self.assertEqual(self.render(data), {
+            'count': 3, 'mean': 1.5, 'values': [1.0, None, None], 'missing': None, 'low': None,
+        })
+
+    def test_fragments_are_embedded_verbatim(self):
+        cached = orjson.Fragment(dumps({'x': [1, 2]}))
+        self.assertEqual(ORJSONRenderer().render({'chart': cached}), b'{"chart":{"x":[1,2]}}')
+
+    def test_matches_drf_renderer(self):
+        data = {
+            'uploaded_at': datetime.datetime(2024, 5, 1, 12, 30, 15, 123456, tzinfo=datetime.timezone.utc),
+            'day': datetime.date(2024, 5, 1),
+            'price': decimal.Decimal('1.50'),
+            'title': 'line\u2028separator',
+        }
+        expected = JSONRenderer().render(data)
+        rendered = ORJSONRenderer().render(data)
+        self.assertEqual(json.loads(rendered), json.loads(expected))
+        self.assertIn(b'\\u2028', rendered)
+
+
+class CompressionTests(TestCase):
+    def test_negotiate(self):
+        self.assertEqual(negotiate('gzip, deflate, br, zstd'), 'zstd')
+        self.assertEqual(negotiate('gzip, br;q=0.8'), 'gzip')
+        self.assertEqual(negotiate('zstd;q=0, *'), 'br')
+        self.assertEqual(negotiate('br', available=['zstd', 'gzip']), None)
+        self.assertIsNone(negotiate('identity'))
+        self.assertIsNone(negotiate(None))
+
+
+class ResponseCacheBackendTests(TestCase):
+    def check_lru(self, cache):
+        cache.set('a', b'x' * 400)
+        cache.set('b', b'x' * 400)
+        self.assertIsNotNone(cache.get('a'))  # a is now more recent than b
+        cache.set('c', b'x' * 400)
+        self.assertIsNotNone(cache.get('a'))
+        self.assertIsNone(cache.get('b'))
+        self.assertIsNotNone(cache.get('c'))
+        self.assertLessEqual(cache.usage()['bytes'], 1000)
+
+    def test_locmem_evicts_least_recently_used(self):
+        cache = ByteBoundedLocMemCache('lru-test', {'OPTIONS': {'MAX_BYTES': 1000}})
+        self.addCleanup(cache.clear)
+        self.check_lru(cache)
+        cache.delete('a')
+        self.assertEqual(cache.usage()['entries'], 1)
+
+    def test_file_evicts_least_recently_used(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        # File entries carry a pickled expiry and are compressed; random bytes stay ~400
+        cache = ByteBoundedFileBasedCache(tmpdir, {'OPTIONS': {'MAX_BYTES': 1000}})
+        cache.set('a', os.urandom(400))
+        cache.set('b', os.urandom(400))
+        self.assertIsNotNone(cache.get('a'))
+        cache.set('c', os.urandom(400))
+        self.assertIsNotNone(cache.get('a'))
+        self.assertIsNone(cache.get('b'))
+        self.assertLessEqual(cache.usage()['bytes'], 1000)
+
+    def test_file_writes_scan_only_when_over_the_bound(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        cache = ByteBoundedFileBasedCache(tmpdir, {'OPTIONS': {'MAX_BYTES': 100_000}})
+        cache.set('first', b'x')
+        with mock.patch.object(cache, '_stat_files', wraps=cache._stat_files) as scans:
+            for i in range(50):
+                cache.set(f'a{i}', os.urandom(1000))
+            self.assertEqual(scans.call_count, 0)
+            for i in range(60):
+                cache.set(f'b{i}', os.urandom(1000))
+            # Each cull frees enough room for several more writes
+            self.assertIn(scans.call_count, range(1, 5))
+        self.assertLessEqual(cache.usage()['bytes'], 100_000)
+        self.assertIsNotNone(cache.get('b59'))
+
+    def test_hit_counters_are_not_cache_entries(self):
+        response_cache.reset_stats()
+        cache = response_cache.cache
+        response_cache.get('missing')
+        cache.set('present', b'x')
+        response_cache.get('present')
+        cache.clear()
+        self.assertEqual((response_cache.stats()['hits'], response_cache.stats()['misses']), (1, 1))
+
+
+class JWTAuthenticationTests(TestCase):
+    def setUp(self):
+        user_cache.clear()
+        self.user = User.objects.create_user(username='operator', password='secret-pass')
+        self.client = APIClient()
+        tokens = self.client.post('/api/token/', {'username': 'operator', 'password': 'secret-pass'}).data
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+        self.refresh = tokens['refresh']
+
+    def user_queries(self, url='/api/last5-csv/'):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        return response, [q['sql'] for q in queries if 'auth_user' in q['sql']]
+
+    def test_user_read_from_cache(self):
+        response, queries = self.user_queries()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(queries), 1)
+        response, queries = self.user_queries()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(queries, [])
+
+    def test_password_change_revokes_tokens(self):
+        self.assertEqual(self.client.get('/api/last5-csv/').status_code, 200)
+        self.user.set_password('new-pass')
+        self.user.save()
+        response = self.client.get('/api/last5-csv/')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.data['code'], 'password_changed')
+        # Access tokens minted from the old refresh token carry the old password too
+        access = self.client.post('/api/token/refresh/', {'refresh': self.refresh}).data['access']
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {access}")
+        self.assertEqual(self.client.get('/api/last5-csv/').status_code, 401)
+
+    def test_changes_elsewhere_apply_within_ttl(self):
+        self.assertEqual(self.client.get('/api/last5-csv/').status_code, 200)
+        # A change made by another process sends no signal here
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertEqual(self.client.get('/api/last5-csv/').status_code, 200)
+        with override_settings(AUTH_USER_CACHE_TTL=0):
+            self.assertEqual(self.client.get('/api/last5-csv/').status_code, 401)
+
+
+class CSVUploadViewTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        caches[settings.RESPONSE_CACHE_ALIAS].clear()
+
+        self.user = User.objects.create_user(username='operator', password='secret-pass')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def upload(self, title='plant', content=SAMPLE_CSV):
+        csv_file = SimpleUploadedFile(f'{title}.csv', content.encode(), content_type='text/csv')
+        return self.client.post('/api/upload-csv/', {'title': title, 'csv_file': csv_file}, format='multipart')
+
+    @override_settings(CSV_INGEST_CHUNK_SIZE=2)
+    def test_upload_is_queued_and_processed_by_worker(self):
+        response = self.upload()
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['status'], IngestJob.STATUS_PENDING)
+        self.assertEqual(response['Location'], f"/api/jobs/{response.data['job_id']}/")
+        self.assertFalse(DataCSV.objects.exists())
+
+        job = process_next_job()
+        self.assertEqual(job.status, IngestJob.STATUS_DONE)
+        self.assertIsNone(process_next_job())
+
+        status_response = self.client.get(response['Location'])
+        self.assertEqual(status_response.status_code, 200)
+        self.assertEqual(status_response.data['status'], IngestJob.STATUS_DONE)
+        self.assertEqual(status_response.data['progress'], 1.0)
+        self.assertEqual(status_response.data['rows_processed'], 4)
+
+        dataset = DataCSV.objects.get(pk=status_response.data['dataset'])
+        self.assertEqual(dataset.csv_file.name, job.csv_file.name)
+        self.assertEqual(dataset.total_count, 4)
+        self.assertAlmostEqual(dataset.average_flowrate, 101.75)
+        self.assertAlmostEqual(dataset.average_pressure, (5.2 + 8.4 + 4.1) / 3)
+        self.assertEqual(dataset.equipment_type_distribution, {'Pump': 2, 'Compressor': 1, 'Valve': 1})
+        pump = dataset.type_stats['Pump']
+        self.assertEqual(pump['Flowrate'], {'count': 2, 'mean': 126.0, 'min': 120.0, 'max': 132.0,
+                                            'std': 72 ** 0.5})
+        self.assertEqual(pump['Pressure'], {'count': 1, 'mean': 5.2, 'min': 5.2, 'max': 5.2, 'std': None})
+        self.assertEqual(dataset.rows.count(), 4)
+        self.assertIsNone(dataset.rows.get(name='Pump-2').pressure)
+
+    def test_fetch_rebuilds_equipment_list_from_rows(self):
+        self.upload()
+        dataset_id = process_next_job().dataset_id
+
+        response = self.client.get(f'/api/csv/{dataset_id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['total_count'], 4)
+        self.assertEqual(response.data['type_stats']['Valve']['Temperature']['mean'], 105.0)
+        df = pd.read_csv(io.StringIO(SAMPLE_CSV))[['Flowrate', 'Pressure', 'Temperature']]
+        relationships = response.data['metric_relationships']
+        np.testing.assert_allclose(relationships['pearson'], df.corr().to_numpy())
+        np.testing.assert_allclose(relationships['spearman'], df.corr(method='spearman').to_numpy())
+        self.assertEqual(response.data['equipment_list'][0], {
+            'Equipment Name': 'Pump-1', 'Type': 'Pump',
+            'Flowrate': 120.0, 'Pressure': 5.2, 'Temperature': 110.0,
+        })
+        self.assertEqual([row['Equipment Name'] for row in response.data['equipment_list']],
+                         ['Pump-1', 'Compressor-1', 'Valve-1', 'Pump-2'])
+
+    def test_columnar_copy_written_at_ingest(self):
+        self.upload()
+        dataset = process_next_job().dataset
+        path = sidecar_path(dataset.csv_file.path)
+        self.assertTrue(ColumnarDataset.exists(path))
+        self.assertEqual(load_columns(dataset).rows, 4)
+
+        summary = recompute_summary(dataset)
+        self.assertEqual(summary['total_count'], dataset.total_count)
+        self.assertAlmostEqual(summary['average_pressure'], dataset.average_pressure)
+        self.assertEqual(summary['equipment_type_distribution'], dataset.equipment_type_distribution)
+
+        dataset.delete()
+        self.assertFalse(os.path.exists(path))
+
+    def test_columnar_copy_built_on_first_use(self):
+        self.upload()
+        dataset = process_next_job().dataset
+        path = sidecar_path(dataset.csv_file.path)
+        shutil.rmtree(path)
+
+        self.assertEqual(list(load_columns(dataset).names()), ['Pump-1', 'Compressor-1', 'Valve-1', 'Pump-2'])
+        self.assertTrue(ColumnarDataset.exists(path))
+
+    def upload_rows(self, count, title='big'):
+        lines = [f"Pump-{i},Pump,{i},1.5,90" for i in range(count)]
+        response = self.upload(title=title, content="Equipment Name,Type,Flowrate,Pressure,Temperature\n" + "\n".join(lines) + "\n")
+        # Repeated content is deduplicated at upload time instead of queued
+        return response.data['dataset'] or process_next_job().dataset_id
+
+    def test_cursor_pagination(self):
+        dataset_id = self.upload_rows(25)
+        names, url, pages = [], f'/api/csv/{dataset_id}/?limit=10', 0
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data['total_count'], 25)
+            self.assertLessEqual(len(response.data['equipment_list']), 10)
+            names += [row['Equipment Name'] for row in response.data['equipment_list']]
+            url, pages = response.data['next'], pages + 1
+        self.assertEqual(pages, 3)
+        self.assertEqual(names, [f'Pump-{i}' for i in range(25)])
+
+    def test_offset_window(self):
+        dataset_id = self.upload_rows(25)
+        response = self.client.get(f'/api/csv/{dataset_id}/?offset=20&limit=10')
+        self.assertEqual([row['Flowrate'] for row in response.data['equipment_list']], [20.0, 21.0, 22.0, 23.0, 24.0])
+        self.assertIsNone(response.data['next'])
+        self.assertIn('offset=10', response.data['previous'])
+
+    def test_summary_without_rows(self):
+        dataset_id = self.upload_rows(25)
+        # ETag lookup + summary
+        with self.assertNumQueries(2):
+            response = self.client.get(f'/api/csv/{dataset_id}/?limit=0')
+        self.assertEqual(response.data['equipment_list'], [])
+        self.assertEqual(response.data['total_count'], 25)
+
+    def test_fetch_projection(self):
+        dataset_id = self.upload_rows(25)
+        full = self.client.get(f'/api/csv/{dataset_id}/')
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'/api/csv/{dataset_id}/?fields=title,total_count')
+        self.assertEqual(response.data, {'title': 'big', 'total_count': 25})
+        # ETag lookup + the projected summary
+        self.assertEqual(len(queries), 2)
+        self.assertNotIn('equipment_type_distribution', queries[1]['sql'])
+        self.assertNotIn('average_flowrate', queries[1]['sql'])
+        self.assertLess(len(response.content) * 20, len(full.content))
+
+        response = self.client.get(f'/api/csv/{dataset_id}/?fields=equipment_list&limit=5')
+        self.assertEqual(set(response.data), {'equipment_list', 'next', 'previous'})
+        self.assertEqual(len(response.data['equipment_list']), 5)
+
+    def test_list_projection(self):
+        for i in range(3):
+            self.upload_rows(10, title=f'plant-{i}')
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/last5-csv/?fields=id,title')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([set(item) for item in response.data], [{'id', 'title'}] * 3)
+        # ETag lookup + the projected list
+        self.assertEqual(len(queries), 2)
+        self.assertNotIn('equipment_type_distribution', queries[1]['sql'])
+        self.assertNotIn('api_equipmentrow', queries[1]['sql'])
+
+        with CaptureQueriesContext(connection) as queries:
+            full = self.client.get('/api/last5-csv/')
+        self.assertEqual(len(queries), 2)
+        self.assertNotIn('api_equipmentrow', queries[1]['sql'])
+        self.assertLess(len(response.content) * 4, len(full.content))
+
+    def test_unknown_projection_field(self):
+        response = self.client.get('/api/last5-csv/?fields=title,secret')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('secret', str(response.data['fields']))
+
+    def test_series_endpoint(self):
+        dataset_id = self.upload_rows(50)
+        response = self.client.get(f'/api/csv/{dataset_id}/series/?metric=Flowrate&points=10')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['total_count'], 50)
+        self.assertEqual(data['points'], 10)
+        self.assertEqual(data['x'][0], 0)
+        self.assertEqual(data['x'][-1], 49)
+        self.assertEqual(data['y'], [float(i) for i in data['x']])
+        self.assertEqual(data['labels'][-1], 'Pump-49')
+
+        # Served from the cache: only the dataset lookup hits the database
+        with CaptureQueriesContext(connection) as queries:
+            cached = self.client.get(f'/api/csv/{dataset_id}/series/?metric=Flowrate&points=10')
+        self.assertEqual(cached.content, response.content)
+        self.assertEqual(len(queries), 1)
+
+        self.assertEqual(self.client.get(f'/api/csv/{dataset_id}/series/?metric=Nope').status_code, 400)
+        self.assertEqual(self.client.get(f'/api/csv/{dataset_id}/series/?points=1').status_code, 400)
+
+    def test_density_endpoint(self):
+        dataset_id = self.upload_rows(50)
+        response = self.client.get(f'/api/csv/{dataset_id}/density/?bins=5')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        pairs = [(pair['x'], pair['y']) for pair in data['pairs']]
+        self.assertEqual(pairs, [('Flowrate', 'Pressure'), ('Flowrate', 'Temperature'), ('Pressure', 'Temperature')])
+        self.assertEqual(sum(map(sum, data['pairs'][0]['counts'])), 50)
+
+    def test_compare_endpoint(self):
+        self.upload(title='last-week', content=(
+            "Equipment Name,Type,Flowrate,Pressure,Temperature\n"
+            "Pump-1,Pump,120,5.2,110\n"
+            "Valve-1,Valve,60,4.1,105\n"
+            "Pump-2,Pump,132,,118\n"
+            "Pump-2,Pump,130,5,117\n"
+            "Mixer-1,Mixer,10,1,20\n"
+        )).data['job_id']
+        self.upload(title='this-week', content=(
+            "Equipment Name,Type,Flowrate,Pressure,Temperature\n"
+            "Pump-2,Pump,132,,118\n"
+            "Pump-1,Pump,125,5.2,110\n"
+            "Valve-1,Compressor,60,4.1,105\n"
+            "Pump-2,Pump,130,6,117\n"
+            "Heater-1,HeatExchanger,80,2,300\n"
+        ))
+        a, b = process_next_job().dataset_id, process_next_job().dataset_id
+
+        response = self.client.get(f'/api/compare/?a={a}&b={b}')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['equipment'], {
+            'matched': 4, 'changed': 3, 'type_changed': 1, 'added': 1, 'removed': 1,
+            'metrics': {
+                'Flowrate': {'changed': 1, 'mean_delta': 1.25, 'min_delta': 0.0, 'max_delta': 5.0},
+                'Pressure': {'changed': 1, 'mean_delta': 1 / 3, 'min_delta': 0.0, 'max_delta': 1.0},
+                'Temperature': {'changed': 0, 'mean_delta': 0.0, 'min_delta': 0.0, 'max_delta': 0.0},
+            },
+        })
+        # In b's order; the two Pump-2 rows pair up by occurrence
+        self.assertEqual([row['Equipment Name'] for row in data['changed']], ['Pump-1', 'Valve-1', 'Pump-2'])
+        self.assertEqual(data['changed'][0]['Flowrate'], {'a': 120.0, 'b': 125.0, 'delta': 5.0})
+        self.assertEqual(data['changed'][1]['Type'], {'a': 'Valve', 'b': 'Compressor'})
+        self.assertEqual(data['changed'][2]['Pressure'], {'a': 5.0, 'b': 6.0, 'delta': 1.0})
+        self.assertEqual(data['added'], [{'Equipment Name': 'Heater-1', 'Type': 'HeatExchanger',
+                                          'Flowrate': 80.0, 'Pressure': 2.0, 'Temperature': 300.0}])
+        self.assertEqual([row['Equipment Name'] for row in data['removed']], ['Mixer-1'])
+        self.assertEqual(data['summary']['total_count'], {'a': 5, 'b': 5, 'delta': 0})
+        self.assertAlmostEqual(data['summary']['average_flowrate']['delta'], 105.4 - 90.4)
+        self.assertEqual(data['type_distribution']['Pump'], {
+            'a': 3, 'b': 3, 'delta': 0, 'share_a': 0.6, 'share_b': 0.6, 'share_delta': 0.0})
+        self.assertEqual(data['type_distribution']['Mixer']['delta'], -1)
+        self.assertEqual(list(data['type_distribution'])[0], 'Pump')
+
+        # Cached per pair: only the two dataset lookups hit the database
+        with CaptureQueriesContext(connection) as queries:
+            cached = self.client.get(f'/api/compare/?a={a}&b={b}')
+        self.assertEqual(cached.content, response.content)
+        self.assertEqual(len(queries), 2)
+
+        limited = self.client.get(f'/api/compare/?a={a}&b={b}&limit=1').json()
+        self.assertEqual((len(limited['changed']), limited['equipment']['changed']), (1, 3))
+        self.assertEqual(self.client.get(f'/api/compare/?a={a}').status_code, 400)
+        self.assertEqual(self.client.get(f'/api/compare/?a={a}&b=999').status_code, 400)
+
+    def test_generate_equipment_data_command(self):
+        path = os.path.join(self.media_root, 'generated.csv')
+        out = io.StringIO()
+        call_command('generate_equipment_data', path, rows=3_000, nan_rate=0.05, load='operator',
+                     title='generated', stdout=out)
+        self.assertIn('Ingested', out.getvalue())
+        dataset = DataCSV.objects.ready().get(user=self.user, title='generated')
+        self.assertEqual(dataset.total_count, 3_000)
+        self.assertEqual(EquipmentRow.objects.filter(dataset=dataset).count(), 3_000)
+
+        with self.assertRaises(CommandError):
+            call_command('generate_equipment_data', path, rows=10, load='operator', title='generated', stdout=out)
+        with self.assertRaises(CommandError):
+            call_command('generate_equipment_data', path, rows=10, metric=['Flowrate=poisson:1:2'], stdout=out)
+
+        call_command('generate_equipment_data', path, rows=10, load='operator', title='queued', queue=True,
+                     stdout=out)
+        self.assertEqual(process_next_job().dataset.title, 'queued')
+
+    def upload_plant(self, title, seed):
+        path = os.path.join(self.media_root, f'{title}.csv')
+        write_equipment_csv(path, 200, seed=seed)
+        with open(path) as f:
+            self.upload(title=title, content=f.read())
+        return process_next_job().dataset_id
+
+    def test_equipment_query_across_datasets(self):
+        ids = [self.upload_plant('north', 0), self.upload_plant('south', 1)]
+        rows = list(EquipmentRow.objects.filter(dataset_id__in=ids, type='Compressor', pressure__gt=8))
+        expected = [row.id for row in sorted(rows, key=lambda row: (-row.pressure, -row.id))]
+
+        response = self.client.get('/api/equipment/?type=Compressor&pressure__gt=8&sort=-pressure&limit=5')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('db;dur=', response['Server-Timing'])
+        top = response.data['results']
+        self.assertEqual([row['id'] for row in top], expected[:5])
+        self.assertLessEqual({row['dataset'] for row in top}, set(ids))
+        self.assertEqual(set(top[0]) - {'id', 'dataset'}, set(EquipmentRow.CSV_COLUMNS.values()))
+
+        # Following next pages through every match once, in order
+        seen, url = [], '/api/equipment/?type=Compressor&pressure__gt=8&sort=-pressure&limit=5'
+        while url:
+            page = self.client.get(url).data
+            seen += [row['id'] for row in page['results']]
+            url = page['next']
+        self.assertEqual(seen, expected)
+
+        response = self.client.get(f'/api/equipment/?name=Valve-1&datasets={ids[0]}&limit=1000')
+        names = [row['Equipment Name'] for row in response.data['results']]
+        self.assertEqual(names, list(EquipmentRow.objects.filter(dataset_id=ids[0], name__startswith='Valve-1')
+                                     .order_by('id').values_list('name', flat=True)))
+        self.assertTrue(names and all(name.startswith('Valve-1') for name in names))
+
+        for params, field in [('sort=name', 'sort'), ('pressure__gt=high', 'pressure__gt'),
+                              ('cursor=nope', 'cursor'), ('limit=0', 'limit'), ('datasets=999', 'datasets')]:
+            response = self.client.get(f'/api/equipment/?{params}')
+            self.assertEqual(response.status_code, 400)
+            self.assertIn(field, response.data)
+
+    def test_equipment_queries_use_indexes(self):
+        dataset_id = self.upload_plant('north', 0)
+        indexes = {tuple(index.fields): index.name for index in EquipmentRow._meta.indexes}
+        for query, index in [
+            (EquipmentQuery([dataset_id], types=['Pump'], ranges={('pressure', 'gt'): 7}, sort='-pressure'),
+             ('dataset', 'pressure')),
+            (EquipmentQuery([dataset_id], sort='temperature', cursor=(100.0, 1)), ('dataset', 'temperature')),
+            (EquipmentQuery([dataset_id], types=['Pump']), ('dataset', 'type')),
+            (EquipmentQuery([dataset_id], name_prefix='Pump-1'), ('dataset', 'name')),
+        ]:
+            self.assertIn(indexes[index], query.queryset(dataset_id).explain())
+
+    @override_settings(EQUIPMENT_QUERY_BUDGET_MS=0)
+    def test_equipment_query_budget(self):
+        self.upload_plant('north', 0)
+        response = self.client.get('/api/equipment/?sort=-flowrate')
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('budget', response.data['detail'])
+
+        # Work already running is cancelled once the budget is spent
+        budget = QueryBudget(50)
+
+        def count_forever():
+            with connection.cursor() as cursor:
+                cursor.execute("WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n) "
+                               "SELECT count(*) FROM n")
+                return cursor.fetchone()
+
+        with self.assertRaises(QueryBudgetExceeded):
+            budget.run(count_forever)
+        self.assertLess(budget.elapsed_ms, 5_000)
+
+    def test_distribution_endpoints(self):
+        first = self.upload_rows(100, title='first')
+        self.upload(title='second', content=SAMPLE_CSV)
+        second = process_next_job().dataset_id
+
+        response = self.client.get(f'/api/csv/{first}/distribution/?metric=Flowrate&q=0,0.5,1')
+        self.assertEqual(response.status_code, 200)
+        flowrate = response.data['metrics']['Flowrate']
+        self.assertEqual(flowrate['count'], 100)
+        self.assertEqual(flowrate['quantiles'], {'0.0': 0.0, '0.5': 49.5, '1.0': 99.0})
+        self.assertEqual(sum(flowrate['histogram']['counts']), 100)
+
+        # Merged across datasets from the stored sketches alone
+        with CaptureQueriesContext(connection) as queries:
+            merged = self.client.get(f'/api/distribution/?datasets={first},{second}')
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(merged.data['datasets'], [first, second])
+        pressure = merged.data['metrics']['Pressure']
+        self.assertEqual(pressure['count'], 103)
+        self.assertEqual(pressure['nulls'], 1)
+        self.assertEqual(pressure['max'], 8.4)
+        self.assertEqual(self.client.get('/api/distribution/').data['metrics'], merged.data['metrics'])
+
+        self.assertEqual(self.client.get('/api/distribution/?datasets=999').status_code, 400)
+        self.assertEqual(self.client.get(f'/api/csv/{first}/distribution/?q=2').status_code, 400)
+
+    def test_duplicate_content_reuses_file_stats_and_rows(self):
+        self.upload(title='original')
+        original = process_next_job().dataset
+        files_before = sorted(os.listdir(os.path.dirname(original.csv_file.path)))
+
+        response = self.upload(title='copy')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['status'], IngestJob.STATUS_DONE)
+        self.assertIsNone(process_next_job())
+
+        copy = DataCSV.objects.get(pk=response.data['dataset'])
+        self.assertEqual(copy.content_hash, original.content_hash)
+        self.assertEqual(copy.csv_file.name, original.csv_file.name)
+        self.assertEqual(sorted(os.listdir(os.path.dirname(original.csv_file.path))), files_before)
+        for name in DataCSV.STATS_FIELDS:
+            self.assertEqual(getattr(copy, name), getattr(original, name))
+        self.assertEqual(list(EquipmentRow.values(copy.rows.all()).values_list('name', 'pressure')),
+                         list(EquipmentRow.values(original.rows.all()).values_list('name', 'pressure')))
+
+        # The shared file outlives either dataset alone
+        self.client.delete(f'/api/delete-csv/{original.pk}/')
+        self.assertTrue(os.path.isfile(copy.csv_file.path))
+        self.assertEqual(self.client.get(f'/api/csv/{copy.pk}/series/').status_code, 200)
+        self.client.delete(f'/api/delete-csv/{copy.pk}/')
+        self.assertFalse(os.path.exists(copy.csv_file.path))
+        self.assertFalse(os.path.exists(sidecar_path(copy.csv_file.path)))
+
+    def test_duplicate_found_by_worker_drops_its_file(self):
+        self.upload(title='first')
+        self.upload(title='second')
+        process_next_job()
+        job = process_next_job()
+        self.assertEqual(job.status, IngestJob.STATUS_DONE)
+        self.assertEqual(job.csv_file.name, job.dataset.csv_file.name)
+        self.assertEqual(len(os.listdir(os.path.dirname(job.dataset.csv_file.path))), 2)  # CSV + columns
+
+    def test_fetch_conditional_get(self):
+        self.upload()
+        dataset_id = process_next_job().dataset_id
+        url = f'/api/csv/{dataset_id}/'
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.assertIn('private', response['Cache-Control'])
+
+        with CaptureQueriesContext(connection) as queries:
+            cached = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached['ETag'], etag)
+        self.assertEqual(cached.content, b'')
+        # Only the validator lookup: no stats columns, no rows
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('equipment_type_distribution', queries[0]['sql'])
+
+        modified = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(modified.status_code, 304)
+
+        # Another representation of the same dataset has its own ETag
+        projected = self.client.get(url + '?fields=title', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(projected.status_code, 200)
+        self.assertNotEqual(projected['ETag'], etag)
+
+        # Recomputed stats are a new version even when the file is the same
+        listed = self.client.get('/api/last5-csv/')
+        call_command('recompute_stats', dataset_id, stdout=io.StringIO())
+        recomputed = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(recomputed.status_code, 200)
+        self.assertNotEqual(recomputed['ETag'], etag)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=recomputed['ETag']).status_code, 304)
+        self.assertEqual(self.client.get('/api/last5-csv/', HTTP_IF_NONE_MATCH=listed['ETag']).status_code, 200)
+
+    def test_responses_compressed_per_accept_encoding(self):
+        dataset_id = self.upload_rows(200)
+        url = f'/api/csv/{dataset_id}/'
+        plain = self.client.get(url)
+        self.assertNotIn('Content-Encoding', plain)
+
+        decoders = {'gzip': gzip.decompress, 'br': brotli.decompress,
+                    'zstd': lambda data: zstandard.ZstdDecompressor().decompressobj().decompress(data)}
+        for encoding, decode in decoders.items():
+            response = self.client.get(url, HTTP_ACCEPT_ENCODING=encoding)
+            self.assertEqual(response['Content-Encoding'], encoding)
+            self.assertIn('Accept-Encoding', response['Vary'])
+            self.assertEqual(response['ETag'], 'W/' + plain['ETag'])
+            self.assertEqual(decode(response.content), plain.content)
+
+        # Weak and strong ETags of the same dataset both revalidate
+        revalidated = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(revalidated.status_code, 304)
+
+    @override_settings(PRECOMPRESS_MIN_ROWS=100)
+    def test_full_response_precompressed_at_ingest(self):
+        small = self.upload_rows(50, title='small')
+        dataset_id = self.upload_rows(300)
+        dataset = DataCSV.objects.get(pk=dataset_id)
+        self.assertFalse(os.path.exists(precompressed_path(small, dataset.uploaded_at, 'br')))
+        stored = precompressed_path(dataset_id, dataset.uploaded_at, 'br')
+        self.assertTrue(os.path.exists(stored))
+
+        url = f'/api/csv/{dataset_id}/'
+        plain = self.client.get(url)
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip;q=0.5, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(response['ETag'], 'W/' + plain['ETag'])
+        body = b''.join(response.streaming_content)
+        self.assertEqual(body, open(stored, 'rb').read())
+        # Byte for byte what the view renders itself
+        self.assertEqual(brotli.decompress(body), plain.content)
+
+        # Only the full response is stored; pages are compressed per request
+        page = self.client.get(url + '?limit=10', HTTP_ACCEPT_ENCODING='br')
+        self.assertFalse(page.streaming)
+
+        self.client.delete(f'/api/delete-csv/{dataset_id}/')
+        self.assertFalse(os.path.exists(stored))
+
+    @override_settings(PRECOMPRESS_MIN_ROWS=100)
+    def test_copies_precompressed_by_worker(self):
+        lines = [f"Pump-{i},Pump,{i},1.5,90" for i in range(300)]
+        content = "Equipment Name,Type,Flowrate,Pressure,Temperature\n" + "\n".join(lines) + "\n"
+        self.upload_rows(300, title='source')
+        copy = DataCSV.objects.get(pk=self.upload_rows(300, title='copy'))
+        response = self.bulk_upload([('bulk-copy.csv', content)])
+        bulk_copy = DataCSV.objects.get(pk=response.data['results'][0]['dataset'])
+
+        # Deduplicated on the request, which leaves compressing them to the worker
+        stored = [precompressed_path(dataset.pk, dataset.uploaded_at, 'br') for dataset in (copy, bulk_copy)]
+        self.assertFalse(any(os.path.exists(path) for path in stored))
+        run_worker(drain=True)
+        self.assertTrue(all(os.path.exists(path) for path in stored))
+        self.assertFalse(DataCSV.objects.filter(precompressed=False).exists())
+
+        response = self.client.get(f'/api/csv/{copy.pk}/', HTTP_ACCEPT_ENCODING='br')
+        self.assertEqual(brotli.decompress(b''.join(response.streaming_content)),
+                         self.client.get(f'/api/csv/{copy.pk}/').content)
+
+    @override_settings(PRECOMPRESS_MIN_ROWS=100)
+    async def test_async_views_under_asgi(self):
+        client = AsyncClient()
+        # Per request: AsyncClient(headers=...) does not reach ASGIRequest.META
+        auth = {'Authorization': f"Bearer {AccessToken.for_user(self.user)}"}
+        lines = [f"Pump-{i},Pump,{i},1.5,90" for i in range(300)]
+        content = "Equipment Name,Type,Flowrate,Pressure,Temperature\n" + "\n".join(lines) + "\n"
+        csv_file = SimpleUploadedFile('big.csv', content.encode(), content_type='text/csv')
+        response = await client.post('/api/upload-csv/', {'title': 'big', 'csv_file': csv_file}, headers=auth)
+        self.assertEqual(response.status_code, 202)
+        dataset_id = (await sync_to_async(process_next_job)()).dataset_id
+
+        listed = await client.get('/api/last5-csv/?fields=id,title', headers=auth)
+        self.assertEqual(listed.json(), [{'id': dataset_id, 'title': 'big'}])
+        revalidated = await client.get('/api/last5-csv/?fields=id,title',
+                                       headers={**auth, 'If-None-Match': listed['ETag']})
+        self.assertEqual(revalidated.status_code, 304)
+
+        url = f'/api/csv/{dataset_id}/'
+        plain = await client.get(url, headers=auth)
+        self.assertEqual(len(plain.json()['equipment_list']), 300)
+        # The stored response is read in blocks off the event loop, not loaded whole
+        response = await client.get(url, headers={**auth, 'Accept-Encoding': 'br'})
+        self.assertTrue(response.is_async)
+        self.assertEqual(response['Content-Encoding'], 'br')
+        body = b''.join([chunk async for chunk in response.streaming_content])
+        self.assertEqual(int(response['Content-Length']), len(body))
+        self.assertEqual(brotli.decompress(body), plain.content)
+
+    def test_responses_cached_until_invalidated(self):
+        dataset_id = self.upload_rows(30, title='a')
+        url = f'/api/csv/{dataset_id}/'
+        response_cache.reset_stats()
+
+        first = self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            second = self.client.get(url)
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second['ETag'], first['ETag'])
+        self.assertEqual(len(queries), 1)  # the ETag lookup only
+        self.assertEqual(response_cache.stats()['hits'], 1)
+        self.assertEqual(response_cache.stats()['misses'], 1)
+
+        listed = self.client.get('/api/last5-csv/')
+        self.assertEqual(len(self.client.get('/api/last5-csv/').json()), 1)
+
+        # A finished upload invalidates the user's list, a delete the dataset and the list
+        self.upload_rows(5, title='b')
+        self.assertEqual(len(self.client.get('/api/last5-csv/').json()), 2)
+        self.client.delete(f'/api/delete-csv/{dataset_id}/')
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual([item['title'] for item in self.client.get('/api/last5-csv/').json()], ['b'])
+        self.assertNotEqual(self.client.get('/api/last5-csv/').content, listed.content)
+
+    def test_cache_stats_admin_only(self):
+        self.assertEqual(self.client.get('/api/cache/stats/').status_code, 403)
+        self.user.is_staff = True
+        self.user.save()
+        stats = self.client.get('/api/cache/stats/').data
+        self.assertLessEqual({'hits', 'misses', 'hit_rate', 'bytes', 'max_bytes'}, set(stats))
+
+    def test_list_conditional_get(self):
+        self.upload_rows(3, title='a')
+        response = self.client.get('/api/last5-csv/')
+        etag = response['ETag']
+        self.assertEqual(self.client.get('/api/last5-csv/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.upload_rows(4, title='b')
+        changed = self.client.get('/api/last5-csv/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(len(changed.data), 2)
+
+        # Deleting a dataset leaves the newest upload time alone, so
+        # If-Modified-Since on its own never turns into a 304 for the list
+        self.client.delete(f"/api/delete-csv/{changed.data[1]['id']}/")
+        after_delete = self.client.get('/api/last5-csv/', HTTP_IF_MODIFIED_SINCE=changed['Last-Modified'])
+        self.assertEqual(after_delete.status_code, 200)
+        self.assertEqual(len(after_delete.data), 1)
+
+    def bulk_upload(self, files=(), archive=None):
+        data = {'csv_files': [SimpleUploadedFile(name, content.encode(), content_type='text/csv')
+                              for name, content in files]}
+        if archive is not None:
+            data['archive'] = SimpleUploadedFile('shift.zip', archive, content_type='application/zip')
+        return self.client.post('/api/upload-csv/bulk/', data, format='multipart')
+
+    def test_bulk_upload_results_per_file(self):
+        self.upload(title='taken.csv')
+        process_next_job()
+        other = SAMPLE_CSV + "Pump-3,Pump,140,5,120\n"
+        response = self.bulk_upload([
+            ('a.csv', SAMPLE_CSV),
+            ('taken.csv', other),
+            ('bad.csv', "Equipment Name,Flowrate\nPump-1,1\n"),
+            ('b.csv', other),
+            ('a-again.csv', SAMPLE_CSV),
+            ('notes.txt', 'hello'),
+        ])
+        self.assertEqual(response.status_code, 200)
+        results = {result['file']: result for result in response.data['results']}
+        self.assertEqual(list(results), ['a.csv', 'taken.csv', 'bad.csv', 'b.csv', 'a-again.csv', 'notes.txt'])
+        self.assertEqual(results['taken.csv']['error'], "You already have a file with this title.")
+        self.assertIn("Missing required column(s): Type", results['bad.csv']['error'])
+        self.assertEqual(results['notes.txt']['status'], IngestJob.STATUS_FAILED)
+
+        b = DataCSV.objects.get(pk=results['b.csv']['dataset'])
+        self.assertEqual((b.title, b.total_count, b.rows.count()), ('b.csv', 5, 5))
+        # Same content as the first dataset and a.csv: the file and rows are shared, not parsed again
+        a, again = (DataCSV.objects.get(pk=results[name]['dataset']) for name in ('a.csv', 'a-again.csv'))
+        self.assertEqual(again.csv_file.name, a.csv_file.name)
+        self.assertEqual(again.rows.count(), 4)
+        self.assertEqual(again.type_stats, a.type_stats)
+        self.assertEqual(sorted(os.listdir(os.path.dirname(b.csv_file.path))),
+                         sorted([os.path.basename(b.csv_file.path), os.path.basename(b.csv_file.path) + '.columns',
+                                 os.path.basename(a.csv_file.path), os.path.basename(a.csv_file.path) + '.columns']))
+
+    def test_bulk_upload_requires_files(self):
+        self.assertEqual(self.bulk_upload().status_code, 400)
+        self.assertEqual(self.bulk_upload(archive=b'not a zip').status_code, 400)
+
+    @override_settings(BULK_UPLOAD_PROCESSES=2)
+    def test_bulk_zip_parsed_in_process_pool_with_one_retention_pass(self):
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w') as archive:
+            archive.writestr('shift/', '')
+            archive.writestr('__MACOSX/shift/._a.csv', 'junk')
+            for i in range(7):
+                lines = [f"Pump-{j},Pump,{i * 10 + j},1.5,90" for j in range(i + 1)]
+                archive.writestr(f'shift/unit-{i}.csv', "Equipment Name,Type,Flowrate,Pressure,Temperature\n"
+                                                        + "\n".join(lines) + "\n")
+        response = self.bulk_upload(archive=buffer.getvalue())
+        self.assertEqual(response.status_code, 200)
+
+        results = response.data['results']
+        self.assertEqual([result['file'] for result in results], [f'unit-{i}.csv' for i in range(7)])
+        self.assertTrue(all(result['status'] == IngestJob.STATUS_DONE for result in results))
+        # Retention ran once for the batch: its newest five are kept
+        self.assertEqual([result['retained'] for result in results], [False] * 2 + [True] * 5)
+        kept = DataCSV.objects.filter(user=self.user)
+        self.assertEqual(sorted(kept.values_list('title', flat=True)), [f'unit-{i}.csv' for i in range(2, 7)])
+        unit = kept.get(title='unit-6.csv')
+        self.assertEqual((unit.total_count, unit.rows.count()), (7, 7))
+        self.assertAlmostEqual(unit.average_flowrate, 63.0)
+        self.assertTrue(ColumnarDataset.exists(sidecar_path(unit.csv_file.path)))
+
+        # Later batches reuse the process's pool instead of starting their own
+        pool = bulk._pool
+        self.assertIsNotNone(pool)
+        files = [('late-0.csv', SAMPLE_CSV), ('late-1.csv', SAMPLE_CSV.replace('120', '121'))]
+        response = self.bulk_upload(files=files)
+        self.assertEqual([result['status'] for result in response.data['results']], [IngestJob.STATUS_DONE] * 2)
+        self.assertIs(bulk._pool, pool)
+
+    def put_chunk(self, session, index, data, checksum=None):
+        return self.client.generic('PUT', f"/api/uploads/{session['id']}/chunks/{index}/", data,
+                                   content_type='application/octet-stream',
+                                   HTTP_X_CHUNK_SHA256=checksum or hashlib.sha256(data).hexdigest())
+
+    @override_settings(UPLOAD_CHUNK_SIZE=1000, CSV_INGEST_CHUNK_SIZE=7)
+    def test_chunked_upload_parsed_as_chunks_arrive(self):
+        path = os.path.join(self.media_root, 'plant.csv')
+        write_equipment_csv(path, 300)
+        with open(path, 'rb') as f:
+            content = f.read()
+
+        response = self.client.post('/api/uploads/', {'title': 'plant.csv', 'size': len(content)})
+        self.assertEqual(response.status_code, 201)
+        session = response.data
+        chunks = [content[i:i + 1000] for i in range(0, len(content), 1000)]
+        self.assertEqual((session['chunk_size'], session['chunk_count']), (1000, len(chunks)))
+        # The title is taken while the upload is in progress, but nothing is listed yet
+        self.assertEqual(self.upload(title='plant.csv').status_code, 400)
+        self.assertEqual(self.client.get('/api/last5-csv/').data, [])
+
+        self.assertEqual(self.put_chunk(session, 1, chunks[1], checksum='0' * 64).status_code, 400)
+        self.assertEqual(self.put_chunk(session, 1, chunks[1][:-1]).status_code, 400)
+        for index in [3, 1]:
+            self.assertEqual(self.put_chunk(session, index, chunks[index]).status_code, 200)
+        status_response = self.client.get(f"/api/uploads/{session['id']}/")
+        self.assertEqual(status_response.data['received'], [[1000, 2000], [3000, 4000]])
+        self.assertEqual(status_response.data['parsed_bytes'], 0)
+
+        # Chunk 0 makes 0:2000 contiguous: everything up to its last full line is parsed
+        response = self.put_chunk(session, 0, chunks[0])
+        self.assertEqual(response.data['received'], [[0, 2000], [3000, 4000]])
+        self.assertEqual(response.data['parsed_bytes'], content.rindex(b'\n', 0, 2000) + 1)
+        dataset = DataCSV.objects.get(title='plant.csv')
+        self.assertEqual(dataset.rows.count(), content[:2000].count(b'\n') - 1)
+        self.assertEqual(self.client.post(f"/api/uploads/{session['id']}/finalize/").status_code, 400)
+
+        for index in range(len(chunks) - 1, 1, -1):
+            self.assertEqual(self.put_chunk(session, index, chunks[index]).status_code, 200)
+        # A resent chunk changes nothing
+        self.assertEqual(self.put_chunk(session, 0, chunks[0]).data['parsed_bytes'], len(content))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f"/api/uploads/{session['id']}/finalize/")
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNotNone(response.data['finished_at'])
+        self.assertEqual(self.client.post(f"/api/uploads/{session['id']}/finalize/").data, response.data)
+
+        dataset = DataCSV.objects.get(pk=response.data['dataset'])
+        expected = ingest_csv(path).fields()
+        self.assertEqual(dataset.total_count, 300)
+        self.assertEqual(dataset.rows.count(), 300)
+        self.assertAlmostEqual(dataset.average_pressure, expected['average_pressure'])
+        self.assertEqual(dataset.equipment_type_distribution, expected['equipment_type_distribution'])
+        self.assertEqual(dataset.content_hash, hashlib.sha256(content).hexdigest())
+        with open(dataset.csv_file.path, 'rb') as f:
+            self.assertEqual(f.read(), content)
+        columns = ColumnarDataset(sidecar_path(dataset.csv_file.path))
+        self.assertEqual(list(columns.names()), list(pd.read_csv(path)['Equipment Name']))
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, 'uploads', str(session['id']))))
+
+        fetched = self.client.get(f'/api/csv/{dataset.pk}/?limit=500')
+        self.assertEqual(len(fetched.data['equipment_list']), 300)
+
+    @override_settings(UPLOAD_CHUNK_SIZE=64)
+    def test_chunked_upload_with_invalid_csv_is_dropped(self):
+        content = b"Equipment Name,Flowrate,Pressure,Temperature\n" + b"Pump-1,1,2,3\n" * 20
+        session = self.client.post('/api/uploads/', {'title': 'bad.csv', 'size': len(content)}).data
+        response = self.put_chunk(session, 0, content[:64])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("Missing required column(s): Type", response.data['detail'])
+        self.assertEqual(self.client.get(f"/api/uploads/{session['id']}/").status_code, 404)
+        self.assertFalse(DataCSV.objects.exists())
+        self.assertEqual(os.listdir(os.path.join(self.media_root, 'csv_files', str(self.user.pk))), [])
+
+        # An abandoned upload frees its title
+        session = self.client.post('/api/uploads/', {'title': 'bad.csv', 'size': 10}).data
+        self.assertEqual(self.client.delete(f"/api/uploads/{session['id']}/").status_code, 204)
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertEqual(self.client.post('/api/uploads/', {'title': 'bad.csv', 'size': 10}).status_code, 201)
+
+    @override_settings(CSV_VALIDATE_ROWS=2)
+    def test_failed_job_leaves_no_dataset(self):
+        # The bad row is past the block checked at upload
+        self.assertEqual(self.upload(content=SAMPLE_CSV + 'Bad,Row,1,2,3,4,5\n').status_code, 202)
+        job = process_next_job()
+        self.assertEqual(job.status, IngestJob.STATUS_FAILED)
+        self.assertTrue(job.error.startswith("Invalid CSV file"))
+        self.assertFalse(DataCSV.objects.exists())
+        self.assertFalse(EquipmentRow.objects.exists())
+
+    def test_invalid_csv_rejected_at_upload(self):
+        for content, error in [
+            ('\n\n', "Invalid CSV file"),
+            ("Equipment Name,Flowrate,Pressure,Temperature\nPump-1,1,2,3\n", "Missing required column(s): Type"),
+            (SAMPLE_CSV + "Pump-3,Pump,fast,2,3\n", "fast"),
+        ]:
+            response = self.upload(content=content)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn(error, str(response.data['csv_file']))
+        self.assertFalse(IngestJob.objects.exists())
+
+    def test_duplicate_title_rejected_while_queued(self):
+        self.assertEqual(self.upload().status_code, 202)
+        self.assertEqual(self.upload().status_code, 400)
+
+    def test_keeps_last_five_datasets(self):
+        for i in range(6):
+            self.upload(title=f'plant-{i}')
+            process_next_job()
+        titles = set(DataCSV.objects.values_list('title', flat=True))
+        self.assertEqual(titles, {f'plant-{i}' for i in range(1, 6)})
+
+    @override_settings(PRECOMPRESS_MIN_ROWS=1)
+    def test_evicted_files_removed_by_worker(self):
+        first = DataCSV.objects.get(pk=self.upload_rows(1, title='plant-0'))
+        for i in range(1, 5):
+            self.upload_rows(i + 1, title=f'plant-{i}')
+        self.upload_rows(1, title='copy')  # Same content: shares plant-0's file
+
+        # plant-0 went with the upload that made six; its files are only queued
+        self.assertFalse(DataCSV.objects.filter(pk=first.pk).exists())
+        self.assertEqual(DataCSV.objects.filter(user=self.user).count(), 5)
+        stored = precompressed_path(first.pk, first.uploaded_at, 'br')
+        self.assertTrue(os.path.exists(stored))
+        self.assertTrue(FileCleanup.objects.exists())
+
+        self.assertEqual(purge_files(batch_size=2), 2)
+        run_worker(drain=True)
+        self.assertFalse(FileCleanup.objects.exists())
+        self.assertFalse(os.path.exists(stored))
+        # The CSV is still used by the deduplicated copy
+        self.assertTrue(os.path.isfile(first.csv_file.path))
+        self.assertTrue(ColumnarDataset.exists(sidecar_path(first.csv_file.path)))
+
+    def test_job_claimed_once(self):
+        self.upload()
+        self.assertIsNotNone(claim_next_job())
+        self.assertIsNone(claim_next_job())
+
+    def test_job_status_is_private(self):
+        job_id = self.upload().data['job_id']
+        other = APIClient()
+        other.force_authenticate(User.objects.create_user(username='other', password='secret-pass'))
+        self.assertEqual(other.get(f'/api/jobs/{job_id}/').status_code, 404)
+
+
+class ThreadedIngestTests(TransactionTestCase):
+    """
+    Ingest work on other threads, each with its own connection: parallel
+    uploads, eager parsing on the offload pool and the background purge and
+    precompression.
+    """
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.user = User.objects.create_user(username='operator', password='secret-pass')
+
+    def queue_job(self, title, seed):
+        path = os.path.join(self.media_root, f'{title}.csv')
+        write_equipment_csv(path, 50, seed=seed)
+        with open(path, 'rb') as f:
+            return IngestJob.objects.create(user=self.user, title=title, csv_file=SimpleUploadedFile(title, f.read()))
+
+    def test_parallel_uploads_keep_last_five(self):
+        jobs = [self.queue_job(f'plant-{i}.csv', i) for i in range(8)]
+        start = threading.Barrier(len(jobs))
+
+        def ingest(job):
+            try:
+                start.wait()
+                run_job(job)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=ingest, args=(job,)) for job in jobs]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        jobs = list(IngestJob.objects.order_by('pk'))
+        self.assertEqual([job.error for job in jobs], [''] * len(jobs))
+        self.assertEqual(DataCSV.objects.ready().filter(user=self.user).count(), 5)
+        # Evicted datasets left their jobs without one; every evicted CSV is queued for removal
+        evicted = {job.csv_file.name for job in jobs if job.dataset_id is None}
+        self.assertEqual(len(evicted), 3)
+        self.assertLessEqual(evicted, set(FileCleanup.objects.values_list('path', flat=True)))
+
+    @override_settings(CSV_INGEST_EAGER=True)
+    def test_eager_mode(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        csv_file = SimpleUploadedFile('plant.csv', SAMPLE_CSV.encode(), content_type='text/csv')
+        response = client.post('/api/upload-csv/', {'title': 'plant', 'csv_file': csv_file}, format='multipart')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['status'], IngestJob.STATUS_DONE)
+        self.assertEqual(DataCSV.objects.get(pk=response.data['dataset']).total_count, 4)
+
+    @override_settings(CSV_INGEST_EAGER=True, PRECOMPRESS_MIN_ROWS=1)
+    def test_eager_mode_precompresses_without_worker(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        csv_file = SimpleUploadedFile('unit.csv', SAMPLE_CSV.encode(), content_type='text/csv')
+        response = client.post('/api/upload-csv/bulk/', {'csv_files': [csv_file]}, format='multipart')
+        dataset = DataCSV.objects.get(pk=response.data['results'][0]['dataset'])
+        for thread in threading.enumerate():
+            if thread.name == 'precompress':
+                thread.join()
+
+        self.assertTrue(DataCSV.objects.get(pk=dataset.pk).precompressed)
+        self.assertTrue(os.path.exists(precompressed_path(dataset.pk, dataset.uploaded_at, 'br')))
+
+    @override_settings(CSV_INGEST_EAGER=True)
+    def test_eager_mode_purges_without_worker(self):
+        first = self.queue_job('plant-0.csv', 0)
+        run_job(first)
+        path = os.path.join(self.media_root, first.csv_file.name)
+        for i in range(1, 6):
+            run_job(self.queue_job(f'plant-{i}.csv', i))
+        for thread in threading.enumerate():
+            if thread.name == 'purge-files':
+                thread.join()
+
+        self.assertEqual(DataCSV.objects.filter(user=self.user).count(), 5)
+        self.assertFalse(FileCleanup.objects.exists())
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(os.path.exists(sidecar_path(path)))
@@ -0,0 +1,301 @@
+"""
+Resumable uploads of large CSVs in numbered chunks.
+
+A multi-gigabyte file sent as one multipart POST is lost entirely if the
+connection drops, and Django spools the whole body to a temporary file before
+the view runs. An UploadSession instead takes the file in pieces:
+
+    POST   /api/uploads/                    {title, size} -> session id, chunk_size
+    PUT    /api/uploads/<id>/chunks/<n>/    raw bytes of chunk n, X-Chunk-SHA256 header
+    GET    /api/uploads/<id>/               received byte ranges, bytes parsed so far
+    POST   /api/uploads/<id>/finalize/      -> dataset
+    DELETE /api/uploads/<id>/               abandon the upload
+
+Chunks may arrive in any order and be sent again; each is checked against its
+SHA-256 and written straight into the dataset's CSV file at
+``n * chunk_size``. Whenever the data received from the start of the file
+grows, its complete lines are parsed like any other ingest: rows are saved,
+the columnar copy is appended and the SummaryAccumulator updated. The
+accumulator and the columnar writer are pickled between requests, to a state
+file named after the parsed offset, so a request that fails half-way leaves
+the previous state in place. Finalize only has to rank the metrics, hash the
+file and save the stats.
+
+Lines are split at newlines, so quoted values must not contain line breaks.
+"""
+import hashlib
+import io
+import os
+import pickle
+import shutil
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import IntegrityError, transaction
+from django.utils.timezone import now
+
+from .columnar import ColumnarDataset, ColumnarWriter, sidecar_path
+from .ingest import (CSV_ERRORS, EquipmentRowWriter, SummaryAccumulator, dataset_fields, ingest_chunks,
+                     iter_csv_chunks, validate_csv)
+from .models import DataCSV, IngestJob, UploadChunk, UploadSession
+from .responses import precompress_later
+from .worker import apply_retention, lock_rows
+
+# Bytes read at a time when looking back for the last complete line
+SCAN_BLOCK_SIZE = 64 * 1024
+
+
+class UploadError(Exception):
+    """A request the client has to correct; the message is shown to the user."""
+
+
+class _Segment(io.RawIOBase):
+    """Bytes ``start:stop`` of the file at ``path`` after ``prefix``, read as one file."""
+
+    def __init__(self, path, start, stop, prefix=b''):
+        self.file = open(path, 'rb')
+        self.start = start
+        self.prefix = prefix
+        self.size = len(prefix) + stop - start
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self.position, io.SEEK_END: self.size}[whence]
+        self.position = max(base + offset, 0)
+        return self.position
+
+    def tell(self):
+        return self.position
+
+    def readinto(self, buffer):
+        view = memoryview(buffer).cast('B')
+        n = min(len(view), self.size - self.position)
+        if n <= 0:
+            return 0
+        if self.position < len(self.prefix):
+            n = min(n, len(self.prefix) - self.position)
+            view[:n] = self.prefix[self.position:self.position + n]
+        else:
+            self.file.seek(self.start + self.position - len(self.prefix))
+            n = self.file.readinto(view[:n])
+        self.position += n
+        return n
+
+    def close(self):
+        if not self.closed:
+            self.file.close()
+        super().close()
+
+
+class UploadState:
+    """What parsing the received data has built so far; pickled between requests."""
+
+    def __init__(self, columns):
+        self.header = None
+        self.summary = SummaryAccumulator()
+        self.columns = columns
+
+
+def _work_dir(session_id):
+    return os.path.join(settings.MEDIA_ROOT, 'uploads', str(session_id))
+
+
+def _state_path(session_id, parsed_bytes):
+    return os.path.join(_work_dir(session_id), f"state-{parsed_bytes}.pkl")
+
+
+def _save_state(session, state, parsed_bytes):
+    path = _state_path(session.pk, parsed_bytes)
+    with open(path + '.tmp', 'wb') as f:
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(path + '.tmp', path)
+
+
+def _load_state(session):
+    # Unpickling reopens the columnar files, cut back to what this state recorded
+    with open(_state_path(session.pk, session.parsed_bytes), 'rb') as f:
+        return pickle.load(f)
+
+
+def _prune_states(session_id, keep):
+    for name in os.listdir(_work_dir(session_id)):
+        if name.startswith('state-') and name != os.path.basename(_state_path(session_id, keep)):
+            os.remove(os.path.join(_work_dir(session_id), name))
+
+
+def remove_work_dir(session_id):
+    shutil.rmtree(_work_dir(session_id), ignore_errors=True)
+
+
+def expire_sessions():
+    """Drop unfinished uploads idle for longer than ``settings.UPLOAD_SESSION_EXPIRY``."""
+    idle_since = now() - timedelta(seconds=settings.UPLOAD_SESSION_EXPIRY)
+    for session in UploadSession.objects.filter(finished_at__isnull=True, updated_at__lt=idle_since):
+        discard_upload(session)
+
+
+def start_upload(user, title, size):
+    """Open a session for a ``size``-byte CSV titled ``title``, reserving the title."""
+    expire_sessions()
+    pending = IngestJob.objects.filter(
+        user=user, title=title,
+        status__in=[IngestJob.STATUS_PENDING, IngestJob.STATUS_RUNNING],
+    )
+    if DataCSV.objects.filter(user=user, title=title).exists() or pending.exists():
+        raise UploadError("You already have a file with this title.")
+
+    dataset = DataCSV(user=user, title=title)
+    dataset.csv_file.save(title if title.endswith('.csv') else f"{title}.csv", ContentFile(b''), save=False)
+    try:
+        with transaction.atomic():
+            dataset.save()
+            session = UploadSession.objects.create(user=user, dataset=dataset, size=size,
+                                                   chunk_size=settings.UPLOAD_CHUNK_SIZE)
+    except IntegrityError:
+        dataset.csv_file.delete(save=False)
+        raise UploadError("You already have a file with this title.")
+
+    os.makedirs(_work_dir(session.pk))
+    columns = ColumnarWriter(sidecar_path(dataset.csv_file.path),
+                             tmp_path=os.path.join(_work_dir(session.pk), 'columns'))
+    _save_state(session, UploadState(columns), 0)
+    columns.suspend()
+    return session
+
+
+def _last_line_end(path, start, stop):
+    """Offset just past the last newline in ``start:stop`` of the file, or ``start``."""
+    with open(path, 'rb') as f:
+        end = stop
+        while end > start:
+            begin = max(start, end - SCAN_BLOCK_SIZE)
+            f.seek(begin)
+            newline = f.read(end - begin).rfind(b'\n')
+            if newline >= 0:
+                return begin + newline + 1
+            end = begin
+    return start
+
+
+def _advance(session):
+    """Parse the complete lines received since ``session.parsed_bytes``."""
+    ranges = session.received_ranges()
+    received = ranges[0][1] if ranges and ranges[0][0] == 0 else 0
+    path = session.dataset.csv_file.path
+    stop = received if received == session.size else _last_line_end(path, session.parsed_bytes, received)
+    if stop <= session.parsed_bytes:
+        return
+
+    state = _load_state(session)
+    try:
+        first = state.header is None
+        if first:
+            with open(path, 'rb') as f:
+                state.header = f.readline()
+        # Later segments are parsed as their own CSV under the file's header
+        prefix = b'' if first else state.header
+        with io.BufferedReader(_Segment(path, session.parsed_bytes, stop, prefix)) as segment:
+            if first:
+                validate_csv(segment)
+            ingest_chunks(iter_csv_chunks(segment), on_rows=[EquipmentRowWriter(session.dataset), state.columns],
+                          summary=state.summary)
+        _save_state(session, state, stop)
+    finally:
+        state.columns.suspend()
+
+    session.parsed_bytes = stop
+    session.save(update_fields=['parsed_bytes', 'updated_at'])
+    transaction.on_commit(lambda: _prune_states(session.pk, stop))
+
+
+def receive_chunk(session, index, data, checksum):
+    """
+    Store chunk ``index`` of ``session`` if ``data`` matches ``checksum``
+    (SHA-256, hex) and parse whatever it completes. Sending a chunk again is
+    a no-op. A parse error ends the session and removes its dataset.
+    """
+    if not 0 <= index < session.chunk_count:
+        raise UploadError(f"Chunk index must be between 0 and {session.chunk_count - 1}.")
+    start, stop = session.chunk_bounds(index)
+    if len(data) != stop - start:
+        raise UploadError(f"Chunk {index} must be {stop - start} bytes, got {len(data)}.")
+    digest = hashlib.sha256(data).hexdigest()
+    if checksum.lower() != digest:
+        raise UploadError(f"Chunk {index} does not match its checksum; send it again.")
+
+    try:
+        with transaction.atomic():
+            # One request at a time writes and parses a session
+            lock_rows(UploadSession.objects.filter(pk=session.pk))
+            session = UploadSession.objects.select_related('dataset').get(pk=session.pk)
+            if session.finished_at is not None:
+                raise UploadError("This upload is already finalized.")
+            received = UploadChunk.objects.filter(session=session, index=index).first()
+            if received is not None:
+                if received.sha256 != digest:
+                    raise UploadError(f"Chunk {index} was already received with different content.")
+                return session
+
+            with open(session.dataset.csv_file.path, 'r+b') as f:
+                f.seek(start)
+                f.write(data)
+            UploadChunk.objects.create(session=session, index=index, sha256=digest)
+            _advance(session)
+    except CSV_ERRORS as e:
+        discard_upload(session)
+        raise UploadError(f"Invalid CSV file: {e}") from e
+    return session
+
+
+def _file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while block := f.read(1024 * 1024):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def finalize_upload(session):
+    """
+    Save the stats of a fully received upload and return its dataset.
+    Finalizing again returns the same dataset.
+    """
+    with transaction.atomic():
+        lock_rows(UploadSession.objects.filter(pk=session.pk))
+        session = UploadSession.objects.select_related('dataset').get(pk=session.pk)
+        dataset = session.dataset
+        if session.finished_at is not None:
+            return dataset
+        missing = session.chunk_count - session.chunks.count()
+        if missing:
+            raise UploadError(f"{missing} chunk(s) have not been received yet.")
+
+        state = _load_state(session)
+        state.columns.close()
+        fields = dataset_fields(state.summary, ColumnarDataset(state.columns.path))
+        for name, value in fields.items():
+            setattr(dataset, name, value)
+        dataset.content_hash = _file_hash(dataset.csv_file.path)
+        # Retention orders by upload time: the dataset counts from when it became complete
+        dataset.uploaded_at = now()
+        dataset.save()
+        session.finished_at = now()
+        session.save(update_fields=['finished_at', 'updated_at'])
+        apply_retention(session.user)
+        transaction.on_commit(lambda: remove_work_dir(session.pk))
+        precompress_later()
+    return dataset
+
+
+def discard_upload(session):
+    """Remove an unfinished upload: its dataset, rows, file and parse state."""
+    # Deleting the dataset cascades to the session, whose post_delete removes the state
+    for dataset in DataCSV.objects.filter(pk=session.dataset_id):
+        dataset.delete()
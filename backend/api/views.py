@@ -1,23 +1,239 @@
 from rest_framework import generics, permissions
-from .serializers import DataCSVSerializer, UserSerializer
-from .models import DataCSV
+from .serializers import DataCSVSerializer, IngestJobSerializer, UploadSessionSerializer, UserSerializer
+from .models import DataCSV, EquipmentRow, IngestJob, UploadSession
 from rest_framework.response import Response
 from rest_framework import status 
 from django.contrib.auth.models import User
-import pandas as pd
 from rest_framework.parsers import MultiPartParser, FormParser
+from django.http import Http404, HttpResponse
+from rest_framework.exceptions import ValidationError
+from django.conf import settings
+import numpy as np
+from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from rest_framework.utils.urls import replace_query_param
+import hashlib
+import zipfile
+from asgiref.sync import sync_to_async
+from contextlib import ExitStack
+from .asyncviews import AsyncAPIViewMixin, file_response, offload
+from .bulk import aingest_batch, archive_members
+from .cache import dataset_scope, response_cache, user_scope
+from .compare import SUMMARY_STATS, compare_datasets
+from .downsample import METHODS, density
+from .ingest import CSV_ERRORS, METRIC_COLUMNS, content_hash, load_columns, validate_csv
+from .pagination import EquipmentRowCursorPagination, EquipmentRowWindowPagination
+from .query import (METRIC_FIELDS, RANGE_LOOKUPS, SORT_FIELDS, EquipmentQuery, QueryBudget, QueryBudgetExceeded,
+                    decode_cursor)
+from .renderers import dumps
+from .responses import SUMMARY_FIELDS, open_precompressed
+import orjson
+from .sketches import merge_sketches
+from .uploads import UploadError, discard_upload, finalize_upload, receive_chunk, start_upload
+from .worker import find_duplicate, run_job
+
+class FieldProjectionMixin:
+    """
+    ``?fields=a,b`` limits a response to those fields. The projection is
+    pushed down into the ORM with ``.only()``, so columns that were not asked
+    for are never read or decoded.
+    """
+    # API field -> DataCSV column, or None for fields not stored on DataCSV
+    projectable_fields = {}
+    # Columns the view needs whatever the client asked for
+    required_columns = ['id']
+
+    def get_requested_fields(self):
+        raw = self.request.query_params.get('fields')
+        if not raw:
+            return None
+        fields = [name.strip() for name in raw.split(',') if name.strip()]
+        unknown = [name for name in fields if name not in self.projectable_fields]
+        if unknown:
+            raise ValidationError({
+                "fields": f"Unknown field(s): {', '.join(unknown)}. "
+                          f"Choose from: {', '.join(self.projectable_fields)}."
+            })
+        return fields
+
+    def project(self, queryset):
+        fields = self.get_requested_fields()
+        if fields is None:
+            return queryset
+        columns = {self.projectable_fields[name] for name in fields} - {None}
+        return queryset.only(*self.required_columns, *columns)
+
+
+class ConditionalGetMixin(AsyncAPIViewMixin):
+    """
+    Strong ``ETag`` and ``Last-Modified`` validators for read-only async views.
+
+    ``get_validators`` answers from a narrow query (ids, save times and
+    content hashes), so a matching ``If-None-Match`` or ``If-Modified-Since``
+    gets a 304 before the payload is loaded. The ETag also covers the query
+    string and the negotiated media type, since those change the representation.
+    """
+    # Whether Last-Modified alone proves a response unchanged
+    last_modified_validates = True
+
+    async def get_validators(self):
+        """Return ``(etag parts, last modified datetime)``, or None to skip validation."""
+        raise NotImplementedError
+
+    async def build_response(self, request, *args, **kwargs):
+        """The response with the payload, built with the async ORM."""
+        raise NotImplementedError
+
+    async def get(self, request, *args, **kwargs):
+        validators = await self.get_validators()
+        if validators is None:
+            return await self.build_response(request, *args, **kwargs)
+
+        parts, modified = validators
+        representation = (parts, sorted(request.query_params.lists()), request.accepted_media_type)
+        etag = quote_etag(hashlib.sha256(repr(representation).encode()).hexdigest())
+        last_modified = int(modified.timestamp()) if modified else None
+
+        response = get_conditional_response(
+            request, etag=etag,
+            last_modified=last_modified if self.last_modified_validates else None,
+        )
+        if response is None:
+            response = await self.respond(request, etag, *args, **kwargs)
+        if 200 <= response.status_code < 300 or response.status_code == 304:
+            # An encoded body is a different representation, as in GZipMiddleware
+            response['ETag'] = 'W/' + etag if response.has_header('Content-Encoding') else etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+            # Private to the user, and always revalidated
+            patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    async def respond(self, request, etag, *args, **kwargs):
+        """The full response, for requests that were not answered with a 304."""
+        return await self.build_response(request, *args, **kwargs)
+
+
+class CachedResponseMixin(ConditionalGetMixin):
+    """
+    Keeps the rendered bytes of JSON responses in the response cache
+    (api/cache.py), keyed by ``get_cache_scope()`` and the ETag. The ETag in
+    the key means a stale entry can never be served, even when an
+    invalidation happened in another process with its own locmem cache.
+    """
+    cache_key = None
+
+    def get_cache_scope(self):
+        raise NotImplementedError
+
+    def lookup(self, etag):
+        key = response_cache.key(self.get_cache_scope(), etag.strip('"'))
+        return key, response_cache.get(key)
+
+    async def respond(self, request, etag, *args, **kwargs):
+        # The browsable API embeds per-request details, so only JSON is cached
+        if request.accepted_renderer.format != 'json':
+            return await super().respond(request, etag, *args, **kwargs)
+        # A file-based cache reads from disk
+        key, cached = await sync_to_async(self.lookup)(etag)
+        if cached is not None:
+            content, content_type = cached
+            return HttpResponse(content, content_type=content_type)
+        self.cache_key = key
+        return await super().respond(request, etag, *args, **kwargs)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if self.cache_key and isinstance(response, Response) and response.status_code == 200:
+            response.render()
+            response_cache.set(self.cache_key, (response.content, response['Content-Type']))
+        return response
+
+
+def int_param(request, name, default, minimum, maximum):
+    value = request.query_params.get(name, default)
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise ValidationError({name: "Must be an integer."})
+    if not minimum <= value <= maximum:
+        raise ValidationError({name: f"Must be between {minimum} and {maximum}."})
+    return value
+
+
+def quantiles_param(request):
+    raw = request.query_params.get('q')
+    if not raw:
+        return list(settings.DISTRIBUTION_DEFAULT_QUANTILES)
+    try:
+        qs = [float(q) for q in raw.split(',') if q.strip()]
+    except ValueError:
+        raise ValidationError({"q": "Must be a comma-separated list of numbers."})
+    if not qs or not all(0 <= q <= 1 for q in qs):
+        raise ValidationError({"q": "Quantiles must be between 0 and 1."})
+    return qs
+
+
+def datasets_param(request, queryset):
+    """The datasets of ``queryset`` listed in ``?datasets=1,2``, or all of them."""
+    raw = request.query_params.get('datasets')
+    if not raw:
+        return list(queryset)
+    try:
+        ids = {int(pk) for pk in raw.split(',') if pk.strip()}
+    except ValueError:
+        raise ValidationError({"datasets": "Must be a comma-separated list of ids."})
+    datasets = list(queryset.filter(pk__in=ids))
+    missing = ids - {dataset.pk for dataset in datasets}
+    if missing:
+        raise ValidationError({"datasets": f"Unknown dataset(s): {', '.join(map(str, sorted(missing)))}."})
+    return datasets
+
+
+def metrics_param(request):
+    raw = request.query_params.get('metric')
+    if not raw:
+        return list(METRIC_COLUMNS)
+    metrics = [name.strip() for name in raw.split(',') if name.strip()]
+    if not metrics or any(name not in METRIC_COLUMNS for name in metrics):
+        raise ValidationError({"metric": f"Choose from: {', '.join(METRIC_COLUMNS)}."})
+    return metrics
+
 
 class CreateUserView(generics.CreateAPIView):
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = [permissions.AllowAny]
 
-class Last5CSVListView(generics.ListAPIView):
+class Last5CSVListView(CachedResponseMixin, FieldProjectionMixin, generics.ListAPIView):
     serializer_class = DataCSVSerializer
     permission_classes = [permissions.IsAuthenticated]
+    projectable_fields = {name: name for name in DataCSVSerializer.Meta.fields}
+    # Deleting a dataset changes the list without a newer upload time
+    last_modified_validates = False
 
     def get_queryset(self):
-        return DataCSV.objects.filter(user=self.request.user).order_by('-uploaded_at')[:5]
+        queryset = (DataCSV.objects.ready().filter(user=self.request.user)
+                    .defer('metric_sketches').order_by('-uploaded_at'))
+        return self.project(queryset)[:5]
+
+    async def get_validators(self):
+        self.get_requested_fields()  # unknown fields are a 400, not a 304
+        parts = [row async for row in DataCSV.objects.ready().filter(user=self.request.user)
+                 .order_by('-uploaded_at').values_list('id', 'updated_at', 'content_hash')[:5]]
+        return parts, max((updated_at for _, updated_at, _ in parts), default=None)
+
+    async def build_response(self, request, *args, **kwargs):
+        datasets = [dataset async for dataset in self.filter_queryset(self.get_queryset())]
+        return Response(self.get_serializer(datasets, many=True).data)
+
+    def get_cache_scope(self):
+        return user_scope(self.request.user.id)
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs.setdefault('fields', self.get_requested_fields())
+        return super().get_serializer(*args, **kwargs)
 
 class CSVDeleteView(generics.DestroyAPIView):
     queryset = DataCSV.objects.all()
@@ -35,96 +251,510 @@ class CSVDeleteView(generics.DestroyAPIView):
             {"detail": "CSV file deleted successfully."}, 
             status=status.HTTP_204_NO_CONTENT
         )
-class CSVFetchView(generics.RetrieveAPIView):
+class CSVFetchView(CachedResponseMixin, FieldProjectionMixin, generics.RetrieveAPIView):
     serializer_class = DataCSVSerializer
     permission_classes = [permissions.IsAuthenticated]
+    summary_fields = SUMMARY_FIELDS
+    projectable_fields = {**{name: name for name in summary_fields}, 'equipment_list': None}
+    required_columns = ['id', 'user']
 
     def get_queryset(self):
-        return DataCSV.objects.filter(user=self.request.user)
+        return self.project(DataCSV.objects.ready().filter(user=self.request.user).defer('metric_sketches'))
 
-    def retrieve(self, request, *args, **kwargs):
-        instance = self.get_object()
+    async def get_validators(self):
+        self.get_requested_fields()
+        # Recomputing stats saves the dataset again, so the last save time is part of the version
+        row = await (DataCSV.objects.ready().filter(user=self.request.user, pk=self.kwargs['pk'])
+                     .values_list('id', 'uploaded_at', 'updated_at', 'content_hash').afirst())
+        if row is None:
+            return None
+        self.validated_row = row
+        return row, row[2]
 
-        if instance.user != request.user:
+    def get_cache_scope(self):
+        return dataset_scope(self.kwargs['pk'])
+
+    async def respond(self, request, etag, *args, **kwargs):
+        # The full JSON response may have been compressed at ingest (api/responses.py)
+        if not request.query_params and request.accepted_renderer.format == 'json':
+            dataset_id, uploaded_at, _, _ = self.validated_row
+            stored = await offload(open_precompressed, dataset_id, uploaded_at,
+                                   request.headers.get('Accept-Encoding'))
+            if stored is not None:
+                body, encoding = stored
+                response = file_response(request, body, request.accepted_renderer.media_type)
+                response['Content-Encoding'] = encoding
+                patch_vary_headers(response, ('Accept-Encoding',))
+                return response
+        return await super().respond(request, etag, *args, **kwargs)
+
+    async def build_response(self, request, *args, **kwargs):
+        try:
+            instance = await self.get_queryset().aget(pk=self.kwargs['pk'])
+        except DataCSV.DoesNotExist:
+            raise Http404
+        self.check_object_permissions(request, instance)
+
+        if instance.user_id != request.user.id:
             return Response(
                 {"detail": "You do not have permission to access this file."}, 
                 status=status.HTTP_403_FORBIDDEN
             )
 
-        # equipment_list is already stored in JSONField
-        return Response({
-            "id": instance.id,
-            "title": instance.title,
-            "total_count": instance.total_count,
-            "average_flowrate": instance.average_flowrate,
-            "average_pressure": instance.average_pressure,
-            "average_temperature": instance.average_temperature,
-            "equipment_type_distribution": instance.equipment_type_distribution,
-            "equipment_list": instance.equipment_list,  # full equipment rows
-            "uploaded_at": instance.uploaded_at,
-        }, status=status.HTTP_200_OK)
-
-class CSVUploadView(generics.CreateAPIView):
+        fields = self.get_requested_fields() or list(self.projectable_fields)
+        data = {name: getattr(instance, name) for name in self.summary_fields if name in fields}
+        if 'equipment_list' not in fields:
+            return Response(data, status=status.HTTP_200_OK)
+
+        # Rows live in EquipmentRow. Without paging parameters the full list is
+        # returned; ?cursor=&limit= or ?offset=&limit= return one page and
+        # ?limit=0 only the summary.
+        rows = EquipmentRow.values(instance.rows.all())
+        params = request.query_params
+        if params.get('limit') == '0':
+            data["equipment_list"] = []
+        elif 'cursor' in params or 'limit' in params or 'offset' in params:
+            if 'offset' in params:
+                paginator = EquipmentRowWindowPagination(count=instance.total_count)
+            else:
+                paginator = EquipmentRowCursorPagination()
+            page = await sync_to_async(paginator.paginate_queryset)(rows, request, view=self)
+            data["equipment_list"] = [EquipmentRow.to_record(row) for row in page]
+            data["next"] = paginator.get_next_link()
+            data["previous"] = paginator.get_previous_link()
+        else:
+            data["equipment_list"] = [EquipmentRow.to_record(row) async for row in
+                                      rows.aiterator(chunk_size=settings.EQUIPMENT_ROW_BATCH_SIZE)]
+
+        return Response(data, status=status.HTTP_200_OK)
+
+class CSVUploadView(AsyncAPIViewMixin, generics.CreateAPIView):
     serializer_class = DataCSVSerializer
     permission_classes = [permissions.IsAuthenticated]
     parser_classes = [MultiPartParser, FormParser]
 
-    def post(self, request, *args, **kwargs):
+    async def post(self, request, *args, **kwargs):
         user = request.user
-        serializer = self.get_serializer(data=request.data)
-        serializer.is_valid(raise_exception=True)
+        # Parsing the multipart body writes large files to disk
+        data = await offload(lambda: request.data)
+        serializer = self.get_serializer(data=data)
+        await sync_to_async(serializer.is_valid)(raise_exception=True)
 
         # Check if user already has a CSV with this title
         title = serializer.validated_data['title']
-        if DataCSV.objects.filter(user=user, title=title).exists():
+        pending = IngestJob.objects.filter(
+            user=user, title=title,
+            status__in=[IngestJob.STATUS_PENDING, IngestJob.STATUS_RUNNING],
+        )
+        if await DataCSV.objects.filter(user=user, title=title).aexists() or await pending.aexists():
             return Response(
                 {"detail": "You already have a file with this title."},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # Enforce last 5 datasets only
-        user_csv_count = DataCSV.objects.filter(user=user).count()
-        if user_csv_count >= 5:
-            oldest_csv = DataCSV.objects.filter(user=user).order_by('uploaded_at').first()
-            oldest_csv.delete()
-
+        # Refuse files that do not match the schema before storing anything
         csv_file = serializer.validated_data['csv_file']
+        try:
+            await offload(validate_csv, csv_file)
+        except CSV_ERRORS as e:
+            raise ValidationError({"csv_file": f"Invalid CSV file: {e}"})
 
-        # Read CSV and compute stats
+        # Store the file and queue it; parsing happens in an ingest worker.
+        # A file the user already uploaded is not stored again: the job points
+        # at the existing copy and is finished right away without parsing.
+        digest = await offload(content_hash, csv_file)
+        duplicate = await sync_to_async(find_duplicate)(user, digest)
+        job = await IngestJob.objects.acreate(
+            user=user,
+            title=title,
+            csv_file=duplicate.csv_file.name if duplicate else csv_file,
+            content_hash=digest,
+            bytes_total=csv_file.size,
+        )
+        if duplicate is not None:
+            # Copies the rows in the database; nothing to parse
+            await sync_to_async(run_job)(job)
+        elif settings.CSV_INGEST_EAGER:
+            # A whole parse: on a pool thread, not the thread the async views share for queries
+            job = await offload(run_job, job)
+
+        status_url = reverse('job-status', kwargs={'pk': job.pk})
+        return Response({
+            "job_id": job.id,
+            "status": job.status,
+            "dataset": job.dataset_id,
+            "status_url": status_url,
+        }, status=status.HTTP_202_ACCEPTED, headers={"Location": status_url})
+
+
+class CSVBulkUploadView(AsyncAPIViewMixin, generics.GenericAPIView):
+    """
+    /api/upload-csv/bulk/
+
+    Many CSVs at once, as repeated ``csv_files`` parts and/or a zip in
+    ``archive``. Each file's name is its title. The files are parsed in
+    parallel and saved together (api/bulk.py); the response lists one
+    result per file, in upload order.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    parser_classes = [MultiPartParser, FormParser]
+
+    async def post(self, request, *args, **kwargs):
+        uploads = await offload(lambda: request.FILES)
+        with ExitStack() as stack:
+            files = [(upload.name, upload) for upload in uploads.getlist('csv_files')]
+            if 'archive' in uploads:
+                try:
+                    archive = stack.enter_context(zipfile.ZipFile(uploads['archive']))
+                except zipfile.BadZipFile:
+                    raise ValidationError({"archive": "Not a zip file."})
+                files += list(archive_members(archive))
+
+            if not files:
+                raise ValidationError({"csv_files": "Upload CSV files or a zip archive of them."})
+            if len(files) > settings.BULK_UPLOAD_MAX_FILES:
+                raise ValidationError(
+                    {"csv_files": f"At most {settings.BULK_UPLOAD_MAX_FILES} files can be uploaded at once."})
+
+            results = await aingest_batch(request.user, files)
+        return Response({"results": results}, status=status.HTTP_200_OK)
+
+
+class UploadSessionCreateView(generics.CreateAPIView):
+    """
+    /api/uploads/
+
+    Starts a resumable upload of a ``size``-byte CSV titled ``title``. The
+    response gives the session id and the ``chunk_size`` to send it in; see
+    api/uploads.py for the protocol.
+    """
+    serializer_class = UploadSessionSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
         try:
-            df = pd.read_csv(csv_file)
-        except Exception as e:
-            return Response({"detail": f"Invalid CSV file: {str(e)}"}, status=400)
+            session = start_upload(request.user, serializer.validated_data['dataset']['title'],
+                                   serializer.validated_data['size'])
+        except UploadError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-        total_count = len(df)
-        avg_flowrate = df['Flowrate'].mean() if 'Flowrate' in df.columns else 0
-        avg_pressure = df['Pressure'].mean() if 'Pressure' in df.columns else 0
-        avg_temperature = df['Temperature'].mean() if 'Temperature' in df.columns else 0
+        session_url = reverse('upload-session', kwargs={'pk': session.pk})
+        return Response(self.get_serializer(session).data, status=status.HTTP_201_CREATED,
+                        headers={"Location": session_url})
 
-        equipment_type_distribution = df['Type'].value_counts().to_dict() if 'Type' in df.columns else {}
 
-        equipment_list = []
-        if all(col in df.columns for col in ['Equipment Name', 'Type', 'Flowrate', 'Pressure', 'Temperature']):
-            equipment_list = df.to_dict(orient='records')
+class UploadSessionMixin:
+    serializer_class = UploadSessionSerializer
+    permission_classes = [permissions.IsAuthenticated]
 
-        # Save CSV entry
-        data_csv = serializer.save(
-            user=user,
-            total_count=total_count,
-            average_flowrate=avg_flowrate,
-            average_pressure=avg_pressure,
-            average_temperature=avg_temperature,
-            equipment_type_distribution=equipment_type_distribution,
-            equipment_list=equipment_list
-        )
+    def get_queryset(self):
+        return UploadSession.objects.filter(user=self.request.user).select_related('dataset')
+
+
+class UploadSessionView(UploadSessionMixin, generics.RetrieveDestroyAPIView):
+    """/api/uploads/<id>/: the chunks received so far, or DELETE to abandon the upload."""
 
+    def perform_destroy(self, instance):
+        if instance.finished_at is not None:
+            raise ValidationError({"detail": "This upload is finished; delete its dataset instead."})
+        discard_upload(instance)
+
+
+class UploadChunkView(UploadSessionMixin, generics.GenericAPIView):
+    """
+    /api/uploads/<id>/chunks/<index>/
+
+    PUT the raw bytes of one chunk with their SHA-256 (hex) in the
+    X-Chunk-SHA256 header. The body is read directly, bypassing the parsers.
+    """
+
+    def put(self, request, *args, **kwargs):
+        session = self.get_object()
+        checksum = request.headers.get('X-Chunk-SHA256')
+        if not checksum:
+            raise ValidationError({"detail": "The X-Chunk-SHA256 header is required."})
+
+        # At most one byte more than a chunk, enough to tell it is too long
+        data = bytearray()
+        limit = session.chunk_size + 1
+        while request.stream is not None and len(data) < limit:
+            block = request.stream.read(limit - len(data))
+            if not block:
+                break
+            data += block
+
+        try:
+            session = receive_chunk(session, kwargs['index'], bytes(data), checksum)
+        except UploadError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(self.get_serializer(session).data, status=status.HTTP_200_OK)
+
+
+class UploadFinalizeView(UploadSessionMixin, generics.GenericAPIView):
+    """/api/uploads/<id>/finalize/: save the stats once every chunk is in."""
+
+    def post(self, request, *args, **kwargs):
+        session = self.get_object()
+        try:
+            finalize_upload(session)
+        except UploadError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        session.refresh_from_db()
+        return Response(self.get_serializer(session).data, status=status.HTTP_200_OK)
+
+
+class IngestJobStatusView(generics.RetrieveAPIView):
+    serializer_class = IngestJobSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return IngestJob.objects.filter(user=self.request.user)
+
+
+class DatasetChartView(generics.GenericAPIView):
+    """
+    Base for chart endpoints that read a dataset's columnar copy. Datasets
+    never change after upload, so results are cached per dataset and request,
+    already encoded: the renderer embeds the cached bytes as a fragment.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return DataCSV.objects.ready().filter(user=self.request.user).only('id', 'user', 'csv_file', 'uploaded_at')
+
+    def cached(self, dataset, key, compute):
+        key = response_cache.key(dataset_scope(dataset.pk), dataset.uploaded_at.timestamp(), 'chart', key)
+        result = response_cache.get(key)
+        if result is None:
+            result = dumps(compute(load_columns(dataset)))
+            response_cache.set(key, result)
+        return orjson.Fragment(result)
+
+
+class CSVSeriesView(DatasetChartView):
+    """
+    /api/csv/<id>/series/?metric=Flowrate&points=2000&method=lttb
+
+    One metric against row position, downsampled to at most ``points`` rows
+    with LTTB (default) or min-max decimation.
+    """
+
+    def get(self, request, *args, **kwargs):
+        dataset = self.get_object()
+        metric = request.query_params.get('metric', 'Flowrate')
+        if metric not in METRIC_COLUMNS:
+            raise ValidationError({"metric": f"Choose from: {', '.join(METRIC_COLUMNS)}."})
+        method = request.query_params.get('method', 'lttb')
+        if method not in METHODS:
+            raise ValidationError({"method": f"Choose from: {', '.join(METHODS)}."})
+        points = int_param(request, 'points', settings.CHART_DEFAULT_POINTS, 3, settings.CHART_MAX_POINTS)
+
+        def compute(columns):
+            values = columns.metric(metric)
+            index = METHODS[method](values, points)
+            return {
+                "id": dataset.pk,
+                "metric": metric,
+                "method": method,
+                "total_count": columns.rows,
+                "points": len(index),
+                "x": index,
+                "y": np.asarray(values[index]),
+                "labels": columns.names_at(index).tolist(),
+            }
+
+        return Response(self.cached(dataset, f"series:{metric}:{method}:{points}", compute))
+
+
+class CSVDensityView(DatasetChartView):
+    """
+    /api/csv/<id>/density/?bins=50
+
+    2D binned row counts for every pair of metrics, for scatter plots that
+    would otherwise need one point per row.
+    """
+
+    def get(self, request, *args, **kwargs):
+        dataset = self.get_object()
+        bins = int_param(request, 'bins', settings.CHART_DEFAULT_BINS, 2, settings.CHART_MAX_BINS)
+
+        def compute(columns):
+            pairs = [
+                (x, y) for i, x in enumerate(METRIC_COLUMNS) for y in METRIC_COLUMNS[i + 1:]
+            ]
+            return {
+                "id": dataset.pk,
+                "bins": bins,
+                "pairs": [
+                    {"x": x, "y": y, **density(columns.metric(x), columns.metric(y), bins)}
+                    for x, y in pairs
+                ],
+            }
+
+        return Response(self.cached(dataset, f"density:{bins}", compute))
+
+
+class CompareView(DatasetChartView):
+    """
+    /api/compare/?a=<id>&b=<id>&limit=500
+
+    What changed from dataset ``a`` to dataset ``b``: per-equipment metric
+    deltas (matched on Equipment Name), added and removed equipment, type
+    distribution shifts and summary stat changes. Both datasets are
+    immutable, so the result is cached per pair.
+    """
+
+    def get_queryset(self):
+        return (DataCSV.objects.ready().filter(user=self.request.user)
+                .only('id', 'user', 'title', 'csv_file', 'uploaded_at', 'equipment_type_distribution',
+                      *SUMMARY_STATS))
+
+    def get_dataset(self, name):
+        raw = self.request.query_params.get(name)
+        try:
+            pk = int(raw)
+        except (TypeError, ValueError):
+            raise ValidationError({name: "Must be a dataset id."})
+        dataset = self.get_queryset().filter(pk=pk).first()
+        if dataset is None:
+            raise ValidationError({name: f"Unknown dataset: {pk}."})
+        return dataset
+
+    def get(self, request, *args, **kwargs):
+        a, b = self.get_dataset('a'), self.get_dataset('b')
+        limit = int_param(request, 'limit', settings.COMPARE_DEFAULT_LIMIT, 0, settings.COMPARE_MAX_LIMIT)
+        # Cached under a's scope; b's generation in the key drops the entry when b changes too
+        return Response(self.cached(
+            a, f"compare:{b.pk}:{response_cache.generation(dataset_scope(b.pk))}:{limit}",
+            lambda columns: compare_datasets(a, columns, b, load_columns(b), limit),
+        ))
+
+
+class DistributionView(generics.GenericAPIView):
+    """
+    /api/distribution/?datasets=1,2&metric=Flowrate&q=0.5,0.99
+
+    Percentiles, histogram and exact count/min/max/mean/std of each metric,
+    answered from the sketches stored at ingest; no rows are read. Sketches
+    of several datasets are merged, so the result describes their union.
+    Without ``datasets`` all of the user's datasets are combined.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return DataCSV.objects.ready().filter(user=self.request.user).only('id', 'metric_sketches')
+
+    def get_datasets(self):
+        return datasets_param(self.request, self.get_queryset())
+
+    def describe(self, datasets, metrics, qs):
+        result = {}
+        for metric in metrics:
+            sketch = merge_sketches(
+                dataset.metric_sketches[metric] for dataset in datasets
+                if dataset.metric_sketches and metric in dataset.metric_sketches
+            )
+            result[metric] = None if sketch is None else sketch.describe(qs)
+        return result
+
+    def get(self, request, *args, **kwargs):
+        metrics, qs = metrics_param(request), quantiles_param(request)
+        datasets = self.get_datasets()
+        return Response({
+            "datasets": sorted(dataset.pk for dataset in datasets),
+            "metrics": self.describe(datasets, metrics, qs),
+        })
+
+
+class CSVDistributionView(DistributionView):
+    """/api/csv/<id>/distribution/?metric=&q= for a single dataset."""
+
+    def get(self, request, *args, **kwargs):
+        metrics, qs = metrics_param(request), quantiles_param(request)
+        dataset = self.get_object()
         return Response({
-            "id": data_csv.id,
-            "title": data_csv.title,
-            "total_count": data_csv.total_count,
-            "average_flowrate": data_csv.average_flowrate,
-            "average_pressure": data_csv.average_pressure,
-            "average_temperature": data_csv.average_temperature,
-            "equipment_type_distribution": data_csv.equipment_type_distribution,
-            "equipment_list": data_csv.equipment_list,
-        }, status=status.HTTP_201_CREATED)
\ No newline at end of file
+            "id": dataset.pk,
+            "metrics": self.describe([dataset], metrics, qs),
+        })
+
+
+class EquipmentQueryView(generics.GenericAPIView):
+    """
+    /api/equipment/?type=Pump&pressure__gt=7&name=P-&sort=-pressure&limit=20&datasets=1,2
+
+    Equipment rows across the user's datasets (all of them without
+    ``datasets``), filtered by type (comma-separated, any of), metric ranges
+    (``<metric>__gt``, ``__gte``, ``__lt``, ``__lte``) and name prefix.
+    Sorted by ``sort``: ``id`` (upload order, the default) or a metric,
+    ``-`` first for descending; a metric sort leaves out rows without that
+    metric. The first page of a sort is its top ``limit``; ``next`` links to
+    the page after. See api/query.py.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return DataCSV.objects.ready().filter(user=self.request.user).only('id')
+
+    def get_query(self):
+        params = self.request.query_params
+        ranges = {}
+        for field in METRIC_FIELDS:
+            for lookup in RANGE_LOOKUPS:
+                name = f"{field}__{lookup}"
+                if name in params:
+                    try:
+                        ranges[field, lookup] = float(params[name])
+                    except ValueError:
+                        raise ValidationError({name: "Must be a number."})
+
+        sort = params.get('sort', 'id')
+        if sort.lstrip('-') not in SORT_FIELDS:
+            raise ValidationError({"sort": f"Choose from: {', '.join(SORT_FIELDS)}, optionally prefixed with -."})
+        cursor = None
+        if 'cursor' in params:
+            try:
+                cursor = decode_cursor(params['cursor'])
+            except ValueError as e:
+                raise ValidationError({"cursor": str(e)})
+
+        types = [kind.strip() for kind in params.get('type', '').split(',') if kind.strip()]
+        return EquipmentQuery(
+            [dataset.pk for dataset in datasets_param(self.request, self.get_queryset())],
+            types=types,
+            name_prefix=params.get('name') or None,
+            ranges=ranges,
+            sort=sort,
+            limit=int_param(self.request, 'limit', settings.EQUIPMENT_ROWS_PAGE_SIZE, 1,
+                            settings.EQUIPMENT_ROWS_MAX_PAGE_SIZE),
+            cursor=cursor,
+        )
+
+    def get(self, request, *args, **kwargs):
+        query = self.get_query()
+        budget = QueryBudget(settings.EQUIPMENT_QUERY_BUDGET_MS)
+        try:
+            rows, cursor = query.run(budget)
+        except QueryBudgetExceeded as e:
+            return Response({"detail": f"{e} Narrow the filters or lower the limit."},
+                            status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        next_url = None
+        if cursor is not None:
+            next_url = replace_query_param(request.build_absolute_uri(), 'cursor', cursor)
+        response = Response({
+            "results": [{"id": row['id'], "dataset": row['dataset_id'], **EquipmentRow.to_record(row)}
+                        for row in rows],
+            "next": next_url,
+        })
+        response['Server-Timing'] = f"db;dur={budget.elapsed_ms:.1f}"
+        return response
+
+
+class CacheStatsView(generics.GenericAPIView):
+    """Hit/miss counters (of the process serving the request) and size of the response cache, for sizing it."""
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return Response(response_cache.stats())
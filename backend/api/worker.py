@@ -0,0 +1,238 @@
+"""
+Database-backed ingest queue.
+
+CSVUploadView only stores the upload as an IngestJob; the pandas work runs
+here, in ``manage.py ingest_worker`` processes that poll the jobs table.
+No external broker is involved.
+"""
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connections, transaction
+from django.db.models import F, Q
+from django.utils.timezone import now
+
+from .cleanup import evict, purge_files
+from .columnar import ColumnarDataset, ColumnarWriter, sidecar_path
+from .ingest import CSV_ERRORS, EquipmentRowWriter, dataset_fields, ingest_csv, validate_csv
+from .models import DataCSV, EquipmentRow, IngestJob
+from .responses import precompress, precompress_later, precompress_next
+
+logger = logging.getLogger(__name__)
+
+MAX_DATASETS_PER_USER = 5
+
+
+class IngestError(Exception):
+    """A job that cannot produce a dataset; the message is shown to the user."""
+
+
+def claim_next_job():
+    """
+    Move the oldest pending job (or a running one whose worker stopped
+    reporting progress) to running and return it, or None if the queue is empty.
+
+    The claim is a conditional UPDATE, so two workers can never take the same
+    job even on databases without row locks.
+    """
+    stale_before = now() - timedelta(seconds=settings.CSV_INGEST_STALE_AFTER)
+    candidates = (
+        IngestJob.objects
+        .filter(Q(status=IngestJob.STATUS_PENDING) |
+                Q(status=IngestJob.STATUS_RUNNING, updated_at__lt=stale_before))
+        .order_by('created_at')
+        .values_list('pk', 'status', 'updated_at')[:10]
+    )
+    for pk, job_status, updated_at in candidates:
+        claimed_at = now()
+        claimed = IngestJob.objects.filter(pk=pk, status=job_status, updated_at=updated_at).update(
+            status=IngestJob.STATUS_RUNNING, started_at=claimed_at, updated_at=claimed_at
+        )
+        if claimed:
+            return IngestJob.objects.get(pk=pk)
+    return None
+
+
+def lock_rows(queryset):
+    """
+    Lock ``queryset``'s rows until the transaction ends; call it before the
+    transaction's first query. SQLite has no row locks and, in its default
+    deferred mode, only takes the database's write lock at the first write,
+    so a transaction that read first can fail with "database is locked"
+    instead of waiting for a concurrent one. There the rows are updated to
+    their own values, which takes the write lock at once.
+    """
+    if connections[queryset.db].features.has_select_for_update:
+        queryset.select_for_update().exists()
+    else:
+        pk = queryset.model._meta.pk.name
+        queryset.update(**{pk: F(pk)})
+
+
+def find_duplicate(user, content_hash):
+    """The user's most recent ingested dataset with this content, if any."""
+    if not content_hash:
+        return None
+    return (DataCSV.objects.ready()
+            .filter(user=user, content_hash=content_hash)
+            .order_by('-uploaded_at')
+            .first())
+
+
+def create_dataset(job, csv_file=None):
+    """
+    Check the title and create the job's dataset. Its stats stay empty (so
+    it is not yet ``ready``) until the rows are in.
+    """
+    with transaction.atomic():
+        lock_rows(User.objects.filter(pk=job.user_id))
+        if DataCSV.objects.filter(user=job.user, title=job.title).exists():
+            raise IngestError("You already have a file with this title.")
+
+        # The dataset takes over the file the job already stored
+        return DataCSV.objects.create(user=job.user, title=job.title, content_hash=job.content_hash,
+                                      csv_file=csv_file or job.csv_file.name)
+
+
+def apply_retention(user):
+    """
+    Enforce last 5 datasets only; uploads still in progress neither count nor go.
+
+    Call it in the transaction that makes a dataset ready. The user's row is
+    locked first, so concurrent uploads of one user are trimmed one after
+    the other and no commit leaves more than the limit. Evicted datasets'
+    files are queued for the worker rather than removed here.
+    """
+    with transaction.atomic():
+        # Held until the caller's transaction ends
+        lock_rows(User.objects.filter(pk=user.pk))
+        datasets = DataCSV.objects.ready().filter(user=user).order_by('-uploaded_at', '-pk')
+        for dataset in datasets[MAX_DATASETS_PER_USER:]:
+            evict(dataset)
+
+
+def copy_dataset(job, source):
+    """
+    Create the job's dataset from ``source``, an already ingested upload with
+    the same content: the file, stats and rows are reused instead of parsed.
+    """
+    with transaction.atomic():
+        dataset = create_dataset(job, csv_file=source.csv_file.name)
+        EquipmentRow.copy_rows(source, dataset)
+        for name in DataCSV.STATS_FIELDS:
+            setattr(dataset, name, getattr(source, name))
+        dataset.save(update_fields=[*DataCSV.STATS_FIELDS, 'updated_at'])
+        apply_retention(job.user)
+    return dataset
+
+
+def ingest_dataset(job):
+    """Parse the job's CSV into a new dataset with its rows and columnar copy."""
+    dataset = None
+    columns = None
+    try:
+        dataset = create_dataset(job)
+        columns = ColumnarWriter(sidecar_path(dataset.csv_file.path))
+        with job.csv_file.open('rb') as f:
+            def report_progress(summary):
+                IngestJob.objects.filter(pk=job.pk).update(
+                    rows_processed=summary.total_count,
+                    bytes_processed=f.tell(),
+                    updated_at=now(),
+                )
+
+            try:
+                validate_csv(f)
+                summary = ingest_csv(f, on_rows=[EquipmentRowWriter(dataset), columns],
+                                     on_progress=report_progress)
+            except CSV_ERRORS as e:
+                raise IngestError(f"Invalid CSV file: {str(e)}") from e
+
+        columns.close()
+        fields = dataset_fields(summary, ColumnarDataset(columns.path))
+        for name, value in fields.items():
+            setattr(dataset, name, value)
+        with transaction.atomic():
+            dataset.save(update_fields=[*fields, 'updated_at'])
+            apply_retention(job.user)
+    except Exception:
+        if columns is not None:
+            columns.abort()
+        if dataset is not None:
+            dataset.delete()
+        raise
+    return dataset
+
+
+def run_job(job):
+    """
+    Turn the job's CSV into a new DataCSV and record the outcome on the job.
+    Content already ingested for the user is copied rather than parsed again;
+    a copy is made on the upload request, so its stored responses are left
+    for later.
+    """
+    try:
+        source = find_duplicate(job.user, job.content_hash)
+        if source is not None:
+            dataset = copy_dataset(job, source)
+        else:
+            dataset = ingest_dataset(job)
+    except Exception as e:
+        if not isinstance(e, IngestError):
+            logger.exception("Ingest job %s failed", job.pk)
+        job.status = IngestJob.STATUS_FAILED
+        job.error = str(e)
+        job.finished_at = now()
+        job.save(update_fields=['status', 'error', 'finished_at', 'updated_at'])
+        if not DataCSV.file_in_use(job.csv_file.name):
+            job.csv_file.delete(save=False)
+        return job
+
+    if source is None:
+        precompress(dataset)
+    else:
+        precompress_later()
+
+    if job.csv_file.name != dataset.csv_file.name:
+        # A duplicate found by the worker: drop the job's own copy of the file
+        job.csv_file.delete(save=False)
+        job.csv_file = dataset.csv_file.name
+    job.status = IngestJob.STATUS_DONE
+    job.dataset = dataset
+    job.rows_processed = dataset.total_count
+    job.bytes_processed = job.bytes_total
+    job.finished_at = now()
+    job.save(update_fields=['status', 'dataset', 'csv_file', 'rows_processed', 'bytes_processed',
+                            'finished_at', 'updated_at'])
+    return job
+
+
+def process_next_job():
+    job = claim_next_job()
+    if job is None:
+        return None
+    return run_job(job)
+
+
+def run_worker(poll_interval=None, drain=False):
+    """
+    Process jobs until interrupted. With ``drain`` the loop exits as soon as
+    the queue is empty instead of polling for more work.
+    """
+    if poll_interval is None:
+        poll_interval = settings.CSV_INGEST_POLL_INTERVAL
+    while True:
+        job = process_next_job()
+        if job is not None:
+            logger.info("Ingest job %s finished with status %s", job.pk, job.status)
+        elif purge_files() or precompress_next() is not None:
+            # Files of evicted datasets are removed, and stored responses
+            # left for later written, while there is no job to run
+            continue
+        elif drain:
+            return
+        else:
+            time.sleep(poll_interval)
@@ -45,6 +45,8 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     "corsheaders.middleware.CorsMiddleware",
     'django.middleware.security.SecurityMiddleware',
+    # Where Django places GZipMiddleware: above anything that reads or changes the body
+    'api.compression.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -80,18 +82,136 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": os.environ.get("DJANGO_DB", BASE_DIR / "db.sqlite3"),
+        # The web server and the ingest workers write concurrently: wait for
+        # the write lock rather than fail. Transactions that write take it
+        # up front (api.worker.lock_rows); the rest stay deferred
+        "OPTIONS": {"timeout": 20},
+        # A file, so test threads get separate connections that wait for locks
+        # (an in-memory database shares one cache and fails on them instead)
+        "TEST": {"NAME": BASE_DIR / "test_db.sqlite3"},
     }
 }
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "api.authentication.CachedUserJWTAuthentication",
     ),
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticated",
     ],
+    "DEFAULT_RENDERER_CLASSES": [
+        "api.renderers.ORJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+}
+
+SIMPLE_JWT = {
+    # Tokens carry a hash of the password hash; changing the password revokes them
+    "CHECK_REVOKE_TOKEN": True,
+}
+# Authenticated users are read from a per-process cache (api/authentication.py):
+# seconds an entry is trusted, which bounds how long a deactivated user or a
+# revoked token is still accepted, and the number of users kept
+AUTH_USER_CACHE_TTL = int(os.environ.get("AUTH_USER_CACHE_TTL", 60))
+AUTH_USER_CACHE_SIZE = 1_024
+
+# CSV ingestion
+# Uploads are queued as IngestJob rows and parsed by `manage.py ingest_worker`.
+# Set CSV_INGEST_EAGER=1 to parse inside the upload request instead (no worker needed).
+CSV_INGEST_EAGER = os.environ.get("CSV_INGEST_EAGER", "0") == "1"
+CSV_INGEST_POLL_INTERVAL = float(os.environ.get("CSV_INGEST_POLL_INTERVAL", 1.0))
+# A running job with no progress for this many seconds is handed to another worker
+CSV_INGEST_STALE_AFTER = int(os.environ.get("CSV_INGEST_STALE_AFTER", 300))
+# Uploads are parsed in chunks of this many rows to keep worker memory bounded.
+CSV_INGEST_CHUNK_SIZE = int(os.environ.get("CSV_INGEST_CHUNK_SIZE", 50_000))
+# CSV parser: "pyarrow" (fastest, needs pyarrow), "c" (pandas' own), or "auto"
+# for pyarrow when it is installed and "c" otherwise.
+CSV_PARSE_ENGINE = os.environ.get("CSV_PARSE_ENGINE", "auto")
+# dtype of the metric columns: "float64", or "float32" for half the memory per value
+CSV_METRIC_DTYPE = os.environ.get("CSV_METRIC_DTYPE", "float64")
+# The header and this many rows are checked against the schema at upload
+CSV_VALIDATE_ROWS = 1_000
+# Bulk uploads (/api/upload-csv/bulk/): files per request, and processes
+# parsing them in parallel (default: one per core)
+BULK_UPLOAD_MAX_FILES = int(os.environ.get("BULK_UPLOAD_MAX_FILES", 100))
+BULK_UPLOAD_PROCESSES = int(os.environ.get("BULK_UPLOAD_PROCESSES", 0)) or None
+# Resumable uploads (/api/uploads/): bytes per chunk, and seconds an unfinished
+# session may sit idle before it is dropped with its partial dataset
+UPLOAD_CHUNK_SIZE = int(os.environ.get("UPLOAD_CHUNK_SIZE", 8 * 1024 * 1024))
+UPLOAD_SESSION_EXPIRY = int(os.environ.get("UPLOAD_SESSION_EXPIRY", 24 * 60 * 60))
+# Files of evicted datasets removed per pass of an idle ingest worker
+# (`manage.py ingest_worker --drain` also empties the queue)
+FILE_CLEANUP_BATCH_SIZE = int(os.environ.get("FILE_CLEANUP_BATCH_SIZE", 100))
+# Rows per INSERT when writing EquipmentRow objects
+EQUIPMENT_ROW_BATCH_SIZE = int(os.environ.get("EQUIPMENT_ROW_BATCH_SIZE", 5_000))
+
+# Async views (api/asyncviews.py): threads running their pandas and hashing
+# work, 0 for min(4, CPU count)
+ASYNC_OFFLOAD_THREADS = int(os.environ.get("ASYNC_OFFLOAD_THREADS", 0))
+
+# Dataset reads
+# Default and maximum number of rows per page on /api/csv/<id>/?cursor=&limit=
+EQUIPMENT_ROWS_PAGE_SIZE = 500
+EQUIPMENT_ROWS_MAX_PAGE_SIZE = 10_000
+# Chart endpoints (/api/csv/<id>/series/ and /density/)
+CHART_DEFAULT_POINTS = 2_000
+CHART_MAX_POINTS = 20_000
+CHART_DEFAULT_BINS = 50
+CHART_MAX_BINS = 500
+# Default and maximum rows per list (changed, added, removed) on /api/compare/
+COMPARE_DEFAULT_LIMIT = 500
+COMPARE_MAX_LIMIT = 50_000
+# Time budget of the database work behind one /api/equipment/ query; slower
+# queries are cancelled and answered with a 503
+EQUIPMENT_QUERY_BUDGET_MS = int(os.environ.get("EQUIPMENT_QUERY_BUDGET_MS", 2_000))
+# Fixed histogram bins (low, high, bins) of each metric's ingest-time sketch.
+# Values outside [low, high) land in the underflow/overflow counts. Changing
+# these only affects datasets ingested (or recomputed) afterwards, and only
+# sketches with identical bins can be merged.
+METRIC_HISTOGRAM_BINS = {
+    'Flowrate': (0.0, 500.0, 100),
+    'Pressure': (0.0, 25.0, 100),
+    'Temperature': (-50.0, 450.0, 100),
+}
+DISTRIBUTION_DEFAULT_QUANTILES = [0.05, 0.25, 0.5, 0.75, 0.95]
+
+# Response cache (api/cache.py)
+# Rendered dataset/last-5 responses and chart payloads, bounded in bytes with
+# LRU eviction. "locmem" is per process; use "file" (RESPONSE_CACHE_LOCATION is
+# then a directory) when several processes, e.g. the web server and the ingest
+# workers, must see each other's invalidations.
+RESPONSE_CACHE_ALIAS = "responses"
+RESPONSE_CACHE_TIMEOUT = int(os.environ.get("RESPONSE_CACHE_TIMEOUT", 60 * 60))
+RESPONSE_CACHE_BACKENDS = {
+    "locmem": "api.cache.ByteBoundedLocMemCache",
+    "file": "api.cache.ByteBoundedFileBasedCache",
+}
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    RESPONSE_CACHE_ALIAS: {
+        "BACKEND": RESPONSE_CACHE_BACKENDS[os.environ.get("RESPONSE_CACHE_BACKEND", "locmem")],
+        "LOCATION": os.environ.get("RESPONSE_CACHE_LOCATION", "dataset-responses"),
+        "TIMEOUT": RESPONSE_CACHE_TIMEOUT,
+        "OPTIONS": {
+            "MAX_BYTES": int(os.environ.get("RESPONSE_CACHE_MAX_BYTES", 64 * 1024 * 1024)),
+            "MAX_ENTRIES": int(os.environ.get("RESPONSE_CACHE_MAX_ENTRIES", 10_000)),
+        },
+    },
 }
 
+# Response compression (api/compression.py)
+# Responses of at least this many bytes are compressed with the best of
+# zstd, br and gzip the client accepts, at these levels.
+RESPONSE_COMPRESSION_MIN_BYTES = 1024
+RESPONSE_COMPRESSION_LEVELS = {"zstd": 3, "br": 4, "gzip": 6}
+# Full dataset responses (/api/csv/<id>/ without parameters) of at least
+# PRECOMPRESS_MIN_ROWS rows are compressed once at ingest with these
+# encodings and levels, and stored under MEDIA_ROOT/precompressed/ (api/responses.py).
+PRECOMPRESS_MIN_ROWS = int(os.environ.get("PRECOMPRESS_MIN_ROWS", 10_000))
+PRECOMPRESS_ENCODINGS = {"zstd": 12, "br": 8, "gzip": 9}
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -128,6 +248,10 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Uploaded CSVs live under MEDIA_ROOT/csv_files/; the API and the ingest
+# workers must share it.
+MEDIA_ROOT = os.environ.get("DJANGO_MEDIA_ROOT", BASE_DIR)
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -20,9 +20,22 @@ from django.urls import path, include
 from api.views import (
     CreateUserView,
     CSVUploadView,
+    CSVBulkUploadView,
     CSVDeleteView,
     Last5CSVListView,
-    CSVFetchView
+    CSVFetchView,
+    IngestJobStatusView,
+    UploadSessionCreateView,
+    UploadSessionView,
+    UploadChunkView,
+    UploadFinalizeView,
+    CSVSeriesView,
+    CSVDensityView,
+    CSVDistributionView,
+    CompareView,
+    EquipmentQueryView,
+    DistributionView,
+    CacheStatsView,
 )
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
@@ -42,12 +55,32 @@ urlpatterns = [
 
     # CSV Upload & Analytics
     path("api/upload-csv/", CSVUploadView.as_view(), name="upload-csv"),
+    path("api/upload-csv/bulk/", CSVBulkUploadView.as_view(), name="upload-csv-bulk"),
+    path("api/jobs/<int:pk>/", IngestJobStatusView.as_view(), name="job-status"),
+    # Resumable chunked uploads
+    path("api/uploads/", UploadSessionCreateView.as_view(), name="upload-sessions"),
+    path("api/uploads/<int:pk>/", UploadSessionView.as_view(), name="upload-session"),
+    path("api/uploads/<int:pk>/chunks/<int:index>/", UploadChunkView.as_view(), name="upload-chunk"),
+    path("api/uploads/<int:pk>/finalize/", UploadFinalizeView.as_view(), name="upload-finalize"),
 
     # CSV Delete
     path("api/delete-csv/<int:pk>/", CSVDeleteView.as_view(), name="delete-csv"),
 
     # CSV Load
     path('api/csv/<int:pk>/', CSVFetchView.as_view(), name='csv-fetch'),
+    # Downsampled chart data
+    path('api/csv/<int:pk>/series/', CSVSeriesView.as_view(), name='csv-series'),
+    path('api/csv/<int:pk>/density/', CSVDensityView.as_view(), name='csv-density'),
+    # Percentiles and histograms from the ingest-time sketches
+    path('api/csv/<int:pk>/distribution/', CSVDistributionView.as_view(), name='csv-distribution'),
+    path('api/distribution/', DistributionView.as_view(), name='distribution'),
+    # Changes between two datasets
+    path('api/compare/', CompareView.as_view(), name='compare'),
+    # Equipment rows filtered and sorted across datasets
+    path('api/equipment/', EquipmentQueryView.as_view(), name='equipment-query'),
     # Last 5 CSVs
     path("api/last5-csv/", Last5CSVListView.as_view(), name="last5-csv"),
+
+    # Response cache counters (admin only)
+    path("api/cache/stats/", CacheStatsView.as_view(), name="cache-stats"),
 ]
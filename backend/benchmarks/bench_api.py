@@ -0,0 +1,425 @@
+"""
+Throughput and tail latency of the upload, dataset and history endpoints.
+
+For each size, a generated equipment CSV (api/synthetic.py) is uploaded
+through POST /api/upload-csv/ and ingested. Then each endpoint is requested
+until --requests responses or --max-seconds have passed:
+
+    fetch       GET  /api/csv/<id>/              full response, identity
+    fetch_br    GET  /api/csv/<id>/              full response, Accept-Encoding: br
+    fetch_page  GET  /api/csv/<id>/?limit=500
+    last5       GET  /api/last5-csv/
+    upload      POST /api/upload-csv/ (new content every time), until the 202
+    ingest      POST /api/upload-csv/ (new content every time), until the job is done
+
+The GET endpoints answer from the response cache after their first request.
+Those cases are warm: one untimed request fills the cache first. Their
+``_cold`` variants (fetch_cold, ...) empty the response cache before every
+request, untimed, so each response is built again. Emptying a running
+server's cache is not possible over HTTP, so the cold cases are in-process
+only.
+
+For each endpoint it reports p50/p95/p99 latency, requests/s and peak RSS.
+Peak RSS is reset per endpoint where Linux allows it (/proc/<pid>/clear_refs),
+otherwise it is the process peak. Query counts are reported in-process only.
+
+By default requests go through the Django test client, in this process,
+against a throwaway test database and MEDIA_ROOT. Peak RSS then covers
+server and client. With --url they go over HTTP to a running server (with an
+ingest worker), as --username, from --concurrency threads. --server-pid lets
+the server's peak RSS be read.
+
+Results go to --output as JSON; --baseline prints the p95 and requests/s
+change from an earlier run.
+
+    python benchmarks/bench_api.py                          # 1k, 100k, 1M rows
+    python benchmarks/bench_api.py --rows 1000 10000000 --endpoints fetch_br last5
+    python benchmarks/bench_api.py --url http://127.0.0.1:8000 --username bench --password secret \\
+        --concurrency 8 --server-pid $(pgrep -o uvicorn) --baseline before.json
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+import django
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test.utils import CaptureQueriesContext, override_settings  # noqa: E402
+
+from api.synthetic import write_equipment_csv  # noqa: E402
+
+# Answered from the response cache once warm
+CACHED_ENDPOINTS = ['fetch', 'fetch_br', 'fetch_page', 'last5']
+ENDPOINTS = [*CACHED_ENDPOINTS, *[f'{name}_cold' for name in CACHED_ENDPOINTS], 'upload', 'ingest']
+# Seconds to wait for a running server's worker to ingest an upload
+INGEST_TIMEOUT = 3600
+
+
+class PeakRSS:
+    """Peak resident memory of process ``pid``, reset between endpoints when Linux allows it."""
+
+    def __init__(self, pid=None):
+        self.pid = pid or os.getpid()
+        self.resettable = False
+
+    def reset(self):
+        try:
+            with open(f"/proc/{self.pid}/clear_refs", 'w') as f:
+                f.write('5')
+            self.resettable = True
+        except OSError:
+            self.resettable = False
+
+    def peak_mib(self):
+        try:
+            with open(f"/proc/{self.pid}/status") as f:
+                for line in f:
+                    if line.startswith('VmHWM:'):
+                        return int(line.split()[1]) / 1024
+        except OSError:
+            pass
+        if self.pid == os.getpid():
+            # ru_maxrss is KiB on Linux, bytes on macOS
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            return peak / 2**20 if sys.platform == 'darwin' else peak / 1024
+        return None
+
+
+class InProcessClient:
+    """The Django test client as a JWT-authenticated user, over a throwaway database."""
+
+    concurrency = 1
+
+    def __init__(self, stack):
+        from django.contrib.auth.models import User
+        from django.test.runner import DiscoverRunner
+        from rest_framework.test import APIClient
+        from rest_framework_simplejwt.tokens import AccessToken
+
+        runner = DiscoverRunner(verbosity=0)
+        old_config = runner.setup_databases()
+        stack.callback(runner.teardown_databases, old_config)
+        media = tempfile.mkdtemp()
+        stack.enter_context(override_settings(MEDIA_ROOT=media))
+        stack.callback(shutil.rmtree, media, ignore_errors=True)
+
+        user = User.objects.create_user(username='bench', password=uuid.uuid4().hex)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(user)}")
+        self.rss = PeakRSS()
+
+    def clear_cache(self):
+        from api.cache import response_cache
+        response_cache.cache.clear()
+
+    def request(self, method, path, headers=None, upload=None):
+        extra = {f"HTTP_{name.upper().replace('-', '_')}": value for name, value in (headers or {}).items()}
+        with CaptureQueriesContext(connection) as queries:
+            if upload:
+                title, path_on_disk = upload
+                with open(path_on_disk, 'rb') as f:
+                    response = self.client.post(path, {'title': title, 'csv_file': f}, format='multipart')
+            else:
+                response = self.client.generic(method, path, **extra)
+            body = b''.join(response.streaming_content) if response.streaming else response.content
+        return response.status_code, body, len(queries)
+
+    def ingest(self, status_body):
+        from api.models import IngestJob
+        from api.worker import run_job
+        data = json.loads(status_body)
+        if data['dataset'] is None:
+            # This job only: jobs queued by the upload endpoint are left pending
+            job = run_job(IngestJob.objects.get(pk=data['job_id']))
+            if job.status != IngestJob.STATUS_DONE:
+                raise SystemExit(f"Job {job.pk} failed: {job.error}")
+            return job.dataset_id
+        return data['dataset']
+
+
+class HTTPClient:
+    """Requests to a running server, one keep-alive connection per thread."""
+
+    # The server's response cache cannot be emptied from here
+    clear_cache = None
+
+    def __init__(self, url, username, password, concurrency, server_pid):
+        parts = urlsplit(url)
+        self.https = parts.scheme == 'https'
+        self.netloc = parts.netloc
+        self.concurrency = concurrency
+        self.rss = PeakRSS(server_pid) if server_pid else None
+        self.connections = {}
+        status, body, _ = self.request('POST', '/api/token/', {'Content-Type': 'application/json'},
+                                       body=json.dumps({'username': username, 'password': password}).encode())
+        if status != 200:
+            raise SystemExit(f"Could not get a token for {username}: {status} {body[:200]!r}")
+        self.token = json.loads(body)['access']
+
+    def connection(self):
+        key = threading.get_ident()
+        if key not in self.connections:
+            cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+            self.connections[key] = cls(self.netloc, timeout=600)
+        return self.connections[key]
+
+    def request(self, method, path, headers=None, upload=None, body=None):
+        headers = dict(headers or {})
+        if getattr(self, 'token', None):
+            headers['Authorization'] = f"Bearer {self.token}"
+        if upload:
+            body, headers['Content-Type'], headers['Content-Length'] = self.multipart(*upload)
+        conn = self.connection()
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            return response.status, response.read(), None
+        except (http.client.HTTPException, OSError):
+            conn.close()
+            raise
+
+    @staticmethod
+    def multipart(title, path):
+        """A streamed multipart body with the CSV, so large files are not read into memory."""
+        boundary = uuid.uuid4().hex
+        head = (f"--{boundary}\r\nContent-Disposition: form-data; name=\"title\"\r\n\r\n{title}\r\n"
+                f"--{boundary}\r\nContent-Disposition: form-data; name=\"csv_file\"; "
+                f"filename=\"{title}.csv\"\r\nContent-Type: text/csv\r\n\r\n").encode()
+        tail = f"\r\n--{boundary}--\r\n".encode()
+
+        def chunks():
+            yield head
+            with open(path, 'rb') as f:
+                while block := f.read(1024 * 1024):
+                    yield block
+            yield tail
+
+        size = len(head) + os.path.getsize(path) + len(tail)
+        return chunks(), f"multipart/form-data; boundary={boundary}", str(size)
+
+    def ingest(self, status_body):
+        data = json.loads(status_body)
+        deadline = time.monotonic() + INGEST_TIMEOUT
+        while data['status'] in ('pending', 'running'):
+            if time.monotonic() > deadline:
+                raise SystemExit(f"Job {data['job_id']} was not ingested in time; is an ingest worker running?")
+            time.sleep(0.5)
+            data = json.loads(self.request('GET', data['status_url'])[1])
+        if data['status'] != 'done':
+            raise SystemExit(f"Job {data['job_id']} failed: {data.get('error')}")
+        return data['dataset']
+
+
+def percentile(timings, q):
+    return float(np.percentile(timings, q) * 1000)
+
+
+def measure(client, name, rows, make_request, args, before_each=None):
+    """Time ``make_request(i)`` for i = 0, 1, ...; ``before_each(i)`` runs before each batch, untimed."""
+    rss = client.rss
+    if rss:
+        rss.reset()
+    timings, queries, sizes = [], [], []
+    # Time spent in requests; before_each runs between batches and is left out
+    wall = 0.0
+
+    def one(i):
+        start = time.perf_counter()
+        status, body, count = make_request(i)
+        elapsed = time.perf_counter() - start
+        if not 200 <= status < 300:
+            raise SystemExit(f"{name} returned {status}: {body[:200]!r}")
+        return elapsed, count, len(body)
+
+    with ThreadPoolExecutor(max_workers=client.concurrency) as pool:
+        i = 0
+        while i < args.requests and (i < args.min_requests or wall < args.max_seconds):
+            batch = range(i, min(i + client.concurrency, args.requests))
+            if before_each:
+                for j in batch:
+                    before_each(j)
+            started = time.perf_counter()
+            for elapsed, count, size in pool.map(one, batch):
+                timings.append(elapsed)
+                queries.append(count)
+                sizes.append(size)
+            wall += time.perf_counter() - started
+            i = batch.stop
+
+    result = {
+        'endpoint': name,
+        'rows': rows,
+        'requests': len(timings),
+        'concurrency': client.concurrency,
+        'p50_ms': percentile(timings, 50),
+        'p95_ms': percentile(timings, 95),
+        'p99_ms': percentile(timings, 99),
+        'requests_per_s': len(timings) / wall,
+        'response_bytes': int(np.median(sizes)),
+        'queries_per_request': float(np.mean(queries)) if queries[0] is not None else None,
+        'peak_rss_mib': rss.peak_mib() if rss else None,
+        'peak_rss_scope': ('endpoint' if rss.resettable else 'process') if rss else None,
+    }
+    queries_text = f"{result['queries_per_request']:5.1f}" if result['queries_per_request'] is not None else '    -'
+    rss_text = f"{result['peak_rss_mib']:8.1f} MiB" if result['peak_rss_mib'] is not None else '           -'
+    print(f"{name:>16} | {result['requests']:4d} req | p50 {result['p50_ms']:9.2f}ms | "
+          f"p95 {result['p95_ms']:9.2f}ms | p99 {result['p99_ms']:9.2f}ms | "
+          f"{result['requests_per_s']:8.1f} req/s | {queries_text} queries | peak {rss_text}")
+    return result
+
+
+def run(client, rows, tmpdir, args):
+    csv_path = os.path.join(tmpdir, f"equipment_{rows}.csv")
+    write_equipment_csv(csv_path, rows, seed=rows)
+    print(f"{rows:>11,} rows ({os.path.getsize(csv_path) / 2**20:.1f} MiB)")
+
+    run_id = uuid.uuid4().hex[:8]
+    start = time.perf_counter()
+    status, body, _ = client.request('POST', '/api/upload-csv/', upload=(f"bench-{run_id}-{rows}", csv_path))
+    if status != 202:
+        raise SystemExit(f"Upload failed: {status} {body[:200]!r}")
+    dataset_id = client.ingest(body)
+    print(f"{'first ingest':>16} | {time.perf_counter() - start:.2f}s")
+
+    # Fresh content for every upload, so neither the view nor the worker takes the duplicate shortcut
+    paths = {}
+
+    def write_upload(i):
+        paths[i] = os.path.join(tmpdir, f"upload_{rows}_{i}.csv")
+        write_equipment_csv(paths[i], rows, seed=rows + i + 1)
+
+    def upload(prefix):
+        def request(i):
+            try:
+                return client.request('POST', '/api/upload-csv/', upload=(f"{prefix}-{i}", paths[i]))
+            finally:
+                os.remove(paths.pop(i))
+        return request
+
+    def ingest(i):
+        status, body, _ = upload(f"bench-{run_id}-{rows}-ingest")(i)
+        if status == 202:
+            client.ingest(body)
+        # The job's queries are not counted, only the upload's
+        return status, body, None
+
+    requests = {
+        'fetch': lambda i: client.request('GET', f'/api/csv/{dataset_id}/', {'Accept-Encoding': 'identity'}),
+        'fetch_br': lambda i: client.request('GET', f'/api/csv/{dataset_id}/', {'Accept-Encoding': 'br'}),
+        'fetch_page': lambda i: client.request('GET', f'/api/csv/{dataset_id}/?limit=500',
+                                               {'Accept-Encoding': 'identity'}),
+        'last5': lambda i: client.request('GET', '/api/last5-csv/', {'Accept-Encoding': 'identity'}),
+        'upload': upload(f"bench-{run_id}-{rows}"),
+        'ingest': ingest,
+    }
+    results = []
+    for name in CACHED_ENDPOINTS:
+        if f'{name}_cold' in args.endpoints:
+            if client.clear_cache is None:
+                print(f"{name + '_cold':>16} | skipped: needs the in-process client")
+            else:
+                results.append(measure(client, f'{name}_cold', rows, requests[name], args,
+                                       before_each=lambda i: client.clear_cache()))
+        if name in args.endpoints:
+            requests[name](-1)  # Untimed, so every timed request is a cache hit
+            results.append(measure(client, name, rows, requests[name], args))
+    # Uploads go last: retention could otherwise evict the dataset being fetched
+    for name in ['upload', 'ingest']:
+        if name in args.endpoints:
+            results.append(measure(client, name, rows, requests[name], args, before_each=write_upload))
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = {(r['endpoint'], r['rows']): r for r in json.load(f)['results']}
+    print(f"\nChange from {baseline_path} (negative p95 and positive req/s are better)")
+    for result in results:
+        before = baseline.get((result['endpoint'], result['rows']))
+        if before is None:
+            continue
+        p95 = (result['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100
+        rps = (result['requests_per_s'] - before['requests_per_s']) / before['requests_per_s'] * 100
+        print(f"{result['endpoint']:>16} {result['rows']:>11,} rows | p95 {p95:+7.1f}% | req/s {rps:+7.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[1_000, 100_000, 1_000_000])
+    parser.add_argument('--endpoints', nargs='+', choices=ENDPOINTS, default=ENDPOINTS)
+    parser.add_argument('--requests', type=int, default=50, help="Most requests per endpoint")
+    parser.add_argument('--min-requests', type=int, default=3, help="Requests made whatever the time")
+    parser.add_argument('--max-seconds', type=float, default=20.0, help="Time after which an endpoint stops")
+    parser.add_argument('--url', help="Base URL of a running server; in-process when omitted")
+    parser.add_argument('--username')
+    parser.add_argument('--password')
+    parser.add_argument('--concurrency', type=int, default=1, help="Client threads (with --url)")
+    parser.add_argument('--server-pid', type=int, help="Server process to read peak RSS from (with --url)")
+    parser.add_argument('--output', default='bench_api.json')
+    parser.add_argument('--baseline', help="Earlier --output to compare against")
+    args = parser.parse_args()
+    started = datetime.now(timezone.utc).isoformat()
+
+    with ExitStack() as stack:
+        if args.url:
+            if not (args.username and args.password):
+                parser.error("--url needs --username and --password")
+            client = HTTPClient(args.url, args.username, args.password, max(args.concurrency, 1), args.server_pid)
+        else:
+            client = InProcessClient(stack)
+        tmpdir = stack.enter_context(tempfile.TemporaryDirectory())
+        results = []
+        for rows in args.rows:
+            results.extend(run(client, rows, tmpdir, args))
+
+    report = {
+        'meta': {
+            'started': started,
+            'commit': git_commit(),
+            'mode': 'http' if args.url else 'in-process',
+            'url': args.url,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'database': connection.vendor if not args.url else None,
+            'precompress_min_rows': settings.PRECOMPRESS_MIN_ROWS,
+        },
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nWrote {args.output}")
+    if args.baseline:
+        compare(results, args.baseline)
+
+
+if __name__ == '__main__':
+    main()
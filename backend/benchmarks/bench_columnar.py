@@ -0,0 +1,82 @@
+"""
+CSV re-parse vs. memory-mapped columnar read.
+
+Writes a synthetic equipment CSV per size, builds its columnar copy, then
+times reading the three metric columns back both ways and reducing them to
+their means (so every value is actually touched).
+
+    python benchmarks/bench_columnar.py                 # 1M and 10M rows
+    python benchmarks/bench_columnar.py --rows 100000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import django
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+django.setup()
+
+from api.columnar import ColumnarDataset, ColumnarWriter, sidecar_path  # noqa: E402
+from api.ingest import METRIC_COLUMNS, ingest_csv  # noqa: E402
+from api.synthetic import write_equipment_csv  # noqa: E402
+
+
+def best_of(repeat, fn):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def csv_read(path):
+    df = pd.read_csv(path)
+    return [df[col].mean() for col in METRIC_COLUMNS]
+
+
+def columnar_read(path):
+    columns = ColumnarDataset(path)
+    return [np.nanmean(columns.metric(col)) for col in METRIC_COLUMNS]
+
+
+def run(rows, tmpdir, repeat):
+    csv_path = os.path.join(tmpdir, f"equipment_{rows}.csv")
+    write_equipment_csv(csv_path, rows)
+
+    start = time.perf_counter()
+    writer = ColumnarWriter(sidecar_path(csv_path))
+    ingest_csv(csv_path, on_rows=writer)
+    writer.close()
+    build = time.perf_counter() - start
+
+    np.testing.assert_allclose(csv_read(csv_path), columnar_read(sidecar_path(csv_path)))
+    csv_time = best_of(repeat, lambda: csv_read(csv_path))
+    columnar_time = best_of(repeat, lambda: columnar_read(sidecar_path(csv_path)))
+    sidecar_bytes = sum(entry.stat().st_size for entry in os.scandir(sidecar_path(csv_path)))
+
+    print(f"{rows:>11,} rows | csv {os.path.getsize(csv_path) / 2**20:8.1f} MiB, "
+          f"columnar {sidecar_bytes / 2**20:8.1f} MiB (built in {build:6.2f}s) | "
+          f"re-parse {csv_time:7.3f}s, columnar {columnar_time:7.3f}s, "
+          f"{csv_time / columnar_time:6.1f}x faster")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[1_000_000, 10_000_000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for rows in args.rows:
+            run(rows, tmpdir, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+"""
+Full dataset response (/api/csv/<id>/) size and compression cost.
+
+Scales an equipment CSV to each row count, by default the generated
+equipment data (api/synthetic.py) or, with --csv, the given file's rows
+repeated with numbered names. It then renders the full response as
+CSVFetchView does and, for every encoding, reports:
+
+* per request   size and compression time at RESPONSE_COMPRESSION_LEVELS,
+                the CPU each response costs with CompressionMiddleware alone
+* precompressed size and one-off time at PRECOMPRESS_ENCODINGS (paid at
+                ingest), and the time to read the stored file back
+* decode        client-side decompression time
+
+    python benchmarks/bench_compression.py                 # 1M rows
+    python benchmarks/bench_compression.py --rows 100000 --csv csv_files/1/<sample>.csv
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import zlib
+
+import brotli
+import django
+import numpy as np
+import pandas as pd
+import zstandard
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.utils.timezone import now  # noqa: E402
+
+from api.compression import ENCODINGS, compress  # noqa: E402
+from api.ingest import EQUIPMENT_COLUMNS, ingest_csv  # noqa: E402
+from api.renderers import ORJSONRenderer  # noqa: E402
+from api.synthetic import write_equipment_csv  # noqa: E402
+
+DECODERS = {
+    'zstd': lambda data: zstandard.ZstdDecompressor().decompressobj().decompress(data),
+    'br': brotli.decompress,
+    'gzip': lambda data: zlib.decompress(data, 16 + zlib.MAX_WBITS),
+}
+
+
+def best_of(repeat, fn):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def scale_csv(source, path, rows):
+    sample = pd.read_csv(source)
+    copies = -(-rows // len(sample))
+    scaled = pd.concat([sample] * copies, ignore_index=True).iloc[:rows]
+    scaled['Equipment Name'] = scaled['Equipment Name'].astype(str) + '-' + (scaled.index // len(sample)).astype(str)
+    scaled[EQUIPMENT_COLUMNS].to_csv(path, index=False)
+
+
+def full_response(path):
+    summary = ingest_csv(path).fields()
+    df = pd.read_csv(path)
+    data = {'id': 1, 'title': 'plant', **summary, 'uploaded_at': now()}
+    data.pop('metric_sketches')
+    data['equipment_list'] = df.replace({np.nan: None}).to_dict('records')
+    return ORJSONRenderer().render(data)
+
+
+def run(rows, source, tmpdir, repeat):
+    csv_path = os.path.join(tmpdir, f"equipment_{rows}.csv")
+    if source:
+        scale_csv(source, csv_path, rows)
+    else:
+        write_equipment_csv(csv_path, rows)
+    body = full_response(csv_path)
+    print(f"{rows:>11,} rows | identity {len(body) / 2**20:7.1f} MiB")
+
+    for encoding in ENCODINGS:
+        level = settings.RESPONSE_COMPRESSION_LEVELS[encoding]
+        dynamic = compress(body, encoding, level)
+        dynamic_time = best_of(repeat, lambda: compress(body, encoding, level))
+
+        level = settings.PRECOMPRESS_ENCODINGS[encoding]
+        start = time.perf_counter()
+        stored = compress(body, encoding, level)
+        stored_time = time.perf_counter() - start
+        stored_path = os.path.join(tmpdir, f"response.{encoding}")
+        with open(stored_path, 'wb') as f:
+            f.write(stored)
+
+        def read_stored():
+            with open(stored_path, 'rb') as f:
+                return f.read()
+
+        read_time = best_of(repeat, read_stored)
+        assert DECODERS[encoding](stored) == body
+        decode_time = best_of(repeat, lambda: DECODERS[encoding](stored))
+
+        print(f"{encoding:>16} | per request {len(dynamic) / 2**20:6.1f} MiB "
+              f"({len(body) / len(dynamic):5.1f}x) in {dynamic_time * 1000:7.1f}ms | "
+              f"precompressed {len(stored) / 2**20:6.1f} MiB ({len(body) / len(stored):5.1f}x), "
+              f"{stored_time:6.2f}s at ingest, served in {read_time * 1000:5.1f}ms | "
+              f"decode {decode_time * 1000:6.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[1_000_000])
+    parser.add_argument('--csv', help="CSV to scale up instead of generated data")
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for rows in args.rows:
+            run(rows, args.csv, tmpdir, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Untyped vs. schema-typed CSV parsing.
+
+Writes a synthetic equipment CSV per size and reads it in ingest-sized
+chunks three ways: pd.read_csv with inferred dtypes (the parse before the
+equipment schema), the typed pandas C engine, and the typed pyarrow engine.
+For each it reports the parse time, the in-memory bytes per row of the
+chunks (object columns measured deeply), and the full ingest_csv time.
+
+    python benchmarks/bench_parse.py                 # 1M rows
+    python benchmarks/bench_parse.py --rows 100000 1000000 --dtype float32
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import django
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+django.setup()
+
+from django.conf import settings  # noqa: E402
+
+from api.ingest import get_chunk_size, ingest_chunks, ingest_csv, iter_csv_chunks  # noqa: E402
+from api.synthetic import write_equipment_csv  # noqa: E402
+
+
+def best_of(repeat, fn):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def untyped_chunks(path):
+    with pd.read_csv(path, chunksize=get_chunk_size()) as reader:
+        yield from reader
+
+
+def typed_chunks(engine):
+    return lambda path: iter_csv_chunks(path, engine=engine)
+
+
+PARSERS = {
+    'inferred': untyped_chunks,
+    'typed c': typed_chunks('c'),
+    'typed pyarrow': typed_chunks('pyarrow'),
+}
+
+
+def bytes_per_row(chunks):
+    total = rows = 0
+    for chunk in chunks:
+        total += int(chunk.memory_usage(deep=True).sum())
+        rows += len(chunk)
+    return total / rows
+
+
+def run(rows, tmpdir, repeat):
+    path = os.path.join(tmpdir, f"equipment_{rows}.csv")
+    write_equipment_csv(path, rows)
+    print(f"{rows:>11,} rows ({os.path.getsize(path) / 2**20:.1f} MiB)")
+
+    for name, parse in PARSERS.items():
+        parse_time = best_of(repeat, lambda: sum(len(chunk) for chunk in parse(path)))
+        memory = bytes_per_row(parse(path))
+        if name == 'inferred':
+            ingest_time = best_of(repeat, lambda: ingest_chunks(parse(path)))
+        else:
+            ingest_time = best_of(repeat, lambda: ingest_csv(path, engine=name.split()[1]))
+        print(f"{name:>16} | parse {parse_time:6.2f}s | {memory:6.1f} bytes/row | ingest {ingest_time:6.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[1_000_000])
+    parser.add_argument('--dtype', choices=['float64', 'float32'], default='float64',
+                        help="CSV_METRIC_DTYPE for the typed parsers")
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    settings.CSV_METRIC_DTYPE = args.dtype
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for rows in args.rows:
+            run(rows, tmpdir, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
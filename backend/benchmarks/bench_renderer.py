@@ -0,0 +1,113 @@
+"""
+DRF JSONRenderer vs. ORJSONRenderer.
+
+Renders a page of equipment rows (the shape /api/csv/<id>/rows/ returns)
+with both renderers, then a chart payload three ways: decoded and rendered
+by JSONRenderer, decoded and rendered by ORJSONRenderer, and embedded as a
+pre-encoded fragment the way cached chart responses are served.
+
+The payloads contain no NaN: JSONRenderer is strict and raises on it.
+
+    python benchmarks/bench_renderer.py                 # 100k rows
+    python benchmarks/bench_renderer.py --rows 10000 1000000
+"""
+import argparse
+import os
+import sys
+import time
+
+import django
+import numpy as np
+import orjson
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+django.setup()
+
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+
+from api.renderers import ORJSONRenderer, dumps  # noqa: E402
+
+TYPES = ['Pump', 'Compressor', 'Valve', 'HeatExchanger', 'Reactor', 'Condenser']
+
+
+def best_of(repeat, fn):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def row_payload(rows):
+    rng = np.random.default_rng(0)
+    flowrate = rng.uniform(50, 250, rows).round(2).tolist()
+    pressure = rng.uniform(2, 12, rows).round(2).tolist()
+    temperature = rng.uniform(60, 200, rows).round(2).tolist()
+    return {
+        "count": rows,
+        "next": None,
+        "previous": None,
+        "results": [
+            {
+                "row_number": i,
+                "name": f"{TYPES[i % len(TYPES)]}-{i}",
+                "type": TYPES[i % len(TYPES)],
+                "flowrate": flowrate[i],
+                "pressure": pressure[i],
+                "temperature": temperature[i],
+            }
+            for i in range(rows)
+        ],
+    }
+
+
+def chart_payload(rows):
+    rng = np.random.default_rng(1)
+    index = np.arange(rows)
+    return {
+        "id": 1,
+        "metric": "Flowrate",
+        "method": "lttb",
+        "total_count": rows,
+        "points": rows,
+        "x": index.tolist(),
+        "y": rng.uniform(50, 250, rows).tolist(),
+        "labels": [f"Pump-{i}" for i in index.tolist()],
+    }
+
+
+def run(rows, repeat):
+    drf, fast = JSONRenderer(), ORJSONRenderer()
+
+    page = row_payload(rows)
+    assert dumps(page) == drf.render(page)
+    drf_rows = best_of(repeat, lambda: drf.render(page))
+    fast_rows = best_of(repeat, lambda: fast.render(page))
+
+    chart = chart_payload(rows)
+    cached = dumps(chart)
+    drf_chart = best_of(repeat, lambda: drf.render(chart))
+    fast_chart = best_of(repeat, lambda: fast.render(chart))
+    fragment_chart = best_of(repeat, lambda: fast.render(orjson.Fragment(cached)))
+
+    print(f"{rows:>11,} rows | rows page {len(dumps(page)) / 2**20:6.1f} MiB: "
+          f"drf {drf_rows * 1000:8.1f}ms, orjson {fast_rows * 1000:7.1f}ms "
+          f"({drf_rows / fast_rows:5.1f}x) | chart {len(cached) / 2**20:5.1f} MiB: "
+          f"drf {drf_chart * 1000:7.1f}ms, orjson {fast_chart * 1000:6.1f}ms, "
+          f"fragment {fragment_chart * 1000:6.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[100_000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    for rows in args.rows:
+        run(rows, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
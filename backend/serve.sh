@@ -0,0 +1,22 @@
+#!/bin/sh
+# Start the API server. SERVER_MODE picks the interface:
+#   wsgi (default)  gunicorn with sync workers, one thread per request
+#   asgi            uvicorn running the async views on an event loop, so slow
+#                   clients and large downloads do not each hold a thread
+# Both read the number of worker processes from WEB_CONCURRENCY.
+set -e
+
+python manage.py migrate
+
+case "${SERVER_MODE:-wsgi}" in
+    asgi)
+        exec uvicorn backend.asgi:application --host 0.0.0.0 --port 8000 --no-server-header
+        ;;
+    wsgi)
+        exec gunicorn backend.wsgi:application --bind 0.0.0.0:8000
+        ;;
+    *)
+        echo "Unknown SERVER_MODE: $SERVER_MODE (expected wsgi or asgi)" >&2
+        exit 1
+        ;;
+esac
@@ -1,5 +1,6 @@
 import sys
 import os
+import hashlib
 import requests
 import pandas as pd
 from PyQt5.QtWidgets import (
@@ -7,7 +8,7 @@ from PyQt5.QtWidgets import (
     QPushButton, QFileDialog, QTableWidget, QTableWidgetItem,
     QComboBox, QMessageBox, QTabWidget, QScrollArea, QGridLayout, QSizePolicy
 )
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QTimer
 from PyQt5.QtGui import QFont
 
 import matplotlib.pyplot as plt
@@ -25,6 +26,10 @@ import io
 
 
 API_BASE_URL = "http://127.0.0.1:8000/api"
+# Files larger than this are sent in resumable chunks (/api/uploads/)
+CHUNKED_UPLOAD_THRESHOLD = 64 * 1024 * 1024
+# Attempts per chunk before the upload is paused; uploading again resumes it
+CHUNK_UPLOAD_ATTEMPTS = 3
 
 
 class DesktopApp(QWidget):
@@ -36,6 +41,10 @@ class DesktopApp(QWidget):
         self.selected_data = None
         self.figures = []  
         self.current_analysis_data = None
+        # (url, params) -> (ETag, JSON body) of the last successful GET
+        self.response_cache = {}
+        # (path, size, mtime) -> id of an unfinished chunked upload of that file
+        self.upload_sessions = {}
 
         self.setWindowTitle("Chemical Equipment Visualizer (Desktop)")
         self.setGeometry(100, 50, 1400, 900)  
@@ -215,6 +224,7 @@ class DesktopApp(QWidget):
 
             if response.status_code == 200:
                 self.token = response.json()["access"]
+                self.response_cache = {}
                 self.status_label.setText("Login successful!")
                 self.status_label.setStyleSheet("color: green; font-weight: bold;")
 
@@ -277,13 +287,34 @@ class DesktopApp(QWidget):
     
     
     
-    def fetch_last_5_csvs(self):
+    def cached_get(self, url, params=None):
+        """
+        GET ``url`` and return (status, JSON body). A previously seen response is
+        revalidated with its ETag; an unchanged one comes back as an empty 304
+        and the cached body is reused.
+        """
         headers = {"Authorization": f"Bearer {self.token}"}
+        key = (url, tuple(sorted((params or {}).items())))
+        cached = self.response_cache.get(key)
+        if cached:
+            headers["If-None-Match"] = cached[0]
+
+        r = requests.get(url, params=params, headers=headers)
+        if r.status_code == 304 and cached:
+            return 200, cached[1]
+        if r.status_code != 200:
+            return r.status_code, None
+        data = r.json()
+        if r.headers.get("ETag"):
+            self.response_cache[key] = (r.headers["ETag"], data)
+        return r.status_code, data
+
+    def fetch_last_5_csvs(self):
         try:
-            r = requests.get(f"{API_BASE_URL}/last5-csv/", headers=headers)
+            status_code, data = self.cached_get(f"{API_BASE_URL}/last5-csv/", params={"fields": "id,title,uploaded_at"})
 
-            if r.status_code == 200:
-                self.csv_data = r.json()
+            if status_code == 200:
+                self.csv_data = data
                 self.populate_history_table(self.history_table)
                 self.populate_history_table(self.analysis_history_table)
             else:
@@ -329,6 +360,10 @@ class DesktopApp(QWidget):
         if not hasattr(self, 'selected_file'):
             return
 
+        if os.path.getsize(self.selected_file) > CHUNKED_UPLOAD_THRESHOLD:
+            self.start_chunked_upload(self.selected_file)
+            return
+
         headers = {"Authorization": f"Bearer {self.token}"}
         files = {"csv_file": open(self.selected_file, "rb")}
         data = {"title": self.selected_file.split("/")[-1]}
@@ -336,15 +371,14 @@ class DesktopApp(QWidget):
         try:
             r = requests.post(f"{API_BASE_URL}/upload-csv/", files=files, data=data, headers=headers)
 
-            if r.status_code == 201:
-                self.status_label.setText("CSV Upload Successful!")
+            if r.status_code == 202:
+                self.status_label.setText("CSV uploaded, processing...")
                 self.status_label.setStyleSheet("color: green; font-weight: bold;")
-                csv_data = r.json()
-                self.fetch_last_5_csvs()
-                self.display_analysis(csv_data)
-                self.tabs.setCurrentIndex(1)  
+                self.poll_upload_job(r.json()["job_id"])
             else:
-                msg = r.json().get("detail", "Upload failed")
+                body = r.json()
+                # Files that fail schema validation come back as a csv_file error
+                msg = body.get("detail") or " ".join(body.get("csv_file", [])) or "Upload failed"
                 self.status_label.setText(f"Error: {msg}")
                 self.status_label.setStyleSheet("color: red; font-weight: bold;")
 
@@ -352,14 +386,130 @@ class DesktopApp(QWidget):
             self.status_label.setText(f"Error: {str(e)}")
             self.status_label.setStyleSheet("color: red; font-weight: bold;")
 
-    def load_csv(self, csv_id):
+    def show_upload_error(self, msg):
+        self.status_label.setText(f"Error: {msg}")
+        self.status_label.setStyleSheet("color: red; font-weight: bold;")
+
+    def start_chunked_upload(self, path):
+        """Open (or resume) an upload session for a large file and send its missing chunks."""
         headers = {"Authorization": f"Bearer {self.token}"}
+        stat = os.stat(path)
+        key = (path, stat.st_size, stat.st_mtime)
 
         try:
-            r = requests.get(f"{API_BASE_URL}/csv/{csv_id}/", headers=headers)
+            session = None
+            if key in self.upload_sessions:
+                r = requests.get(f"{API_BASE_URL}/uploads/{self.upload_sessions[key]}/", headers=headers)
+                if r.status_code == 200:
+                    session = r.json()
+            if session is None:
+                data = {"title": path.split("/")[-1], "size": stat.st_size}
+                r = requests.post(f"{API_BASE_URL}/uploads/", data=data, headers=headers)
+                if r.status_code != 201:
+                    body = r.json()
+                    self.show_upload_error(body.get("detail") or " ".join(body.get("title", [])) or "Upload failed")
+                    return
+                session = r.json()
+                self.upload_sessions[key] = session["id"]
+        except Exception as e:
+            self.show_upload_error(str(e))
+            return
 
+        received = set()
+        for start, stop in session["received"]:
+            received.update(range(start // session["chunk_size"], -(-stop // session["chunk_size"])))
+        missing = [index for index in range(session["chunk_count"]) if index not in received]
+        self.send_next_chunk(key, session, missing)
+
+    def send_next_chunk(self, key, session, missing):
+        """Send one chunk per event loop turn so the window stays responsive."""
+        headers = {"Authorization": f"Bearer {self.token}"}
+        path = key[0]
+
+        if not missing:
+            self.finalize_chunked_upload(key, session)
+            return
+
+        index = missing[0]
+        with open(path, "rb") as f:
+            f.seek(index * session["chunk_size"])
+            chunk = f.read(session["chunk_size"])
+        headers["Content-Type"] = "application/octet-stream"
+        headers["X-Chunk-SHA256"] = hashlib.sha256(chunk).hexdigest()
+
+        error = None
+        for _ in range(CHUNK_UPLOAD_ATTEMPTS):
+            try:
+                r = requests.put(f"{API_BASE_URL}/uploads/{session['id']}/chunks/{index}/",
+                                 data=chunk, headers=headers)
+            except requests.RequestException as e:
+                error = str(e)
+                continue
             if r.status_code == 200:
-                data = r.json()
+                break
+            error = r.json().get("detail", "Upload failed")
+            if r.status_code < 500:
+                # The server dropped the upload (e.g. the file is not a valid CSV)
+                self.upload_sessions.pop(key, None)
+                self.show_upload_error(error)
+                return
+        else:
+            self.show_upload_error(f"{error} (upload again to resume)")
+            return
+
+        done = session["chunk_count"] - len(missing) + 1
+        self.status_label.setText(f"Uploading CSV... {int(done / session['chunk_count'] * 100)}%")
+        self.status_label.setStyleSheet("color: green; font-weight: bold;")
+        QTimer.singleShot(0, lambda: self.send_next_chunk(key, session, missing[1:]))
+
+    def finalize_chunked_upload(self, key, session):
+        headers = {"Authorization": f"Bearer {self.token}"}
+
+        try:
+            self.status_label.setText("Processing CSV...")
+            r = requests.post(f"{API_BASE_URL}/uploads/{session['id']}/finalize/", headers=headers)
+            if r.status_code != 200:
+                self.show_upload_error(r.json().get("detail", "Upload failed"))
+                return
+            self.upload_sessions.pop(key, None)
+            self.status_label.setText("CSV Upload Successful!")
+            self.status_label.setStyleSheet("color: green; font-weight: bold;")
+            self.fetch_last_5_csvs()
+            self.load_csv(r.json()["dataset"])
+        except Exception as e:
+            self.show_upload_error(str(e))
+
+    def poll_upload_job(self, job_id):
+        headers = {"Authorization": f"Bearer {self.token}"}
+
+        try:
+            r = requests.get(f"{API_BASE_URL}/jobs/{job_id}/", headers=headers)
+            job = r.json()
+
+            if r.status_code != 200:
+                self.status_label.setText("Error checking upload status!")
+                self.status_label.setStyleSheet("color: red; font-weight: bold;")
+            elif job["status"] == "done":
+                self.status_label.setText("CSV Upload Successful!")
+                self.status_label.setStyleSheet("color: green; font-weight: bold;")
+                self.fetch_last_5_csvs()
+                self.load_csv(job["dataset"])
+            elif job["status"] == "failed":
+                self.status_label.setText(f"Error: {job['error']}")
+                self.status_label.setStyleSheet("color: red; font-weight: bold;")
+            else:
+                self.status_label.setText(f"Processing CSV... {int(job['progress'] * 100)}%")
+                QTimer.singleShot(1000, lambda: self.poll_upload_job(job_id))
+
+        except Exception as e:
+            self.status_label.setText(f"Error: {str(e)}")
+            self.status_label.setStyleSheet("color: red; font-weight: bold;")
+
+    def load_csv(self, csv_id):
+        try:
+            status_code, data = self.cached_get(f"{API_BASE_URL}/csv/{csv_id}/")
+
+            if status_code == 200:
                 self.display_analysis(data)
                 self.tabs.setCurrentIndex(1)  
             else:
@@ -755,6 +905,35 @@ class DesktopApp(QWidget):
                 story.append(dist_table)
                 story.append(Spacer(1, 20))
 
+            relationships = self.current_analysis_data.get('metric_relationships')
+            if relationships and relationships.get('fits'):
+                story.append(Paragraph("Relationship Summary", styles["Heading2"]))
+
+                def fmt(value):
+                    return "-" if value is None else f"{value:.3f}"
+
+                columns = relationships['columns']
+                rel_data = [["Pair", "Pearson r", "Spearman rho", "Covariance", "Fit (y = a + b*x)"]]
+                for fit in relationships['fits']:
+                    i, j = columns.index(fit['x']), columns.index(fit['y'])
+                    spearman = relationships.get('spearman')
+                    rel_data.append([
+                        f"{fit['x']} vs {fit['y']}",
+                        fmt(relationships['pearson'][i][j]),
+                        fmt(spearman[i][j] if spearman else None),
+                        fmt(relationships['covariance'][i][j]),
+                        f"a={fmt(fit['intercept'])}, b={fmt(fit['slope'])}",
+                    ])
+
+                rel_table = Table(rel_data, colWidths=[2*inch, 1*inch, 1.1*inch, 1.1*inch, 1.8*inch])
+                rel_table.setStyle(TableStyle([
+                    ('BACKGROUND', (0, 0), (-1, 0), colors.lightblue),
+                    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+                    ('GRID', (0, 0), (-1, -1), 1, colors.black)
+                ]))
+                story.append(rel_table)
+                story.append(Spacer(1, 20))
+
             # Save charts as images and add to PDF
             equipment_list = self.current_analysis_data.get('equipment_list', [])
             if equipment_list:
@@ -1,2 +1,5 @@
 export const ACCESS_TOKEN = "access";
 export const REFRESH_TOKEN = "refresh";
+// Polling of upload jobs (/api/jobs/<id>/) on the dashboard
+export const JOB_POLL_INTERVAL_MS = 1000;
+export const JOB_POLL_TIMEOUT_MS = 10 * 60 * 1000;
@@ -17,7 +17,11 @@ import { Button } from "@heroui/button";
 import { addToast } from "@heroui/toast";
 
 import api from "../api";
-import { ACCESS_TOKEN } from "../constants";
+import {
+  ACCESS_TOKEN,
+  JOB_POLL_INTERVAL_MS,
+  JOB_POLL_TIMEOUT_MS,
+} from "../constants";
 import {
   LineGraph,
   PieGraph,
@@ -57,7 +61,7 @@ export default function Dashboard() {
 
   const loadHistory = async () => {
     try {
-      const res = await api.get("/api/last5-csv/", {
+      const res = await api.get("/api/last5-csv/?fields=id,title,uploaded_at", {
         headers: {
           Authorization: `Bearer ${localStorage.getItem(ACCESS_TOKEN)}`,
         },
@@ -89,16 +93,54 @@ export default function Dashboard() {
         },
       });
 
-      setSelected(res.data);
       addToast({
-        title: "CSV uploaded! Check the Analysis tab.",
-        color: "success",
+        title: "CSV uploaded, processing...",
+        color: "default",
       });
-      loadHistory();
-    } catch (err) {
+      await waitForJob(res.data.job_id);
+    } catch (err: any) {
       console.log(err);
-      alert("Upload failed/Duplicate file");
+      // Files that fail schema validation come back as a csv_file error
+      alert(err?.response?.data?.csv_file?.join(" ") || "Upload failed/Duplicate file");
+    }
+  };
+
+  // Uploads are parsed by a background worker; poll until it finishes,
+  // giving up on a job that is still pending or running after the deadline
+  const waitForJob = async (jobId: number) => {
+    const deadline = Date.now() + JOB_POLL_TIMEOUT_MS;
+
+    while (Date.now() < deadline) {
+      const res = await api.get(`/api/jobs/${jobId}/`, {
+        headers: {
+          Authorization: `Bearer ${localStorage.getItem(ACCESS_TOKEN)}`,
+        },
+      });
+
+      if (res.data.status === "done") {
+        await loadCSV(res.data.dataset);
+        addToast({
+          title: "CSV uploaded! Check the Analysis tab.",
+          color: "success",
+        });
+        loadHistory();
+
+        return;
+      }
+      if (res.data.status === "failed") {
+        alert(res.data.error || "Upload failed");
+
+        return;
+      }
+      await new Promise((resolve) => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
     }
+    addToast({
+      title: "Still processing the CSV",
+      description:
+        "It is taking longer than expected. It will appear in your recent files once it is done.",
+      color: "warning",
+    });
+    loadHistory();
   };
 
   const loadCSV = async (id: number) => {